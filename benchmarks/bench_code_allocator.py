@@ -0,0 +1,108 @@
+"""
+Benchmark short code allocation against a partly filled code space.
+
+    python benchmarks/bench_code_allocator.py [codes] [round trip ms]
+
+The Short URL table is simulated: a code counts as taken with probability
+existing / 36**6, decided by a salted hash so each code answers
+consistently. Allocation is compared for:
+
+* legacy: random code plus one existence query per attempt (the old
+  ShortURL.generate_short_code);
+* random: the batched random strategy, one query per batch;
+* sequence: leased counter blocks scrambled by the Feistel permutation,
+  one lease and one IN query per block.
+
+CPU time is measured; database time is estimated as queries times the
+round trip latency.
+"""
+
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import frappe
+
+from utm_shortener.utm_shortener.utils import code_allocator
+
+EXISTING = (1_000_000, 10_000_000, 50_000_000)
+NAMESPACE = code_allocator.SHORT_URL
+DOMAIN = len(NAMESPACE.alphabet) ** NAMESPACE.length
+
+
+class SimulatedTable:
+    """Stand-in for `tabShort URL` holding `existing` random codes"""
+
+    def __init__(self, existing, seed=7):
+        self.threshold = existing / DOMAIN * (1 << 61)
+        self.salt = str(seed)
+        self.queries = 0
+
+    def is_taken(self, code):
+        return hash(self.salt + code) & ((1 << 61) - 1) < self.threshold
+
+    def exists(self, code):
+        self.queries += 1
+        return self.is_taken(code)
+
+    def filter_taken(self, codes):
+        self.queries += 1
+        return [code for code in codes if not self.is_taken(code)]
+
+
+def allocate_legacy(table, count):
+    characters = NAMESPACE.alphabet
+    for _ in range(count):
+        while True:
+            code = "".join(random.choice(characters) for _ in range(NAMESPACE.length))
+            if not table.exists(code):
+                break
+
+
+def allocate_random(table, count):
+    strategy = code_allocator.RandomStrategy(NAMESPACE)
+    strategy.filter_taken = table.filter_taken
+    for _ in range(count):
+        strategy.allocate(1)
+
+
+def allocate_sequence(table, count):
+    counter = {"blocks": 0}
+
+    def lease_series(name, blocks):
+        table.queries += 1
+        current = counter["blocks"]
+        counter["blocks"] += blocks
+        return current
+
+    code_allocator.lease_series = lease_series
+    strategy = code_allocator.SequenceStrategy(NAMESPACE)
+    strategy.filter_taken = table.filter_taken
+    strategy._key = 0x5EED
+    for _ in range(count):
+        strategy.allocate(1)
+
+
+def run(count=100000, round_trip_ms=0.3):
+    # Only the rollback hook of frappe.db is used outside a site
+    frappe.local.db = SimpleNamespace(after_rollback=SimpleNamespace(add=lambda callback: None))
+
+    print(f"codes allocated per run: {count}, assumed DB round trip: {round_trip_ms} ms")
+    print(f"{'existing':>12} {'strategy':>9} {'cpu us/code':>12} {'queries/code':>13} {'est. us/code':>13}")
+
+    for existing in EXISTING:
+        for name, allocate in (("legacy", allocate_legacy), ("random", allocate_random),
+                ("sequence", allocate_sequence)):
+            table = SimulatedTable(existing)
+            started = time.perf_counter()
+            allocate(table, count)
+            cpu = (time.perf_counter() - started) / count * 1e6
+            queries = table.queries / count
+            print(f"{existing:>12,} {name:>9} {cpu:>12.2f} {queries:>13.4f} "
+                f"{cpu + queries * round_trip_ms * 1000:>13.2f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 0.3)
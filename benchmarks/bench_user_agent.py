@@ -0,0 +1,67 @@
+"""
+Microbenchmark for user agent classification on the click path.
+
+    python benchmarks/bench_user_agent.py [clicks]
+
+Simulates a skewed stream of clicks where a few user agents dominate and
+reports the per-click cost with a cold and a warm classification cache.
+"""
+
+import random
+import sys
+import time
+
+from utm_shortener.utm_shortener.utils import user_agent
+
+SAMPLE_USER_AGENTS = [
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 13; SM-S901B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.2210.91",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0",
+    "Mozilla/5.0 (Linux; Android 12; SM-X700) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)",
+]
+
+
+def make_stream(clicks, distinct=500, seed=42):
+    """Zipf-like stream: sample agents dominate, plus a long tail of variants"""
+    rng = random.Random(seed)
+    tail = [f"{rng.choice(SAMPLE_USER_AGENTS)} build/{i}" for i in range(distinct)]
+    population = SAMPLE_USER_AGENTS + tail
+    weights = [1.0 / (rank + 1) for rank in range(len(population))]
+    return rng.choices(population, weights=weights, k=clicks)
+
+
+def run(clicks=200000):
+    stream = make_stream(clicks)
+
+    user_agent.clear_cache()
+    started = time.perf_counter()
+    for ua in stream:
+        user_agent.classify.__wrapped__(ua)
+    uncached = time.perf_counter() - started
+
+    user_agent.clear_cache()
+    started = time.perf_counter()
+    for ua in stream:
+        user_agent.classify(ua)
+    cached = time.perf_counter() - started
+
+    started = time.perf_counter()
+    user_agent.classify_many(stream)
+    bulk = time.perf_counter() - started
+
+    info = user_agent.cache_info()
+    print(f"clicks:            {clicks}")
+    print(f"distinct agents:   {len(set(stream))}")
+    print(f"uncached:          {uncached / clicks * 1e6:.2f} us/click")
+    print(f"cached (cold):     {cached / clicks * 1e6:.2f} us/click")
+    print(f"classify_many:     {bulk / clicks * 1e6:.2f} us/click (warm)")
+    print(f"cache hit rate:    {info.hits / max(info.hits + info.misses, 1):.1%}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -10,16 +10,42 @@
  * 3. Copy this code into the worker
  * 4. Configure the FRAPPE_SITE_URL environment variable
  * 5. Add a route for your domain /* to this worker
+ *
+ * Edge redirects (optional):
+ * 6. Bind a KV namespace to the worker as LINKS
+ * 7. On the site, create a user with only the "UTM Edge" role and
+ *    generate its API keys. Add the secret ORIGIN_API_TOKEN as
+ *    "api_key:api_secret" of that user. The role can only export link
+ *    snapshots and post clicks, so no System Manager secret is needed
+ * 8. Add a cron trigger, e.g. every minute
+ *
+ * The cron trigger copies active links into LINKS from the site's edge
+ * snapshot export, as deltas after the first full copy. Links found in
+ * LINKS are redirected here, and their clicks are posted back to the
+ * site in batches. Other codes are still redirected to the site.
  */
 
 // Configuration - Update this with your Frappe Cloud site URL
 const FRAPPE_SITE_URL = 'https://your-site.frappe.cloud';
 
+const API_URL = `${FRAPPE_SITE_URL}/api/method/utm_shortener.utm_shortener.api`;
+// Not a valid short code, so it cannot clash with a link
+const SYNC_STATE_KEY = '!sync-state';
+const SNAPSHOT_PAGE_SIZE = 400;
+// KV operations per cron run; the rest continues on the next run
+const SYNC_OPERATION_BUDGET = 800;
+const BEACON_BATCH_SIZE = 100;
+const BEACON_FLUSH_MS = 5000;
+
 addEventListener('fetch', event => {
-  event.respondWith(handleRequest(event.request));
+  event.respondWith(handleRequest(event.request, event));
+});
+
+addEventListener('scheduled', event => {
+  event.waitUntil(syncLinks());
 });
 
-async function handleRequest(request) {
+async function handleRequest(request, event) {
   const url = new URL(request.url);
   const path = url.pathname;
   
@@ -35,22 +61,29 @@ async function handleRequest(request) {
     return handleRobotsTxt();
   } else {
     // Assume everything else is a short code
-    return handleShortCode(request, path);
+    return handleShortCode(request, path, event);
   }
 }
 
 /**
  * Handle short code redirects
  */
-async function handleShortCode(request, path) {
+async function handleShortCode(request, path, event) {
   // Remove leading slash
   const shortCode = path.substring(1);
   
   // Remove any trailing slashes
   const cleanCode = shortCode.replace(/\/$/, '');
   
+  // Redirect synced links here and report the click to the site
+  const link = await lookupLink(cleanCode);
+  if (link) {
+    queueClick(event, cleanCode, request);
+    return Response.redirect(link.u, 302);
+  }
+  
   // Build the redirect URL
-  const redirectUrl = `${FRAPPE_SITE_URL}/s/${cleanCode}`;
+  let redirectUrl = `${FRAPPE_SITE_URL}/s/${cleanCode}`;
   
   // Preserve query parameters if any
   const url = new URL(request.url);
@@ -65,6 +98,174 @@ async function handleShortCode(request, path) {
   return Response.redirect(redirectUrl, 301);
 }
 
+/**
+ * Synced link of a short code, or null if it is unknown here or expired
+ */
+async function lookupLink(shortCode) {
+  if (typeof LINKS === 'undefined' || !/^[A-Za-z0-9_-]+$/.test(shortCode)) {
+    return null;
+  }
+  
+  const link = await LINKS.get(shortCode.toLowerCase(), { type: 'json', cacheTtl: 60 });
+  // Expired links go to the site, which answers 410
+  if (!link || (link.e && link.e < Date.now())) {
+    return null;
+  }
+  return link;
+}
+
+/**
+ * Click beacons
+ *
+ * Clicks are buffered per isolate and posted together. Every request
+ * that buffers a click waits for the next flush, so the isolate stays
+ * alive until its clicks are sent.
+ */
+const pendingClicks = [];
+let scheduledFlush = null;
+
+function queueClick(event, shortCode, request) {
+  if (typeof ORIGIN_API_TOKEN === 'undefined') {
+    return;
+  }
+  
+  pendingClicks.push({
+    code: shortCode,
+    ts: Date.now(),
+    ip: request.headers.get('CF-Connecting-IP') || '',
+    ua: request.headers.get('User-Agent') || '',
+    ref: request.headers.get('Referer') || ''
+  });
+  
+  if (pendingClicks.length >= BEACON_BATCH_SIZE) {
+    event.waitUntil(flushClicks());
+    return;
+  }
+  
+  if (!scheduledFlush) {
+    scheduledFlush = new Promise(resolve => setTimeout(resolve, BEACON_FLUSH_MS)).then(() => {
+      scheduledFlush = null;
+      return flushClicks();
+    });
+  }
+  event.waitUntil(scheduledFlush);
+}
+
+async function flushClicks() {
+  if (!pendingClicks.length) {
+    return;
+  }
+  
+  const events = pendingClicks.splice(0, pendingClicks.length);
+  // The site ignores a batch id it has already seen, so retries are safe
+  const body = JSON.stringify({ events, batch_id: crypto.randomUUID() });
+  
+  for (let attempt = 1; attempt <= 3; attempt++) {
+    try {
+      const response = await fetch(`${API_URL}.ingest_edge_clicks`, {
+        method: 'POST',
+        headers: {
+          'Authorization': `token ${ORIGIN_API_TOKEN}`,
+          'Content-Type': 'application/json'
+        },
+        body
+      });
+      if (response.ok && (await response.json()).message.success) {
+        return;
+      }
+    } catch (e) {
+      // Retried below
+    }
+    await new Promise(resolve => setTimeout(resolve, attempt * 1000));
+  }
+  
+  console.log(`Dropped ${events.length} clicks after failed beacon posts`);
+}
+
+/**
+ * Copy the site's edge snapshot into LINKS
+ *
+ * Sync state: the version of the last applied snapshot, the cursor of
+ * a snapshot being applied, and the progress of removing links left
+ * over from before a full snapshot.
+ */
+async function syncLinks() {
+  if (typeof LINKS === 'undefined' || typeof ORIGIN_API_TOKEN === 'undefined') {
+    return;
+  }
+  
+  const state = (await LINKS.get(SYNC_STATE_KEY, { type: 'json' })) || {};
+  let budget = SYNC_OPERATION_BUDGET;
+  
+  while (budget > 0) {
+    if (state.prune) {
+      budget -= await pruneLinks(state);
+    } else {
+      const page = await fetchSnapshotPage(state);
+      
+      // Deletes first: a code can be deleted and created again
+      await Promise.all(page.delete.map(code => LINKS.delete(code)));
+      await Promise.all(page.upsert.map(([code, u, e]) =>
+        LINKS.put(code, JSON.stringify({ u, e }), { metadata: { v: page.version } })));
+      budget -= page.delete.length + page.upsert.length + 1;
+      
+      if (page.next) {
+        state.cursor = page.next;
+      } else {
+        delete state.cursor;
+        state.version = page.version;
+        if (page.full) {
+          state.prune = { version: page.version };
+        }
+      }
+    }
+    
+    await LINKS.put(SYNC_STATE_KEY, JSON.stringify(state));
+    if (!state.cursor && !state.prune) {
+      return;
+    }
+  }
+}
+
+async function fetchSnapshotPage(state) {
+  const params = new URLSearchParams({ limit: SNAPSHOT_PAGE_SIZE });
+  if (state.cursor) {
+    params.set('cursor', state.cursor);
+  } else if (state.version) {
+    params.set('since', state.version);
+  }
+  
+  const response = await fetch(`${API_URL}.export_edge_snapshot?${params}`, {
+    headers: { 'Authorization': `token ${ORIGIN_API_TOKEN}` }
+  });
+  if (!response.ok) {
+    throw new Error(`Snapshot export failed with status ${response.status}`);
+  }
+  
+  const page = (await response.json()).message;
+  if (!page.success) {
+    throw new Error(`Snapshot export failed: ${page.error}`);
+  }
+  return page;
+}
+
+/**
+ * Delete links a full snapshot did not include; returns the KV operations used
+ */
+async function pruneLinks(state) {
+  const list = await LINKS.list({ cursor: state.prune.cursor });
+  const stale = list.keys.filter(key =>
+    key.name !== SYNC_STATE_KEY && (!key.metadata || Number(key.metadata.v) < Number(state.prune.version)));
+  await Promise.all(stale.map(key => LINKS.delete(key.name)));
+  
+  if (list.list_complete) {
+    delete state.prune;
+  } else {
+    state.prune.cursor = list.cursor;
+  }
+  return stale.length + 1;
+}
+
 /**
  * Handle root domain requests
  */
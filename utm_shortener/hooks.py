@@ -120,11 +120,21 @@ permission_query_conditions = {
 
 scheduler_events = {
     "daily": [
-        "utm_shortener.tasks.cleanup_expired_urls"
+        "utm_shortener.tasks.cleanup_expired_urls",
+        "utm_shortener.tasks.rebuild_short_code_filter"
     ],
     "hourly": [
-        "utm_shortener.tasks.reset_rate_limits"
-    ]
+        "utm_shortener.tasks.persist_visitor_sketches",
+        "utm_shortener.tasks.update_geolocation_data",
+        "utm_shortener.tasks.save_short_code_filter"
+    ],
+    "cron": {
+        "* * * * *": [
+            "utm_shortener.tasks.process_click_queue",
+            "utm_shortener.tasks.flush_click_counters",
+            "utm_shortener.tasks.refill_code_pool"
+        ]
+    }
 }
 
 # Testing
@@ -150,10 +160,14 @@ scheduler_events = {
 #
 # auto_cancel_exempted_doctypes = ["Auto Repeat"]
 
+# Website page renderers
+# ----------------------
+page_renderer = ["utm_shortener.utm_shortener.utils.qr_codes.QRCodeRenderer"]
+
 # Request Events
 # ----------------
 # before_request = ["utm_shortener.utils.before_request"]
-# after_request = ["utm_shortener.utils.after_request"]
+after_request = ["utm_shortener.utm_shortener.utils.rate_limiter.add_response_headers"]
 
 # Job Events
 # ----------
@@ -210,6 +224,12 @@ fixtures = [
         "filters": [
             ["dt", "in", ["Short URL", "UTM Campaign"]]
         ]
+    },
+    {
+        "dt": "Role",
+        "filters": [
+            ["name", "in", ["UTM Edge"]]
+        ]
     }
 ]
 
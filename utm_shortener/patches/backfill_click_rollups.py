@@ -0,0 +1,10 @@
+import frappe
+from utm_shortener.utm_shortener.utils.click_rollups import rebuild_rollups
+
+def execute():
+    """Build URL Click Rollup rows for clicks logged before rollups existed"""
+    frappe.reload_doc("utm_shortener", "doctype", "url_click_log")
+    frappe.reload_doc("utm_shortener", "doctype", "url_click_rollup")
+    
+    rebuilt = rebuild_rollups()
+    print(f"Built {rebuilt} click rollup rows")
@@ -0,0 +1,24 @@
+import frappe
+
+def execute():
+    """Drop base64 QR codes stored on Short URL rows; they are rendered on demand now"""
+    if not frappe.db.has_column("Short URL", "qr_code"):
+        return
+    
+    # Small batches keep row locks short on large tables
+    cleared = 0
+    while True:
+        frappe.db.sql("""
+            UPDATE `tabShort URL`
+            SET qr_code = NULL
+            WHERE qr_code IS NOT NULL
+            LIMIT 10000
+        """)
+        count = frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+        frappe.db.commit()
+        
+        cleared += count
+        if count < 10000:
+            break
+    
+    print(f"Cleared stored QR codes from {cleared} short URLs")
@@ -17,10 +17,10 @@ frappe.ui.form.on('Short URL', {
             });
             
             frm.add_custom_button(__('Download QR Code'), function() {
-                if (frm.doc.qr_code) {
+                if (frm.doc.short_code) {
                     const link = document.createElement('a');
                     link.download = `qr-${frm.doc.short_code}.png`;
-                    link.href = frm.doc.qr_code;
+                    link.href = `/qr/${encodeURIComponent(frm.doc.short_code)}.png`;
                     link.click();
                 }
             });
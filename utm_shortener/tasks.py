@@ -3,6 +3,7 @@
 
 import frappe
 from frappe.utils import now_datetime, add_days
+from utm_shortener.utm_shortener.utils import click_backfill, click_counters, click_queue, code_filter, code_pool, geoip, visitor_sketches
 
 def cleanup_expired_urls():
     """Mark expired URLs as inactive"""
@@ -25,39 +26,77 @@ def cleanup_expired_urls():
     
     return "No expired URLs found"
 
-def reset_rate_limits():
-    """Reset hourly rate limits (if implemented)"""
-    # This is a placeholder for rate limit reset logic
-    # You can implement rate limiting using frappe.cache()
-    # or a custom DocType to track usage
-    pass
+def process_click_queue():
+    """Persist clicks queued by the redirect handlers"""
+    try:
+        processed = click_queue.process_click_queue()
+        return f"Persisted {processed} queued clicks"
+        
+    except Exception as e:
+        frappe.log_error(f"Error processing click queue: {str(e)}", "Click Queue Error")
+        return f"Error: {str(e)}"
+
+def flush_click_counters():
+    """Apply accumulated click and visitor counter deltas"""
+    try:
+        flushed = click_counters.flush_counters()
+        return f"Flushed counters for {flushed} short URLs"
+        
+    except Exception as e:
+        frappe.log_error(f"Error flushing click counters: {str(e)}", "Click Counter Error")
+        return f"Error: {str(e)}"
+
+def persist_visitor_sketches():
+    """Save unique visitor sketches changed in Redis to the database"""
+    try:
+        persisted = visitor_sketches.persist_dirty_sketches()
+        return f"Persisted {persisted} visitor sketches"
+        
+    except Exception as e:
+        frappe.log_error(f"Error persisting visitor sketches: {str(e)}", "Visitor Sketch Error")
+        return f"Error: {str(e)}"
+
+def refill_code_pool():
+    """Top up the pool of pre-allocated short codes"""
+    try:
+        added = code_pool.refill_pools()
+        return f"Added {added} codes to the short code pool"
+        
+    except Exception as e:
+        frappe.log_error(f"Error refilling short code pool: {str(e)}", "Code Pool Error")
+        return f"Error: {str(e)}"
 
 def update_geolocation_data():
-    """Update missing geolocation data for recent clicks"""
+    """Fill missing geolocation data for recent clicks from the local GeoIP database"""
     try:
-        settings = frappe.get_single("UTM Shortener Settings")
-        if not settings.enable_geolocation or not settings.geolocation_api_key:
+        if not geoip.get_reader():
             return "Geolocation is not enabled"
         
-        # Get clicks without geolocation data from the last 24 hours
-        clicks = frappe.db.sql("""
-            SELECT name, ip_address
-            FROM `tabURL Click Log`
-            WHERE country = 'Unknown'
-            AND ip_address IS NOT NULL
-            AND ip_address != ''
-            AND timestamp > DATE_SUB(NOW(), INTERVAL 24 HOUR)
-            LIMIT 100
-        """, as_dict=True)
-        
-        # Implement geolocation API call here
-        # This is a placeholder - you would integrate with a service like:
-        # - MaxMind GeoIP2
-        # - IPStack
-        # - IP-API
-        
-        return f"Processed {len(clicks)} clicks for geolocation"
+        processed = click_backfill.backfill_geolocation(since=add_days(now_datetime(), -1))
+        return f"Processed {processed} clicks for geolocation"
         
     except Exception as e:
         frappe.log_error(f"Error updating geolocation: {str(e)}", "Geolocation Update Error")
         return f"Error: {str(e)}"
+
+def save_short_code_filter():
+    """Save the short code filter so a restart does not need a full table scan"""
+    try:
+        if not code_filter.save_dump():
+            return "No short code filter to save"
+        return "Saved the short code filter"
+        
+    except Exception as e:
+        frappe.log_error(f"Error saving short code filter: {str(e)}", "Short Code Filter Error")
+        return f"Error: {str(e)}"
+
+def rebuild_short_code_filter():
+    """Rebuild the short code filter from the database, dropping deleted codes"""
+    try:
+        if not code_filter.rebuild(use_dump=False):
+            return "A short code filter rebuild is already running"
+        return "Rebuilt the short code filter"
+        
+    except Exception as e:
+        frappe.log_error(f"Error rebuilding short code filter: {str(e)}", "Short Code Filter Error")
+        return f"Error: {str(e)}"
@@ -0,0 +1,95 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from utm_shortener.utm_shortener.utils import code_filter
+
+
+def is_set(bitmap, position):
+    return bool(bitmap[position >> 3] & (0x80 >> (position & 7)))
+
+
+class TestCodeFilter(unittest.TestCase):
+    def test_get_size(self):
+        bits, hashes = code_filter.get_size(1000000)
+        self.assertEqual(hashes, 7)
+        self.assertAlmostEqual(bits / 1000000, 9.59, places=2)
+
+    def test_get_positions(self):
+        positions = code_filter.get_positions("AbC123", 1000, 7)
+        self.assertEqual(len(positions), 7)
+        self.assertTrue(all(code_filter.MARKER_BITS <= p < code_filter.MARKER_BITS + 1000 for p in positions))
+        # Short codes compare case-insensitively
+        self.assertEqual(positions, code_filter.get_positions("abc123", 1000, 7))
+        self.assertNotEqual(positions, code_filter.get_positions("abc124", 1000, 7))
+
+    def test_set_bits(self):
+        bits, hashes = 1000, 7
+        bitmap = code_filter.new_bitmap(bits)
+        self.assertTrue(is_set(bitmap, 0))
+        self.assertEqual(sum(bin(byte).count("1") for byte in bitmap), 1)
+
+        code_filter.set_bits(bitmap, "abc123", bits, hashes)
+        for position in code_filter.get_positions("abc123", bits, hashes):
+            self.assertTrue(is_set(bitmap, position))
+
+    def test_no_false_negatives(self):
+        capacity = 10000
+        bits, hashes = code_filter.get_size(capacity)
+        bitmap = code_filter.new_bitmap(bits)
+        codes = [f"code{i}" for i in range(capacity)]
+        for code in codes:
+            code_filter.set_bits(bitmap, code, bits, hashes)
+
+        def present(code):
+            return all(is_set(bitmap, p) for p in code_filter.get_positions(code, bits, hashes))
+
+        self.assertTrue(all(present(code) for code in codes))
+        false_positives = sum(present(f"other{i}") for i in range(capacity))
+        self.assertLess(false_positives / capacity, code_filter.FALSE_POSITIVE_RATE * 2)
+
+    def test_read_dump(self):
+        bits, hashes, capacity = 1000, 7, 100
+        bitmap = code_filter.new_bitmap(bits)
+        code_filter.set_bits(bitmap, "abc123", bits, hashes)
+        created = datetime(2025, 1, 2, 3, 4, 5, 678901)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, code_filter.DUMP_FILE)
+            with patch.object(code_filter, "get_dump_path", return_value=path):
+                self.assertIsNone(code_filter.read_dump())
+
+                header = code_filter.DUMP_HEADER.pack(code_filter.MAGIC, bits, hashes, capacity,
+                    str(created).encode())
+                with open(path, "wb") as f:
+                    f.write(header + bytes(bitmap))
+                dump = code_filter.read_dump()
+                self.assertEqual((dump["bits"], dump["hashes"], dump["capacity"]), (bits, hashes, capacity))
+                self.assertEqual(dump["bitmap"], bitmap)
+                self.assertEqual(dump["created"], created)
+
+                # Truncated bitmap
+                with open(path, "wb") as f:
+                    f.write(header + bytes(bitmap[:-1]))
+                self.assertIsNone(code_filter.read_dump())
+
+                # Foreign file
+                with open(path, "wb") as f:
+                    f.write(b"\0" * code_filter.DUMP_HEADER.size + bytes(bitmap))
+                self.assertIsNone(code_filter.read_dump())
+
+    def test_incremental_scan_includes_renamed_codes(self):
+        """Codes renamed after a dump must be added back, not only new rows"""
+        db = MagicMock()
+        db.sql.return_value = iter([("abc123",)])
+        with patch.object(code_filter.frappe, "db", db, create=True):
+            self.assertEqual(list(code_filter.iter_short_codes(datetime(2025, 1, 1))), ["abc123"])
+
+        query = db.sql.call_args[0][0]
+        self.assertIn("modified >= %(since)s", query)
+        self.assertNotIn("creation", query)
@@ -0,0 +1,129 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from utm_shortener.utm_shortener.utils import domain_policy
+from utm_shortener.utm_shortener.utils.domain_policy import DomainPolicy, hash_domain
+
+BLOCKLIST = """\
+# Plain domains
+malware.example
+  Phishing.Example.  # trailing comment
+*.wildcard.example
+||adblock.example^
+
+# Hosts file format
+0.0.0.0 hosts.example
+127.0.0.1 localhost
+0.0.0.0 first.example second.example
+::1 localhost.localdomain
+not/a/domain
+"""
+
+
+class TestDomainPolicy(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.source = os.path.join(self.directory, "blocklist.txt")
+        with open(self.source, "w") as f:
+            f.write(BLOCKLIST)
+
+    def compile_blocklist(self):
+        path = os.path.join(self.directory, "blocklist.bin")
+        domain_policy.compile_blocklist(self.source, path)
+        blocklist = domain_policy.Blocklist(path)
+        self.addCleanup(blocklist.close)
+        return blocklist
+
+    def test_normalize_domain(self):
+        for value, expected in [
+            ("Example.COM", "example.com"),
+            ("  example.com.  ", "example.com"),
+            ("*.example.com", "example.com"),
+            (".example.com", "example.com"),
+            ("||example.com^", "example.com"),
+            ("bücher.example", "xn--bcher-kva.example"),
+            ("example.com/path", None),
+            ("", None),
+            (None, None),
+            ("*.", None),
+        ]:
+            with self.subTest(value=value):
+                self.assertEqual(domain_policy.normalize_domain(value), expected)
+
+    def test_parse_host(self):
+        self.assertEqual(domain_policy.parse_host("https://User@WWW.Example.com:8443/a?b"), "www.example.com")
+        self.assertIsNone(domain_policy.parse_host("https:///path"))
+        self.assertIsNone(domain_policy.parse_host("http://[::1"))
+
+    def test_iter_suffixes(self):
+        self.assertEqual(list(domain_policy.iter_suffixes("a.b.example.com")),
+            ["a.b.example.com", "b.example.com", "example.com", "com"])
+
+    def test_iter_blocklist_domains(self):
+        self.assertEqual(list(domain_policy.iter_blocklist_domains(self.source)), [
+            "malware.example",
+            "phishing.example",
+            "wildcard.example",
+            "adblock.example",
+            "hosts.example",
+            "first.example",
+            "second.example",
+        ])
+
+    def test_compile_blocklist(self):
+        blocklist = self.compile_blocklist()
+        self.assertEqual(len(blocklist), 7)
+        for domain in domain_policy.iter_blocklist_domains(self.source):
+            self.assertIn(hash_domain(domain), blocklist)
+        self.assertNotIn(hash_domain("example"), blocklist)
+        self.assertNotIn(hash_domain("localhost"), blocklist)
+
+    def test_blocklist_rejects_foreign_file(self):
+        path = os.path.join(self.directory, "foreign.bin")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            domain_policy.Blocklist(path)
+
+    def test_is_allowed(self):
+        policy = DomainPolicy(blocked=["example.com"], allowed=["safe.example.com"])
+        for host, allowed in [
+            ("example.com", False),
+            ("www.example.com", False),
+            # An allowed subdomain inside a blocked parent
+            ("safe.example.com", True),
+            ("a.safe.example.com", True),
+            ("notexample.com", True),
+            ("example.org", True),
+        ]:
+            with self.subTest(host=host):
+                self.assertEqual(policy.is_allowed(host), allowed)
+
+    def test_blocked_subdomain_inside_allowed_parent(self):
+        policy = DomainPolicy(blocked=["bad.example.com"], allowed=["example.com"], allowed_only=True)
+        self.assertTrue(policy.is_allowed("www.example.com"))
+        self.assertFalse(policy.is_allowed("bad.example.com"))
+        self.assertFalse(policy.is_allowed("other.org"))
+
+    def test_allowed_domains_only(self):
+        policy = DomainPolicy(allowed=["example.com"], allowed_only=True)
+        self.assertTrue(policy.is_allowed("example.com"))
+        self.assertTrue(policy.is_allowed("shop.example.com"))
+        self.assertFalse(policy.is_allowed("example.org"))
+
+        # Without allowed domains the setting would reject everything, so it is ignored
+        self.assertTrue(DomainPolicy(allowed_only=True).is_allowed("example.org"))
+
+    def test_blocklist_policy(self):
+        policy = DomainPolicy(allowed=["ok.malware.example"], blocklist=self.compile_blocklist())
+        self.assertFalse(policy.is_allowed("malware.example"))
+        self.assertFalse(policy.is_allowed("cdn.wildcard.example"))
+        self.assertFalse(policy.is_allowed("x.hosts.example"))
+        self.assertTrue(policy.is_allowed("ok.malware.example"))
+        self.assertTrue(policy.is_allowed("example.org"))
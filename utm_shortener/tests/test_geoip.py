@@ -0,0 +1,109 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from utm_shortener.utm_shortener.utils import geoip
+
+# (ip, (country, city))
+CASES = [
+    ("192.0.2.1", ("United States", "New York")),
+    # Range boundaries
+    ("192.0.2.0", ("United States", "New York")),
+    ("192.0.2.127", ("United States", "New York")),
+    ("192.0.2.128", ("United States", "San Francisco")),
+    ("192.0.2.255", ("United States", "San Francisco")),
+    ("192.0.1.255", geoip.UNKNOWN),
+    ("192.0.3.0", geoip.UNKNOWN),
+    ("198.51.100.77", ("India", "Bengaluru")),
+    ("203.0.113.127", ("Germany", "Berlin")),
+    ("203.0.113.128", ("United Kingdom", "London")),
+    ("0.0.0.0", geoip.UNKNOWN),
+    ("255.255.255.255", geoip.UNKNOWN),
+    # IPv6
+    ("2001:db8::1", ("Japan", "Tokyo")),
+    ("2001:db8:0:ffff:ffff:ffff:ffff:ffff", ("Japan", "Tokyo")),
+    ("2001:db8:1::", ("Australia", "Sydney")),
+    ("2001:db8:2::5", ("Brazil", "")),
+    ("2001:db8:3::", geoip.UNKNOWN),
+    ("::", geoip.UNKNOWN),
+    # IPv4-mapped IPv6 is looked up as IPv4
+    ("::ffff:198.51.100.1", ("India", "Bengaluru")),
+    ("::ffff:10.0.0.1", geoip.UNKNOWN),
+    # Private, forwarded lists and garbage
+    ("10.0.0.1", geoip.UNKNOWN),
+    ("127.0.0.1", geoip.UNKNOWN),
+    ("fe80::1", geoip.UNKNOWN),
+    ("198.51.100.1, 10.0.0.1", ("India", "Bengaluru")),
+    ("not an ip", geoip.UNKNOWN),
+    ("", geoip.UNKNOWN),
+]
+
+
+class TestGeoIP(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def compile_sample(self):
+        path = os.path.join(self.directory, "sample.bin")
+        geoip.compile_csv(geoip.SAMPLE_DATABASE, path)
+        database = geoip.RangeDatabase(path)
+        self.addCleanup(database.close)
+        return database
+
+    def test_lookup(self):
+        reader = geoip.GeoIPReader(self.compile_sample())
+        for ip, location in CASES:
+            with self.subTest(ip=ip):
+                self.assertEqual(reader.lookup(ip), location)
+
+    def test_lookup_many(self):
+        reader = geoip.GeoIPReader(self.compile_sample())
+        self.assertEqual(reader.lookup_many([case[0] for case in CASES] + [None]),
+            [case[1] for case in CASES] + [geoip.UNKNOWN])
+
+    def test_overlapping_ranges(self):
+        csv_path = os.path.join(self.directory, "overlap.csv")
+        with open(csv_path, "w") as f:
+            f.write("192.0.2.0/24,A,\n192.0.2.128/25,B,\n")
+        with self.assertRaises(ValueError):
+            geoip.compile_csv(csv_path, os.path.join(self.directory, "overlap.bin"))
+
+    def test_recompile_on_mtime(self):
+        csv_path = os.path.join(self.directory, "ranges.csv")
+        shutil.copy(geoip.SAMPLE_DATABASE, csv_path)
+
+        def get_site_path(*parts):
+            return os.path.join(self.directory, "site", *parts)
+
+        def open_database():
+            database = geoip.open_database(csv_path)
+            self.addCleanup(database.close)
+            return geoip.GeoIPReader(database)
+
+        with patch.object(geoip.frappe, "get_site_path", get_site_path, create=True), \
+                patch.object(geoip, "compile_csv", wraps=geoip.compile_csv) as compile_csv:
+            reader = open_database()
+            self.assertTrue(os.path.exists(get_site_path("private", "geoip", "ranges.bin")))
+            self.assertEqual(reader.lookup("192.0.2.1"), ("United States", "New York"))
+            self.assertEqual(reader.lookup("100.64.0.1"), geoip.UNKNOWN)
+            self.assertEqual(compile_csv.call_count, 1)
+
+            # Unchanged CSV reuses the compiled table
+            open_database()
+            self.assertEqual(compile_csv.call_count, 1)
+
+            with open(csv_path, "a") as f:
+                f.write("100.64.0.0/10,Canada,Toronto\n")
+            compiled_mtime = os.path.getmtime(get_site_path("private", "geoip", "ranges.bin"))
+            os.utime(csv_path, (compiled_mtime + 10, compiled_mtime + 10))
+
+            reader = open_database()
+            self.assertEqual(compile_csv.call_count, 2)
+            self.assertEqual(reader.lookup("100.64.0.1"), ("Canada", "Toronto"))
+            self.assertEqual(reader.lookup("192.0.2.1"), ("United States", "New York"))
@@ -0,0 +1,64 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from utm_shortener.utm_shortener.utils import referrer
+
+# (referrer, source)
+CASES = [
+    ("", referrer.DIRECT),
+    (None, referrer.DIRECT),
+    ("https://www.facebook.com/", "Facebook"),
+    ("https://m.facebook.com/story.php?id=1", "Facebook"),
+    ("https://l.facebook.com/l.php?u=x", "Facebook"),
+    ("https://t.co/abc", "Twitter"),
+    ("https://x.com/someone/status/1", "Twitter"),
+    ("https://www.google.com/", "Google Search"),
+    ("https://www.google.co.uk/search?q=x", "Google Search"),
+    ("https://mail.google.com/mail/u/0/", "Email"),
+    ("https://search.yahoo.co.jp/search?p=x", "Yahoo Search"),
+    ("https://uk.pinterest.com/pin/1", "Pinterest"),
+    ("HTTPS://WWW.LinkedIn.COM/feed", "LinkedIn"),
+    ("facebook.com", "Facebook"),
+    ("https://www.facebook.com.:443/", "Facebook"),
+    # Suffixes only match on label boundaries
+    ("https://dropbox.com/s/x", "dropbox.com"),
+    ("https://notfacebook.com/", "notfacebook.com"),
+    ("https://example.org:8080/path", "example.org"),
+    # Malformed referrers have no host
+    ("http://", referrer.OTHER),
+    ("https:///path", referrer.OTHER),
+    ("///x", referrer.OTHER),
+    ("http://[::1", referrer.OTHER),
+    ("   ", referrer.OTHER),
+]
+
+
+class TestReferrer(unittest.TestCase):
+    def setUp(self):
+        referrer._classifiers.clear()
+
+    def classify(self, value, referrer_sources=""):
+        settings = SimpleNamespace(referrer_sources=referrer_sources)
+        with patch.object(referrer, "get_settings", return_value=settings):
+            return referrer.classify(value)
+
+    def test_classify(self):
+        for value, source in CASES:
+            with self.subTest(referrer=value):
+                self.assertEqual(self.classify(value), source)
+
+    def test_custom_sources(self):
+        custom = "# comment\nexample.org = Partner\nfacebook.com = Meta\nnot a mapping"
+        self.assertEqual(self.classify("https://blog.example.org/post", custom), "Partner")
+        self.assertEqual(self.classify("https://m.facebook.com/", custom), "Meta")
+        self.assertEqual(self.classify("https://t.co/abc", custom), "Twitter")
+
+    def test_parse_host(self):
+        self.assertEqual(referrer.parse_host("https://Www.Example.com.:8443/a?b"), "www.example.com")
+        self.assertIsNone(referrer.parse_host("http://"))
+        self.assertIsNone(referrer.parse_host("https:///path"))
+        self.assertIsNone(referrer.parse_host("///x"))
@@ -0,0 +1,36 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+import json
+import os
+import unittest
+from dataclasses import fields
+
+from utm_shortener.utm_shortener.utils.shortener_settings import ShortenerSettings
+
+DOCTYPE_JSON = os.path.join(os.path.dirname(__file__), "..", "utm_shortener", "doctype",
+    "utm_shortener_settings", "utm_shortener_settings.json")
+
+
+class TestShortenerSettings(unittest.TestCase):
+    def test_defaults_match_doctype(self):
+        """Never-saved settings read as the doctype defaults"""
+        with open(DOCTYPE_JSON) as f:
+            defaults = {field["fieldname"]: field["default"]
+                for field in json.load(f)["fields"] if field.get("default") is not None}
+
+        settings = ShortenerSettings.from_values({})
+        for field in fields(ShortenerSettings):
+            if field.name not in defaults:
+                continue
+            with self.subTest(field=field.name):
+                expected = ShortenerSettings.from_values({field.name: defaults[field.name]})
+                self.assertEqual(getattr(settings, field.name), getattr(expected, field.name))
+
+    def test_base_url(self):
+        self.assertEqual(ShortenerSettings.from_values({"base_domain": "go.example.com/"}).base_url,
+            "https://go.example.com")
+        self.assertEqual(ShortenerSettings.from_values({"base_domain": "go.example.com", "use_https": "0"}).base_url,
+            "http://go.example.com")
+        self.assertEqual(ShortenerSettings.from_values({"base_domain": "http://go.example.com"}).base_url,
+            "http://go.example.com")
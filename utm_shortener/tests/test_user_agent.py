@@ -0,0 +1,90 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+import unittest
+
+from utm_shortener.utm_shortener.utils import user_agent
+
+# (user agent, device type, browser, browser version, os, is_bot)
+CASES = [
+    (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36",
+        "Desktop", "Chrome", "120.0.0.0", "Windows", False,
+    ),
+    (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36 Edg/120.0.2210.91",
+        "Desktop", "Edge", "120.0.2210.91", "Windows", False,
+    ),
+    (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Version/17.1 Safari/605.1.15",
+        "Desktop", "Safari", "17.1", "macOS", False,
+    ),
+    (
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 "
+        "(KHTML, like Gecko) CriOS/119.0.6045.169 Mobile/15E148 Safari/604.1",
+        "Mobile", "Chrome", "119.0.6045.169", "iOS", False,
+    ),
+    (
+        "Mozilla/5.0 (iPad; CPU OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Version/16.6 Mobile/15E148 Safari/604.1",
+        "Tablet", "Safari", "16.6", "iOS", False,
+    ),
+    (
+        "Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/116.0.0.0 Mobile Safari/537.36",
+        "Mobile", "Chrome", "116.0.0.0", "Android", False,
+    ),
+    (
+        "Mozilla/5.0 (Linux; Android 13; SM-X700) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/116.0.0.0 Safari/537.36",
+        "Tablet", "Chrome", "116.0.0.0", "Android", False,
+    ),
+    (
+        "Mozilla/5.0 (Android 13; Tablet; rv:120.0) Gecko/120.0 Firefox/120.0",
+        "Tablet", "Firefox", "120.0", "Android", False,
+    ),
+    # In-app browsers append their own "Android (...)" after the Mobile token
+    (
+        "Mozilla/5.0 (Linux; Android 13; SM-S918B Build/TP1A.220624.014; wv) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Version/4.0 Chrome/116.0.5845.163 Mobile Safari/537.36 "
+        "Instagram 275.0.0.27.98 Android (33/13; 450dpi; 1080x2340; samsung; SM-S918B; dm3q; qcom; en_US; 458229237)",
+        "Mobile", "Instagram", "275.0.0.27.98", "Android", False,
+    ),
+    (
+        "Mozilla/5.0 (Linux; Android 12; SM-A525F Build/SP1A.210812.016; wv) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Version/4.0 Chrome/116.0.5845.163 Mobile Safari/537.36 "
+        "[FBAN/EMA;FBLC/en_US;FBAV/370.0.0.12.109;]",
+        "Mobile", "Facebook", "370.0.0.12.109", "Android", False,
+    ),
+    (
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Mobile/15E148 [FBAN/FBIOS;FBDV/iPhone14,5;FBMD/iPhone;FBSN/iOS;FBSV/16.6;FBSS/3;"
+        "FBID/phone;FBLC/en_US;FBOP/5;FBAV/432.0.0.29.102]",
+        "Mobile", "Facebook", "432.0.0.29.102", "iOS", False,
+    ),
+    (
+        "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+        "Unknown", "Unknown", "", "Unknown", True,
+    ),
+    (
+        "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)",
+        "Unknown", "Unknown", "", "Unknown", True,
+    ),
+    ("curl/8.4.0", "Unknown", "Unknown", "", "Unknown", True),
+    ("", "Unknown", "Unknown", "", "Unknown", False),
+]
+
+
+class TestUserAgent(unittest.TestCase):
+    def test_classify(self):
+        for ua, device_type, browser, browser_version, os_name, is_bot in CASES:
+            with self.subTest(ua=ua):
+                self.assertEqual(user_agent.classify(ua),
+                    user_agent.UserAgentInfo(device_type, browser, browser_version, os_name, is_bot))
+
+    def test_classify_many(self):
+        agents = [case[0] for case in CASES]
+        self.assertEqual(user_agent.classify_many(agents), [user_agent.classify(ua) for ua in agents])
@@ -1,13 +1,17 @@
 import frappe
 from frappe import _
 import json
-import re
-from datetime import datetime
+from utm_shortener.utm_shortener.doctype.short_url.short_url import ShortURL
+from utm_shortener.utm_shortener.utils import bulk_create, bulk_jobs, campaign_analytics, click_export, click_queue, code_pool, edge_beacons, edge_snapshot, link_importer, qr_codes, rate_limiter, redirect_errors, resolution_cache, visitor_sketches
 
 @frappe.whitelist(allow_guest=True)
 def redirect_short_url(short_code=None):
     """Handle short URL redirects"""
     try:
+        # Shed abusive clients before resolving anything
+        if not rate_limiter.hit("redirect").allowed:
+            raise frappe.TooManyRequestsError
+        
         # Get short_code from path if not provided
         if not short_code:
             path = frappe.local.request.path
@@ -15,16 +19,15 @@ def redirect_short_url(short_code=None):
                 short_code = path.split('/s/')[-1].strip('/')
         
         if not short_code:
-            frappe.throw(_("Short code not provided"))
-        
-        # Find the short URL document
-        short_url_name = frappe.db.get_value("Short URL", {"short_code": short_code}, "name")
+            return redirect_errors.respond(redirect_errors.INVALID)
         
-        if not short_url_name:
-            frappe.throw(_("Short URL not found"), frappe.DoesNotExistError)
+        # Resolve the short code through the redirect cache
+        entry = resolution_cache.resolve_short_code(short_code)
         
-        # Get the document
-        short_url_doc = frappe.get_doc("Short URL", short_url_name)
+        # Misses are answered directly, without an exception or an Error Log entry
+        reason = redirect_errors.get_reason(entry)
+        if reason:
+            return redirect_errors.respond(reason)
         
         # Prepare request data
         request_data = {
@@ -33,15 +36,19 @@ def redirect_short_url(short_code=None):
             "referrer": frappe.local.request.environ.get('HTTP_REFERER', '')
         }
         
-        # Track the click and get redirect URL
-        redirect_url = short_url_doc.track_click(request_data)
+        # Queue the click and redirect without waiting on the database
+        click_queue.enqueue_click(entry, request_data)
+        redirect_url = entry.target_url
         
         # Return redirect response
         frappe.local.response["type"] = "redirect"
         frappe.local.response["location"] = redirect_url
         
+    except frappe.TooManyRequestsError:
+        raise
+        
     except Exception as e:
-        frappe.log_error(f"Error in redirect_short_url: {str(e)}")
+        redirect_errors.log_sampled(f"Error in redirect_short_url: {str(e)}", "Short URL Redirect Error")
         frappe.local.response["type"] = "redirect"
         frappe.local.response["location"] = "/404"
 
@@ -53,17 +60,16 @@ def create_short_url(original_url, utm_campaign=None, custom_alias=None, expiry_
         if not check_rate_limit():
             frappe.throw(_("Rate limit exceeded. Please try again later."))
         
+        # Reject invalid or blocked destinations before any database access
+        ShortURL.validate_original_url(original_url)
+        
         # Validate custom alias if provided
         if custom_alias:
             if frappe.db.exists("Short URL", {"short_code": custom_alias}):
                 frappe.throw(_("Custom alias already exists"))
             
             # Validate alias format
-            if not re.match(r'^[a-zA-Z0-9_-]+$', custom_alias):
-                frappe.throw(_("Custom alias can only contain letters, numbers, hyphens, and underscores"))
-            
-            if len(custom_alias) < 3 or len(custom_alias) > 20:
-                frappe.throw(_("Custom alias must be between 3 and 20 characters"))
+            ShortURL.validate_alias_format(custom_alias)
         
         # Create short URL document
         short_url_doc = frappe.get_doc({
@@ -114,18 +120,18 @@ def get_url_analytics(short_code):
             limit=100
         )
         
-        # Get analytics summary
+        # Get analytics summary from the daily rollups. Rollup uniques are
+        # per row and cannot be summed, see short_url.unique_visitors instead
         analytics = frappe.db.sql("""
             SELECT 
-                COUNT(*) as total_clicks,
-                COUNT(DISTINCT ip_address) as unique_visitors,
-                DATE(timestamp) as date,
+                SUM(clicks) as total_clicks,
+                rollup_date as date,
                 device_type,
                 country,
                 browser
-            FROM `tabURL Click Log`
+            FROM `tabURL Click Rollup`
             WHERE short_url = %s
-            GROUP BY DATE(timestamp), device_type, country, browser
+            GROUP BY rollup_date, device_type, country, browser
             ORDER BY date DESC
             LIMIT 30
         """, (short_url.name,), as_dict=True)
@@ -137,6 +143,7 @@ def get_url_analytics(short_code):
                 "original_url": short_url.original_url,
                 "created": short_url.creation,
                 "total_clicks": short_url.clicks,
+                "unique_visitors": visitor_sketches.estimate(visitor_sketches.SCOPE_URL, short_url.name),
                 "status": short_url.status,
                 "expires": short_url.expiry_date
             },
@@ -161,38 +168,15 @@ def bulk_create_utm_urls(campaign, url_list):
         if not check_rate_limit(len(url_list)):
             frappe.throw(_("Rate limit exceeded for bulk creation"))
         
-        results = []
-        errors = []
-        
-        for i, url_data in enumerate(url_list):
-            try:
-                if isinstance(url_data, str):
-                    url_data = {"url": url_data}
-                
-                short_url_doc = frappe.get_doc({
-                    "doctype": "Short URL",
-                    "original_url": url_data.get("url"),
-                    "utm_campaign": campaign,
-                    "custom_alias": url_data.get("alias"),
-                    "status": "Active"
-                })
-                
-                short_url_doc.insert()
-                
-                results.append({
-                    "index": i,
-                    "original_url": short_url_doc.original_url,
-                    "short_code": short_url_doc.short_code,
-                    "short_url": short_url_doc.short_url,
-                    "utm_url": short_url_doc.generated_utm_url
-                })
-                
-            except Exception as e:
-                errors.append({
-                    "index": i,
-                    "url": url_data.get("url", ""),
-                    "error": str(e)
-                })
+        # Large lists would outlive the request timeout
+        if len(url_list) > bulk_jobs.get_async_threshold():
+            return {
+                "success": True,
+                "queued": True,
+                "job": bulk_jobs.enqueue_bulk_create(campaign, url_list)
+            }
+        
+        results, errors = bulk_create.bulk_create_short_urls(campaign, url_list)
         
         return {
             "success": True,
@@ -209,6 +193,54 @@ def bulk_create_utm_urls(campaign, url_list):
             "error": str(e)
         }
 
+@frappe.whitelist()
+def bulk_create_utm_urls_async(campaign, url_list=None, file_url=None):
+    """Queue a bulk import of a URL list or an uploaded CSV/JSONL file"""
+    try:
+        if isinstance(url_list, str):
+            url_list = json.loads(url_list)
+        
+        total = len(url_list) if url_list else link_importer.count_source_rows(file_url) if file_url else 0
+        if not check_rate_limit(total):
+            frappe.throw(_("Rate limit exceeded for bulk creation"))
+        
+        if file_url and not url_list:
+            # Files are streamed with resumable checkpoints
+            import_job = link_importer.start_import(file_url, campaign)
+            return {
+                "success": True,
+                "queued": True,
+                "import_job": import_job.name,
+                "total": total
+            }
+        
+        return {
+            "success": True,
+            "queued": True,
+            "job": bulk_jobs.enqueue_bulk_create(campaign, url_list)
+        }
+        
+    except Exception as e:
+        frappe.log_error(f"Error queueing bulk URL creation: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@frappe.whitelist()
+def get_bulk_job_status(job_id):
+    """Progress and result file of a queued bulk import"""
+    status = bulk_jobs.get_status(job_id)
+    
+    if not status or (status.get("user") != frappe.session.user
+            and "System Manager" not in frappe.get_roles()):
+        frappe.throw(_("Bulk job not found"), frappe.DoesNotExistError)
+    
+    return {
+        "success": True,
+        "job": status
+    }
+
 @frappe.whitelist()
 def create_utm_campaign(campaign_name, utm_source, utm_medium, utm_campaign, utm_term=None, utm_content=None, description=None):
     """Create a new UTM campaign"""
@@ -248,7 +280,7 @@ def create_utm_campaign(campaign_name, utm_source, utm_medium, utm_campaign, utm
         }
 
 @frappe.whitelist()
-def get_campaign_analytics(campaign_id):
+def get_campaign_analytics(campaign_id, page=1, page_length=100):
     """Get analytics data for a specific UTM campaign"""
     try:
         # Get the campaign
@@ -261,41 +293,12 @@ def get_campaign_analytics(campaign_id):
         if not frappe.has_permission("UTM Campaign", "read", campaign.name):
             frappe.throw(_("Insufficient permissions"))
         
-        # Get all short URLs for this campaign
-        short_urls = frappe.get_all("Short URL",
-            filters={"utm_campaign": campaign.name},
-            fields=["name", "short_code", "original_url", "clicks", "status", "creation"]
-        )
-        
-        # Get aggregated analytics
-        total_clicks = 0
-        total_unique_visitors = 0
-        
-        for url in short_urls:
-            # Get analytics for each short URL
-            click_data = frappe.db.sql("""
-                SELECT 
-                    COUNT(*) as clicks,
-                    COUNT(DISTINCT ip_address) as unique_visitors
-                FROM `tabURL Click Log`
-                WHERE short_url = %s
-            """, (url.name,), as_dict=True)[0]
-            
-            total_clicks += click_data.clicks
-            total_unique_visitors += click_data.unique_visitors
+        # Per-URL rows and campaign totals in a single query
+        url_stats = campaign_analytics.get_url_stats(campaign.name, page, page_length)
+        totals = url_stats["totals"]
         
         # Get conversion source breakdown
-        source_analytics = frappe.db.sql("""
-            SELECT 
-                ucl.referrer_source as source,
-                COUNT(*) as clicks,
-                COUNT(DISTINCT ucl.ip_address) as unique_visitors
-            FROM `tabURL Click Log` ucl
-            INNER JOIN `tabShort URL` su ON ucl.short_url = su.name
-            WHERE su.utm_campaign = %s
-            GROUP BY ucl.referrer_source
-            ORDER BY clicks DESC
-        """, (campaign.name,), as_dict=True)
+        source_analytics = campaign_analytics.get_source_breakdown(campaign.name)
         
         return {
             "success": True,
@@ -307,12 +310,13 @@ def get_campaign_analytics(campaign_id):
                 "created": campaign.creation
             },
             "analytics": {
-                "total_clicks": total_clicks,
-                "unique_visitors": total_unique_visitors,
-                "total_urls": len(short_urls),
-                "active_urls": len([u for u in short_urls if u.status == "Active"])
+                "total_clicks": totals["total_clicks"],
+                "unique_visitors": campaign_analytics.get_unique_visitors(campaign.name),
+                "total_urls": totals["total_urls"],
+                "active_urls": totals["active_urls"]
             },
-            "urls": short_urls,
+            "urls": url_stats["urls"],
+            "pagination": url_stats["pagination"],
             "source_breakdown": source_analytics
         }
         
@@ -323,21 +327,116 @@ def get_campaign_analytics(campaign_id):
             "error": str(e)
         }
 
-def check_rate_limit(count=1):
-    """Check if user is within rate limits"""
+@frappe.whitelist()
+def export_click_logs(dataset="clicks", format="csv", short_url=None, campaign=None, from_date=None, to_date=None, background=0):
+    """Stream click logs ("clicks") or daily analytics ("rollups") as CSV or Parquet
+    
+    With `background` set the export is written to a private File by a
+    background job, and a utm_shortener_export_ready realtime event carries
+    its URL.
+    """
+    filters = {
+        "short_url": short_url,
+        "campaign": campaign,
+        "from_date": from_date,
+        "to_date": to_date
+    }
+    
+    if frappe.utils.cint(background):
+        click_export.enqueue_export(dataset, format, filters)
+        return {
+            "success": True,
+            "queued": True,
+            "message": _("The export will be ready shortly")
+        }
+    
+    return click_export.stream_response(dataset, format, filters)
+
+@frappe.whitelist()
+def download_campaign_qr_codes(campaign, format="png", size=None, fill=None, background=None):
+    """Zip the QR codes of a campaign's links in the background
+    
+    A utm_shortener_qr_zip_ready realtime event carries the file URL.
+    """
     try:
-        settings = frappe.get_single("UTM Shortener Settings")
-        rate_limit = settings.rate_limit_per_hour or 100
+        options = qr_codes.make_options(format, size, fill=fill, background=background)
+        qr_codes.enqueue_campaign_zip(campaign, options)
         
-        # Count URLs created by user in last hour
-        one_hour_ago = datetime.now() - frappe.utils.datetime.timedelta(hours=1)
+        return {
+            "success": True,
+            "queued": True,
+            "message": _("The QR codes will be ready shortly")
+        }
         
-        existing_count = frappe.db.count("Short URL", {
-            "owner": frappe.session.user,
-            "creation": [">", one_hour_ago]
-        })
+    except Exception as e:
+        frappe.log_error(f"Error queueing campaign QR codes: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@frappe.whitelist()
+def get_code_pool_metrics():
+    """Size, refill and exhaustion counters of the short code pool"""
+    frappe.only_for("System Manager")
+    
+    return {
+        "success": True,
+        "pools": code_pool.get_metrics()
+    }
+
+@frappe.whitelist()
+def get_redirect_error_counts(hours=24):
+    """Failed redirects per hour and reason"""
+    frappe.only_for("System Manager")
+    
+    return {
+        "success": True,
+        "counts": redirect_errors.get_counts(min(frappe.utils.cint(hours) or 24, 24 * 7))
+    }
+
+@frappe.whitelist()
+def export_edge_snapshot(since=None, cursor=None, limit=None):
+    """Page of active short code -> target URL mappings, or of the changes since a version"""
+    frappe.only_for(("System Manager", edge_snapshot.EDGE_ROLE))
+    
+    try:
+        return {
+            "success": True,
+            **edge_snapshot.export_snapshot(since, cursor, limit)
+        }
         
-        return (existing_count + count) <= rate_limit
+    except Exception as e:
+        frappe.log_error(f"Error exporting edge snapshot: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@frappe.whitelist()
+def ingest_edge_clicks(events=None, batch_id=None):
+    """Queue a batch of clicks on links redirected at the edge"""
+    frappe.only_for(("System Manager", edge_snapshot.EDGE_ROLE))
+    
+    try:
+        if isinstance(events, str):
+            events = json.loads(events)
+        
+        accepted, rejected, duplicate = edge_beacons.ingest_clicks(events or [], batch_id)
+        return {
+            "success": True,
+            "accepted": accepted,
+            "rejected": rejected,
+            "duplicate": duplicate
+        }
         
-    except:
-        return True  # Allow if settings not configured
+    except Exception as e:
+        frappe.log_error(f"Error ingesting edge clicks: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def check_rate_limit(count=1):
+    """Count `count` creations against the caller's rate limit"""
+    return rate_limiter.hit("create", count).allowed
@@ -1,12 +1,13 @@
 import frappe
+from frappe import _
 from frappe.model.document import Document
 from frappe.utils import cstr, now_datetime, get_datetime
-import string
-import random
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
-import qrcode
-import io
-import base64
+import re
+from utm_shortener.utm_shortener.utils import click_counters, code_allocator, code_filter, code_pool, domain_policy, edge_snapshot, geoip, resolution_cache
+from utm_shortener.utm_shortener.utils.referrer import classify as classify_referrer
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
+from utm_shortener.utm_shortener.utils.user_agent import classify as classify_user_agent
 
 class ShortURL(Document):
     def before_insert(self):
@@ -15,6 +16,7 @@ class ShortURL(Document):
         if not self.short_code:
             if self.custom_alias:
                 self.short_code = self.custom_alias
+                code_pool.discard(code_allocator.SHORT_URL, self.short_code)
             else:
                 self.short_code = self.generate_short_code()
         
@@ -27,31 +29,17 @@ class ShortURL(Document):
     
     def get_short_url(self):
         """Generate the complete short URL using configured domain"""
-        settings = frappe.get_single("UTM Shortener Settings")
-        
-        # Get domain from settings
-        base_domain = settings.base_domain or frappe.utils.get_url()
-        
-        # Clean up the domain - remove trailing slashes
-        base_domain = base_domain.rstrip('/')
-        
-        # If base_domain doesn't include protocol, add it based on use_https setting
-        if not base_domain.startswith(('http://', 'https://')):
-            protocol = 'https' if settings.use_https else 'http'
-            base_domain = f"{protocol}://{base_domain}"
-        
-        # Generate the short URL
-        return f"{base_domain}/s/{self.short_code}"
+        return f"{ShortURL.get_base_url()}/s/{self.short_code}"
+    
+    @staticmethod
+    def get_base_url():
+        """Configured short link domain, with protocol and without trailing slash"""
+        # Fall back to the site URL when no domain is configured
+        return get_settings().base_url or frappe.utils.get_url().rstrip('/')
     
     def generate_short_code(self):
         """Generate unique short code"""
-        length = 6
-        characters = string.ascii_lowercase + string.digits
-        
-        while True:
-            code = ''.join(random.choice(characters) for _ in range(length))
-            if not frappe.db.exists("Short URL", {"short_code": code}):
-                return code
+        return code_pool.pop(code_allocator.SHORT_URL)
     
     def generate_utm_url(self):
         """Generate URL with UTM parameters"""
@@ -61,8 +49,13 @@ class ShortURL(Document):
         # Get UTM campaign details
         campaign = frappe.get_doc("UTM Campaign", self.utm_campaign)
         
+        return ShortURL.build_utm_url(self.original_url, campaign)
+    
+    @staticmethod
+    def build_utm_url(original_url, campaign):
+        """Add the UTM parameters of a campaign to a URL"""
         # Parse the original URL
-        parsed = urlparse(self.original_url)
+        parsed = urlparse(original_url)
         params = parse_qs(parsed.query)
         
         # Add UTM parameters
@@ -87,33 +80,12 @@ class ShortURL(Document):
         
         return urlunparse(new_parsed)
     
-    def generate_qr_code(self):
-        """Generate QR code for the short URL"""
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        
-        qr.add_data(self.short_url)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
-        self.qr_code = f"data:image/png;base64,{img_str}"
-    
     def track_click(self, request_data=None):
         """Track click and return redirect URL"""
-        # Increment click counter
+        # Increment click counter atomically instead of saving the document
         self.clicks = (self.clicks or 0) + 1
         self.last_clicked = now_datetime()
-        self.save(ignore_permissions=True)
+        click_counters.increment(self.name, clicks=1, last_clicked=self.last_clicked)
         
         # Create click log entry
         if request_data:
@@ -127,27 +99,12 @@ class ShortURL(Document):
     def create_click_log(self, request_data):
         """Create a click log entry"""
         try:
-            # Parse user agent for device and browser info
-            user_agent = request_data.get('user_agent', '')
-            device_info = self.parse_user_agent(user_agent)
-            
-            # Parse referrer for source tracking
-            referrer = request_data.get('referrer', '')
-            referrer_source = self.get_referrer_source(referrer)
-            
             # Create log entry
             click_log = frappe.get_doc({
                 'doctype': 'URL Click Log',
                 'short_url': self.name,
-                'timestamp': now_datetime(),
-                'ip_address': request_data.get('ip_address', ''),
-                'user_agent': user_agent,
-                'referrer': referrer,
-                'referrer_source': referrer_source,
-                'device_type': device_info.get('device_type', 'Unknown'),
-                'browser': device_info.get('browser', 'Unknown'),
-                'operating_system': device_info.get('os', 'Unknown'),
-                'country': self.get_country_from_ip(request_data.get('ip_address'))
+                'timestamp': request_data.get('timestamp') or now_datetime(),
+                **self.get_click_details(request_data)
             })
             
             click_log.insert(ignore_permissions=True)
@@ -155,106 +112,60 @@ class ShortURL(Document):
         except Exception as e:
             frappe.log_error(f"Error creating click log: {str(e)}")
     
-    def parse_user_agent(self, user_agent):
-        """Parse user agent string to extract device and browser info"""
-        # Simple parsing - in production, use a proper user agent parser
-        device_type = 'Desktop'
-        browser = 'Unknown'
-        os = 'Unknown'
+    @staticmethod
+    def get_click_details(request_data):
+        """Derive the URL Click Log fields for a click's request data"""
+        # Parse user agent for device and browser info
+        user_agent = request_data.get('user_agent', '')
+        device_info = ShortURL.parse_user_agent(user_agent)
         
-        ua_lower = user_agent.lower()
+        # Parse referrer for source tracking
+        referrer = request_data.get('referrer', '')
+        referrer_source = ShortURL.get_referrer_source(referrer)
         
-        # Detect device type
-        if 'mobile' in ua_lower or 'android' in ua_lower:
-            device_type = 'Mobile'
-        elif 'tablet' in ua_lower or 'ipad' in ua_lower:
-            device_type = 'Tablet'
-        
-        # Detect browser
-        if 'chrome' in ua_lower:
-            browser = 'Chrome'
-        elif 'firefox' in ua_lower:
-            browser = 'Firefox'
-        elif 'safari' in ua_lower:
-            browser = 'Safari'
-        elif 'edge' in ua_lower:
-            browser = 'Edge'
-        
-        # Detect OS
-        if 'windows' in ua_lower:
-            os = 'Windows'
-        elif 'mac' in ua_lower:
-            os = 'macOS'
-        elif 'linux' in ua_lower:
-            os = 'Linux'
-        elif 'android' in ua_lower:
-            os = 'Android'
-        elif 'ios' in ua_lower or 'iphone' in ua_lower:
-            os = 'iOS'
+        country, city = ShortURL.get_location_from_ip(request_data.get('ip_address'))
         
         return {
-            'device_type': device_type,
-            'browser': browser,
-            'os': os
+            'ip_address': request_data.get('ip_address', ''),
+            'user_agent': user_agent,
+            'referrer_url': referrer,
+            'referrer_source': referrer_source,
+            'device_type': device_info.get('device_type', 'Unknown'),
+            'browser': device_info.get('browser', 'Unknown'),
+            'browser_version': device_info.get('browser_version', ''),
+            'operating_system': device_info.get('os', 'Unknown'),
+            'is_bot': 1 if device_info.get('is_bot') else 0,
+            'country': country,
+            'city': city
         }
     
-    def get_referrer_source(self, referrer):
-        """Determine the source from referrer URL"""
-        if not referrer:
-            return 'Direct'
-        
-        referrer_lower = referrer.lower()
-        
-        # Social media sources
-        social_sources = {
-            'facebook.com': 'Facebook',
-            'twitter.com': 'Twitter',
-            'x.com': 'Twitter',
-            'linkedin.com': 'LinkedIn',
-            'instagram.com': 'Instagram',
-            'youtube.com': 'YouTube',
-            'pinterest.com': 'Pinterest',
-            'reddit.com': 'Reddit',
-            'tiktok.com': 'TikTok'
-        }
-        
-        for domain, source in social_sources.items():
-            if domain in referrer_lower:
-                return source
+    @staticmethod
+    def parse_user_agent(user_agent):
+        """Parse user agent string to extract device and browser info"""
+        info = classify_user_agent(user_agent or '')
         
-        # Search engines
-        search_engines = {
-            'google.': 'Google',
-            'bing.': 'Bing',
-            'yahoo.': 'Yahoo',
-            'duckduckgo.': 'DuckDuckGo',
-            'baidu.': 'Baidu'
+        return {
+            'device_type': info.device_type,
+            'browser': info.browser,
+            'browser_version': info.browser_version,
+            'os': info.os,
+            'is_bot': info.is_bot
         }
-        
-        for domain, source in search_engines.items():
-            if domain in referrer_lower:
-                return f"{source} Search"
-        
-        # Email clients
-        if 'mail.' in referrer_lower or 'outlook.' in referrer_lower:
-            return 'Email'
-        
-        # Extract domain from referrer
-        try:
-            parsed = urlparse(referrer)
-            domain = parsed.netloc
-            if domain:
-                return domain
-        except:
-            pass
-        
-        return 'Other'
     
-    def get_country_from_ip(self, ip_address):
+    @staticmethod
+    def get_referrer_source(referrer):
+        """Determine the source from referrer URL"""
+        return classify_referrer(referrer)
+    
+    @staticmethod
+    def get_country_from_ip(ip_address):
         """Get country from IP address"""
-        # This is a placeholder - integrate with GeoIP service
-        # For now, return Unknown
-        return 'Unknown'
+        return ShortURL.get_location_from_ip(ip_address)[0]
+    
+    @staticmethod
+    def get_location_from_ip(ip_address):
+        """Get (country, city) from the local GeoIP database"""
+        return geoip.lookup(ip_address)
     
     def is_expired(self):
         """Check if URL has expired"""
@@ -266,8 +177,7 @@ class ShortURL(Document):
     def validate(self):
         """Validate the document"""
         # Validate URL format
-        if not self.original_url.startswith(('http://', 'https://')):
-            frappe.throw(_("URL must start with http:// or https://"))
+        ShortURL.validate_original_url(self.original_url)
         
         # Validate custom alias if provided
         if self.custom_alias:
@@ -277,6 +187,45 @@ class ShortURL(Document):
         # Check expiry date
         if self.expiry_date and get_datetime(self.expiry_date) < now_datetime():
             frappe.throw(_("Expiry date cannot be in the past"))
+    
+    @staticmethod
+    def validate_original_url(original_url):
+        """Only http(s) URLs to domains allowed by the domain policy can be shortened"""
+        if not (original_url or '').startswith(('http://', 'https://')):
+            frappe.throw(_("URL must start with http:// or https://"))
+        
+        domain_policy.validate_url(original_url)
+    
+    @staticmethod
+    def validate_alias_format(custom_alias):
+        """Custom aliases are 3-20 letters, numbers, hyphens or underscores"""
+        if not re.match(r'^[a-zA-Z0-9_-]+$', custom_alias):
+            frappe.throw(_("Custom alias can only contain letters, numbers, hyphens, and underscores"))
+        
+        if len(custom_alias) < 3 or len(custom_alias) > 20:
+            frappe.throw(_("Custom alias must be between 3 and 20 characters"))
+    
+    def on_update(self):
+        """Invalidate the redirect cache when resolution fields change"""
+        # Click tracking saves the document too, so only react to relevant changes
+        if not any(self.has_value_changed(field) for field in resolution_cache.RESOLUTION_FIELDS):
+            return
+        
+        resolution_cache.invalidate_on_commit(self.short_code)
+        
+        # New and renamed codes must never read as unknown on the redirect path
+        if self.has_value_changed("short_code"):
+            code_filter.add(self.short_code)
+        
+        previous = self.get_doc_before_save()
+        if previous and previous.short_code != self.short_code:
+            resolution_cache.invalidate_on_commit(previous.short_code)
+            edge_snapshot.record_deleted_on_commit(previous.short_code)
+    
+    def on_trash(self):
+        """Remove the short code from the redirect cache and edge snapshots"""
+        resolution_cache.invalidate_on_commit(self.short_code)
+        edge_snapshot.record_deleted_on_commit(self.short_code)
 
 def get_permission_query_conditions(user):
     """Return conditions for list queries"""
@@ -0,0 +1,2 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
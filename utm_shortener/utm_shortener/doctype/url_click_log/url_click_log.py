@@ -3,24 +3,35 @@
 
 import frappe
 from frappe.model.document import Document
+from frappe.utils import now_datetime
+from utm_shortener.utm_shortener.utils import click_counters, click_rollups, visitor_sketches
+
+ROLLUP_SOURCE_FIELDS = ("short_url", "timestamp", "ip_address", "device_type", "browser",
+    "operating_system", "country", "referrer_source")
 
 class URLClickLog(Document):
     def after_insert(self):
         """Process analytics data after insert"""
+        campaign = frappe.db.get_value("Short URL", self.short_url, "utm_campaign")
+        
         # Update unique visitor count if needed
-        self.update_unique_visitors()
+        self.update_unique_visitors(campaign)
+        
+        # Fold the click into the daily rollup
+        self.update_rollup(campaign)
         
-    def update_unique_visitors(self):
+    def update_unique_visitors(self, campaign=None):
         """Update unique visitor count based on IP"""
-        # Check if this IP has visited this URL before
-        existing = frappe.db.exists("URL Click Log", {
-            "short_url": self.short_url,
-            "ip_address": self.ip_address,
-            "name": ["!=", self.name]
-        })
+        # Check the visitor sketch instead of scanning the click log
+        new_visitors = visitor_sketches.add_visits([
+            (self.short_url, campaign, self.timestamp or now_datetime(), self.ip_address)
+        ])
         
-        if not existing:
+        if new_visitors.get(self.short_url):
             # This is a unique visitor
-            short_url_doc = frappe.get_doc("Short URL", self.short_url)
-            short_url_doc.unique_visitors = (short_url_doc.unique_visitors or 0) + 1
-            short_url_doc.save(ignore_permissions=True)
+            click_counters.increment(self.short_url, unique_visitors=1)
+    
+    def update_rollup(self, campaign=None):
+        """Add this click to URL Click Rollup"""
+        row = tuple(self.get(field) for field in ROLLUP_SOURCE_FIELDS)
+        click_rollups.update_from_click_logs([row], ROLLUP_SOURCE_FIELDS, {self.short_url: campaign})
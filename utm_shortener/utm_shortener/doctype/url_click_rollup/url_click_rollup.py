@@ -0,0 +1,8 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+class URLClickRollup(Document):
+    pass
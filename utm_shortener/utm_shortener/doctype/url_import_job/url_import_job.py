@@ -0,0 +1,17 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from utm_shortener.utm_shortener.utils import link_importer
+
+class URLImportJob(Document):
+    @frappe.whitelist()
+    def resume(self):
+        """Queue a failed import again; it continues after its last checkpoint"""
+        if self.status != "Failed":
+            frappe.throw(_("Only failed imports can be resumed"))
+        
+        self.db_set("status", "Queued")
+        link_importer.enqueue_import(self.name)
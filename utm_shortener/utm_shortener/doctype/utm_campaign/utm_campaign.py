@@ -4,6 +4,7 @@ from urllib.parse import urlencode
 import re
 import string
 import random
+from utm_shortener.utm_shortener.utils import campaign_analytics
 
 class UTMCampaign(Document):
     def before_save(self):
@@ -82,32 +83,29 @@ class UTMCampaign(Document):
     
     def get_campaign_analytics(self):
         """Get click analytics for this campaign"""
-        # Get all short URLs for this campaign
-        short_urls = frappe.get_all("Short URL", 
-            filters={"utm_campaign": self.name},
-            fields=["name", "short_code", "clicks", "original_url", "status"]
-        )
+        # Get all short URLs for this campaign with totals in one query
+        url_stats = campaign_analytics.get_url_stats(self.name, page_length=None)
+        short_urls = url_stats["urls"]
+        total_clicks = url_stats["totals"]["total_clicks"]
         
-        total_clicks = sum([url.get('clicks', 0) for url in short_urls])
-        
-        # Get click details from logs
+        # Get click details from the daily rollups. Rollup uniques cannot be
+        # summed across rows, campaign uniques come from the visitor sketches
         click_logs = frappe.db.sql("""
             SELECT 
-                COUNT(*) as total_clicks,
-                COUNT(DISTINCT ip_address) as unique_visitors,
+                SUM(clicks) as total_clicks,
                 device_type,
                 country,
-                DATE(timestamp) as click_date
-            FROM `tabURL Click Log` ucl
-            INNER JOIN `tabShort URL` su ON ucl.short_url = su.name
-            WHERE su.utm_campaign = %s
-            GROUP BY device_type, country, DATE(timestamp)
+                rollup_date as click_date
+            FROM `tabURL Click Rollup`
+            WHERE utm_campaign = %s
+            GROUP BY device_type, country, rollup_date
             ORDER BY click_date DESC
         """, (self.name,), as_dict=True)
         
         return {
             "total_urls": len(short_urls),
             "total_clicks": total_clicks,
+            "unique_visitors": campaign_analytics.get_unique_visitors(self.name),
             "urls": short_urls,
             "click_details": click_logs
         }
@@ -1,7 +1,7 @@
 import frappe
 from frappe.model.document import Document
-import shortuuid
 from datetime import datetime, timedelta
+from utm_shortener.utm_shortener.utils import code_allocator
 
 class UTMLink(Document):
     def before_insert(self):
@@ -16,11 +16,7 @@ class UTMLink(Document):
         """
         Generate a unique short code
         """
-        while True:
-            code = shortuuid.uuid()[:8]
-            # Ensure unique code
-            if not frappe.db.exists('UTM Link', {'short_code': code}):
-                return code
+        return code_allocator.allocate_one(code_allocator.UTM_LINK)
     
     def is_expired(self):
         """
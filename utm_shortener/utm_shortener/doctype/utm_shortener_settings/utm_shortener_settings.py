@@ -1,9 +1,13 @@
 # Copyright (c) 2025, Chinmay Bhat and contributors
 # For license information, please see license.txt
 
+import os
+
 import frappe
 from frappe.model.document import Document
 
+from utm_shortener.utm_shortener.utils import domain_policy, shortener_settings
+
 class UTMShortenerSettings(Document):
     def validate(self):
         """Validate settings"""
@@ -15,8 +19,17 @@ class UTMShortenerSettings(Document):
         if self.rate_limit_per_hour and self.rate_limit_per_hour < 1:
             frappe.throw("Rate limit must be at least 1 per hour")
         
-        # Clean blocked domains
-        if self.blocked_domains:
-            # Remove duplicates and clean up
-            domains = set([d.strip().lower() for d in self.blocked_domains.split(',') if d.strip()])
-            self.blocked_domains = ','.join(sorted(domains))
+        # Clean blocked and allowed domains
+        for field in ("blocked_domains", "allowed_domains"):
+            if self.get(field):
+                # Remove duplicates and clean up
+                domains = set([domain_policy.normalize_domain(d) for d in self.get(field).replace('\n', ',').split(',')])
+                self.set(field, ','.join(sorted(d for d in domains if d)))
+        
+        # The blocklist file is read by every worker
+        if self.blocklist_path and not os.path.isfile(domain_policy.resolve_blocklist_path(self.blocklist_path)):
+            frappe.throw(f"Blocklist file {self.blocklist_path} does not exist")
+
+    def on_update(self):
+        """Drop cached values derived from these settings"""
+        shortener_settings.clear_cache()
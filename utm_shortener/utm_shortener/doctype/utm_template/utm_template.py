@@ -3,8 +3,7 @@
 
 import frappe
 from frappe.model.document import Document
-import string
-import random
+from utm_shortener.utm_shortener.utils import code_allocator
 
 class UTMTemplate(Document):
     def before_insert(self):
@@ -14,14 +13,7 @@ class UTMTemplate(Document):
     
     def generate_template_code(self):
         """Generate unique template code"""
-        prefix = "TMPL-"
-        for _ in range(100):
-            code = prefix + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            if not frappe.db.exists("UTM Template", {"template_code": code}):
-                return code
-        
-        # Fallback
-        return prefix + frappe.utils.now_datetime().strftime("%Y%m%d%H%M%S")
+        return code_allocator.allocate_one(code_allocator.UTM_TEMPLATE)
     
     def create_campaign_from_template(self, campaign_name, base_url=None):
         """Create a new UTM Campaign from this template"""
@@ -20,9 +20,6 @@ scheduler_events = {
     "daily": [
         "utm_shortener.utm_shortener.tasks.cleanup_expired_urls",
         "utm_shortener.utm_shortener.tasks.update_geolocation_data"
-    ],
-    "hourly": [
-        "utm_shortener.utm_shortener.tasks.reset_rate_limits"
     ]
 }
 
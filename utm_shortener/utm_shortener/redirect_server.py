@@ -0,0 +1,214 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+asyncio HTTP server for ``/s/<short_code>`` redirects of one site.
+
+Same redirects as ``redirect_wsgi``, served by ``AsyncRedirectCore``
+(see ``utils.redirect_core``). A slow cache miss only holds up its own
+request. Each process keeps thousands of keep-alive connections on one
+event loop and shares a few pooled Redis and database connections
+between them. Concurrent misses for the same code share one query, and
+clicks are pushed to the queue in batches.
+
+The HTTP/1.1 handling is deliberately small: GET and HEAD requests,
+keep-alive, no request bodies and no TLS. Put it behind nginx, from the
+bench's ``sites`` directory:
+
+    ../env/bin/python -m utm_shortener.utm_shortener.redirect_server \\
+        --site links.example.com --port 8011 --workers 4
+
+Workers share the port through SO_REUSEPORT. The database is queried
+with aiomysql when it is installed, otherwise with pymysql in a thread
+pool.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+from utm_shortener.utm_shortener.utils import redirect_errors
+from utm_shortener.utm_shortener.utils.redirect_core import (
+    PATH_PATTERN,
+    AsyncRedirectCore,
+    SiteConfig,
+    error_response,
+    get_client_ip,
+    miss_response,
+    rate_limited_response,
+    redirect_response,
+)
+
+logger = logging.getLogger(__name__)
+
+KEEP_ALIVE_TIMEOUT = 75
+MAX_HEADERS = 100
+# Ask clients to reconnect now and then, so load spreads over the workers
+MAX_KEEP_ALIVE_REQUESTS = 1000
+
+
+class BadRequest(Exception):
+    pass
+
+
+async def read_request(reader):
+    """(method, path, version, headers) of the next request, or None at end of stream"""
+    line = await reader.readline()
+    if not line:
+        return None
+
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise BadRequest
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n"):
+            break
+        if not line or len(headers) >= MAX_HEADERS:
+            raise BadRequest
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("content-length", "0") != "0" or "transfer-encoding" in headers:
+        raise BadRequest
+
+    return method, target.split("?", 1)[0], version, headers
+
+
+def write_response(writer, status, headers, body, keep_alive, head=False):
+    lines = [f"HTTP/1.1 {status}"]
+    lines.extend(f"{name}: {value}" for name, value in headers)
+    lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (b"" if head else body))
+
+
+class RedirectServer:
+    def __init__(self, core):
+        self.core = core
+
+    async def handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        remote_addr = peer[0] if peer else ""
+        try:
+            for served in range(1, MAX_KEEP_ALIVE_REQUESTS + 1):
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except BadRequest:
+                    write_response(writer, "400 Bad Request", [("Content-Length", "0")], b"", False)
+                    break
+                if request is None:
+                    break
+
+                method, path, version, headers = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = served < MAX_KEEP_ALIVE_REQUESTS and (
+                    connection == "keep-alive" if version == "HTTP/1.0" else connection != "close")
+
+                status, response_headers, body = await self.respond(method, path, headers, remote_addr)
+                write_response(writer, status, response_headers, body, keep_alive, head=method == "HEAD")
+                await writer.drain()
+                if not keep_alive:
+                    break
+
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, path, headers, remote_addr):
+        match = PATH_PATTERN.match(path)
+        if not match or method not in ("GET", "HEAD"):
+            return miss_response(redirect_errors.INVALID)
+
+        try:
+            return await self.redirect(match.group(1), headers, remote_addr)
+        except Exception:
+            logger.exception("Error redirecting %s", path)
+            return error_response()
+
+    async def redirect(self, short_code, headers, remote_addr):
+        core = self.core
+        await core.refresh_settings()
+        ip_address = get_client_ip(headers.get("x-forwarded-for"), remote_addr)
+
+        # Shed abusive clients before resolving anything
+        limit = await core.hit_rate_limit(ip_address)
+        if limit and not limit.allowed:
+            return rate_limited_response(limit)
+
+        entry = await core.resolve(short_code)
+        reason = core.get_reason(entry)
+        if reason:
+            await core.record_miss(reason)
+            return miss_response(reason)
+
+        core.enqueue_click(entry, ip_address, headers.get("user-agent", ""), headers.get("referer", ""))
+        return redirect_response(entry, limit)
+
+
+async def serve(config, host, port, reuse_port=False):
+    core = AsyncRedirectCore(config)
+    await core.start()
+    server = await asyncio.start_server(RedirectServer(core).handle_connection, host, port,
+        reuse_port=reuse_port, backlog=1024)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("Serving redirects for %s on %s:%s (pid %s)", config.site, host, port, os.getpid())
+    async with server:
+        await stop.wait()
+    # Queued clicks are pushed before exiting
+    await core.close()
+
+
+def run(config, host, port, reuse_port=False):
+    asyncio.run(serve(config, host, port, reuse_port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve /s/<short_code> redirects for a site")
+    parser.add_argument("--site", default=os.environ.get("UTM_SHORTENER_SITE"), required="UTM_SHORTENER_SITE" not in os.environ)
+    parser.add_argument("--sites-path", default=os.environ.get("UTM_SHORTENER_SITES_PATH", "."))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    config = SiteConfig.load(args.sites_path, args.site)
+    if args.workers <= 1:
+        run(config, args.host, args.port)
+        return
+
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            run(config, args.host, args.port, reuse_port=True)
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    main()
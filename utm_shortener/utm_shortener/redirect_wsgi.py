@@ -0,0 +1,99 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Standalone WSGI app serving ``/s/<short_code>`` redirects for one site.
+
+It answers the same redirects as ``www/s.py`` without going through the
+Frappe request cycle (see ``utils.redirect_core``). Run it next to the
+site's web workers, from the bench's ``sites`` directory:
+
+    UTM_SHORTENER_SITE=links.example.com \\
+        ../env/bin/gunicorn --chdir sites -w 4 -b 127.0.0.1:8010 \\
+        utm_shortener.utm_shortener.redirect_wsgi:application
+
+and route only ``/s/`` to it in nginx:
+
+    location /s/ {
+        proxy_pass http://127.0.0.1:8010;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    }
+
+``UTM_SHORTENER_SITES_PATH`` overrides the sites directory. Every other
+path gets a 404, so the rest of the site keeps using the Frappe workers.
+"""
+
+import logging
+import os
+import threading
+
+from utm_shortener.utm_shortener.utils import redirect_errors
+from utm_shortener.utm_shortener.utils.redirect_core import (
+    PATH_PATTERN,
+    RedirectCore,
+    SiteConfig,
+    error_response,
+    get_client_ip,
+    miss_response,
+    rate_limited_response,
+    redirect_response,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RedirectApp:
+    """WSGI callable; the site connections are opened by the first request in each worker"""
+
+    def __init__(self, site=None, sites_path=None):
+        self.site = site
+        self.sites_path = sites_path
+        self._core = None
+        self._lock = threading.Lock()
+
+    @property
+    def core(self):
+        if self._core is None:
+            with self._lock:
+                if self._core is None:
+                    site = self.site or os.environ["UTM_SHORTENER_SITE"]
+                    sites_path = self.sites_path or os.environ.get("UTM_SHORTENER_SITES_PATH", ".")
+                    self._core = RedirectCore(SiteConfig.load(sites_path, site))
+        return self._core
+
+    def __call__(self, environ, start_response):
+        match = PATH_PATTERN.match(environ.get("PATH_INFO", ""))
+        if not match or environ.get("REQUEST_METHOD") not in ("GET", "HEAD"):
+            status, headers, body = miss_response(redirect_errors.INVALID)
+        else:
+            try:
+                status, headers, body = self.redirect(environ, match.group(1))
+            except Exception:
+                logger.exception("Error redirecting %s", environ.get("PATH_INFO"))
+                status, headers, body = error_response()
+
+        start_response(status, headers)
+        return [body]
+
+    def redirect(self, environ, short_code):
+        core = self.core
+        core.refresh_settings()
+        ip_address = get_client_ip(environ.get("HTTP_X_FORWARDED_FOR"), environ.get("REMOTE_ADDR"))
+
+        # Shed abusive clients before resolving anything
+        limit = core.hit_rate_limit(ip_address)
+        if limit and not limit.allowed:
+            return rate_limited_response(limit)
+
+        entry = core.resolve(short_code)
+        reason = core.get_reason(entry)
+        if reason:
+            core.record_miss(reason)
+            return miss_response(reason)
+
+        core.enqueue_click(entry, ip_address, environ.get("HTTP_USER_AGENT", ""),
+            environ.get("HTTP_REFERER", ""))
+        return redirect_response(entry, limit)
+
+
+application = RedirectApp()
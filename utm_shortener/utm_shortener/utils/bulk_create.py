@@ -0,0 +1,161 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Bulk creation of Short URLs.
+
+Creating links one ``Document.insert`` at a time re-reads the settings and
+the campaign and runs several existence queries per link. Here settings
+and campaign are loaded once, every custom alias of a batch is checked
+with one ``IN`` query, codes for the rest are taken from the code pool in
+one call, and rows are written with chunked multi-row inserts in the
+current transaction.
+
+Rows are validated with the same rules as ``ShortURL.validate`` but the
+document lifecycle is skipped, so ``before_insert``/``on_update`` hooks do
+not run for bulk-created links.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import get_datetime, now_datetime
+
+from utm_shortener.utm_shortener.doctype.short_url.short_url import ShortURL
+from utm_shortener.utm_shortener.utils import code_allocator, code_filter, code_pool, resolution_cache
+
+DEFAULT_CHUNK_SIZE = 1000
+SAVEPOINT = "short_url_bulk_insert"
+
+SHORT_URL_FIELDS = ("name", "creation", "modified", "modified_by", "owner", "docstatus", "idx",
+    "short_code", "short_url", "original_url", "utm_campaign", "custom_alias", "generated_utm_url",
+    "expiry_date", "status", "clicks", "unique_visitors")
+
+
+class ShortURLBulkWriter:
+    """Validate, allocate and insert Short URLs in batches"""
+
+    def __init__(self, campaign=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        if not frappe.has_permission("Short URL", "create"):
+            frappe.throw(_("Not permitted to create Short URLs"), frappe.PermissionError)
+
+        self.chunk_size = chunk_size
+        self.base_url = ShortURL.get_base_url()
+        self.campaign = frappe.get_doc("UTM Campaign", campaign) if campaign else None
+        # Aliases claimed earlier in this run, lowercased
+        self.aliases = set()
+        self.created = 0
+
+    def create(self, url_list, start_index=0):
+        """Create Short URLs for `url_list`, returning (results, errors) by index"""
+        results, errors, rows = self.build(url_list, start_index)
+        self.write(rows)
+        return results, errors
+
+    def build(self, url_list, start_index=0):
+        """Validate a batch and build its rows without writing them"""
+        items, errors = [], []
+
+        for i, url_data in enumerate(url_list, start_index):
+            if isinstance(url_data, str):
+                url_data = {"url": url_data}
+            try:
+                items.append((i, self.validate_item(url_data)))
+            except Exception as e:
+                errors.append(make_error(i, url_data, e))
+
+        items = self.claim_aliases(items, errors)
+
+        codes = iter(code_pool.pop_many(code_allocator.SHORT_URL,
+            sum(1 for _, item in items if not item.custom_alias)))
+
+        now = now_datetime()
+        user = frappe.session.user
+        results, rows = [], []
+
+        for i, item in items:
+            short_code = item.custom_alias or next(codes)
+            short_url = f"{self.base_url}/s/{short_code}"
+            utm_url = ShortURL.build_utm_url(item.url, self.campaign) if self.campaign else None
+
+            rows.append((frappe.generate_hash(length=10), now, now, user, user, 0, 0,
+                short_code, short_url, item.url, self.campaign.name if self.campaign else None,
+                item.custom_alias, utm_url, item.expiry_date, "Active", 0, 0))
+            results.append({
+                "index": i,
+                "original_url": item.url,
+                "short_code": short_code,
+                "short_url": short_url,
+                "utm_url": utm_url
+            })
+
+        errors.sort(key=lambda error: error["index"])
+        return results, errors, rows
+
+    def validate_item(self, url_data):
+        """Apply the Short URL validation rules that need no database access"""
+        url = (url_data.get("url") or "").strip()
+        ShortURL.validate_original_url(url)
+
+        custom_alias = (url_data.get("alias") or "").strip() or None
+        if custom_alias:
+            ShortURL.validate_alias_format(custom_alias)
+
+        expiry_date = url_data.get("expiry_date") or None
+        if expiry_date and get_datetime(expiry_date) < now_datetime():
+            frappe.throw(_("Expiry date cannot be in the past"))
+
+        return frappe._dict(url=url, custom_alias=custom_alias, expiry_date=expiry_date)
+
+    def claim_aliases(self, items, errors):
+        """Drop items whose alias is taken, checking the batch with one query"""
+        aliases = [item.custom_alias for _, item in items if item.custom_alias]
+        if not aliases:
+            return items
+
+        # short_code compares case-insensitively
+        taken = {code.lower() for code in frappe.get_all("Short URL",
+            filters={"short_code": ("in", aliases)}, pluck="short_code")}
+
+        claimed = []
+        for i, item in items:
+            alias = item.custom_alias and item.custom_alias.lower()
+            if alias and (alias in taken or alias in self.aliases):
+                errors.append(make_error(i, item, _("This custom alias is already in use")))
+                continue
+            if alias:
+                self.aliases.add(alias)
+            claimed.append((i, item))
+
+        code_pool.discard(code_allocator.SHORT_URL, *aliases)
+        return claimed
+
+    def write(self, rows):
+        """Insert rows with chunked multi-row inserts, all or nothing"""
+        if not rows:
+            return
+
+        frappe.db.savepoint(SAVEPOINT)
+        try:
+            frappe.db.bulk_insert("Short URL", SHORT_URL_FIELDS, rows, chunk_size=self.chunk_size)
+        except Exception:
+            frappe.db.rollback(save_point=SAVEPOINT)
+            raise
+
+        # bulk_insert skips on_update, which records single inserts
+        short_codes = [row[SHORT_URL_FIELDS.index("short_code")] for row in rows]
+        code_filter.add(*short_codes)
+        resolution_cache.invalidate(*short_codes)
+        self.created += len(rows)
+
+
+def make_error(index, url_data, error):
+    return {
+        "index": index,
+        "url": url_data.get("url", ""),
+        "error": str(error)
+    }
+
+
+def bulk_create_short_urls(campaign, url_list, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Create Short URLs for a campaign, returning (results, errors) by index"""
+    return ShortURLBulkWriter(campaign, chunk_size).create(url_list)
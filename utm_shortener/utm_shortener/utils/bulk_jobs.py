@@ -0,0 +1,140 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Background jobs for large bulk Short URL imports.
+
+``enqueue_bulk_create`` queues ``run_bulk_create`` on the long queue with
+a list of URLs; uploaded files go through link_importer instead. The job
+feeds the list through ``ShortURLBulkWriter`` one chunk at a time,
+committing each chunk. After every chunk it publishes a ``utm_shortener_bulk_progress``
+realtime event to the user who started the import. The per-row results
+are collected into a private CSV File for download.
+
+Job status is kept in Redis for a week and can be read back with
+``get_status``.
+"""
+
+import csv
+import io
+
+import frappe
+from frappe import _
+from frappe.utils import cint, now_datetime
+
+from utm_shortener.utm_shortener.utils.bulk_create import ShortURLBulkWriter
+from utm_shortener.utm_shortener.utils.link_importer import iter_chunks
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
+
+PROGRESS_EVENT = "utm_shortener_bulk_progress"
+STATUS_KEY_PREFIX = "utm_shortener:bulk_job:"
+STATUS_TTL = 7 * 24 * 60 * 60
+
+CHUNK_SIZE = 1000
+JOB_TIMEOUT = 4 * 60 * 60
+
+RESULT_COLUMNS = ("index", "original_url", "short_code", "short_url", "utm_url", "error")
+
+
+def get_async_threshold():
+    """Lists longer than this are created in a background job"""
+    return get_settings().bulk_async_threshold
+
+
+def enqueue_bulk_create(campaign, url_list):
+    """Queue a bulk import and return its job status"""
+    if not url_list:
+        frappe.throw(_("Provide a URL list to import"))
+
+    job_id = frappe.generate_hash(length=12)
+    status = set_status(job_id, {
+        "job_id": job_id,
+        "status": "Queued",
+        "user": frappe.session.user,
+        "campaign": campaign,
+        "total": len(url_list),
+        "processed": 0,
+        "created": 0,
+        "errors": 0,
+        "file_url": None,
+        "queued_at": str(now_datetime()),
+    })
+
+    frappe.enqueue(
+        "utm_shortener.utm_shortener.utils.bulk_jobs.run_bulk_create",
+        queue="long",
+        timeout=JOB_TIMEOUT,
+        bulk_job_id=job_id,
+        campaign=campaign,
+        url_list=url_list,
+    )
+
+    return status
+
+
+def run_bulk_create(bulk_job_id, campaign, url_list):
+    """Background job: create Short URLs chunk by chunk, reporting progress"""
+    job_id = bulk_job_id
+    status = get_status(job_id) or {"job_id": job_id, "user": frappe.session.user, "total": 0}
+    status.update({"status": "Running", "started_at": str(now_datetime())})
+    set_status(job_id, status)
+
+    output = io.StringIO()
+    result_writer = csv.DictWriter(output, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+    result_writer.writeheader()
+
+    try:
+        writer = ShortURLBulkWriter(campaign, chunk_size=CHUNK_SIZE)
+
+        for start, chunk in iter_chunks(iter(url_list), CHUNK_SIZE):
+            results, errors = writer.create(chunk, start_index=start)
+            frappe.db.commit()
+
+            for row in sorted(results + errors, key=lambda row: row["index"]):
+                result_writer.writerow(row if "short_code" in row
+                    else {"index": row["index"], "original_url": row["url"], "error": row["error"]})
+
+            status["processed"] = start + len(chunk)
+            status["created"] = status.get("created", 0) + len(results)
+            status["errors"] = status.get("errors", 0) + len(errors)
+            status["total"] = max(cint(status.get("total")), status["processed"])
+            publish_progress(status)
+
+        status["file_url"] = save_result_file(job_id, output.getvalue())
+        status["status"] = "Completed"
+
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), "Bulk URL Import Error")
+        status.update({"status": "Failed", "error": str(e)})
+
+    status["finished_at"] = str(now_datetime())
+    publish_progress(status)
+    frappe.db.commit()
+    return status
+
+
+def save_result_file(job_id, content):
+    """Store the result CSV as a private File and return its URL"""
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": f"short-urls-{job_id}.csv",
+        "is_private": 1,
+        "content": content,
+    })
+    file_doc.insert(ignore_permissions=True)
+    return file_doc.file_url
+
+
+def publish_progress(status):
+    set_status(status["job_id"], status)
+    frappe.publish_realtime(PROGRESS_EVENT, status, user=status.get("user"))
+
+
+def set_status(job_id, status):
+    frappe.cache().set_value(STATUS_KEY_PREFIX + job_id, status, expires_in_sec=STATUS_TTL)
+    return status
+
+
+def get_status(job_id):
+    return frappe.cache().get_value(STATUS_KEY_PREFIX + job_id)
@@ -0,0 +1,109 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Single-pass aggregation of campaign analytics.
+
+Per-URL rows and the campaign totals come from one query: window
+aggregates (``... OVER ()``) are evaluated over every URL of the campaign
+before ``LIMIT`` picks the requested page.
+"""
+
+import frappe
+from frappe.utils import cint
+
+from utm_shortener.utm_shortener.utils import visitor_sketches
+
+DEFAULT_PAGE_LENGTH = 100
+MAX_PAGE_LENGTH = 1000
+
+
+def get_url_stats(campaign, page=1, page_length=DEFAULT_PAGE_LENGTH):
+    """Return one page of a campaign's Short URLs together with campaign totals
+
+    Pass `page_length=None` to get every URL.
+    """
+    page = max(cint(page), 1)
+    limit_sql = ""
+    values = {"campaign": campaign}
+
+    if page_length:
+        page_length = min(max(cint(page_length), 1), MAX_PAGE_LENGTH)
+        limit_sql = "LIMIT %(limit)s OFFSET %(offset)s"
+        values.update({"limit": page_length, "offset": (page - 1) * page_length})
+
+    rows = frappe.db.sql("""
+        SELECT
+            su.name,
+            su.short_code,
+            su.original_url,
+            IFNULL(su.clicks, 0) as clicks,
+            IFNULL(su.unique_visitors, 0) as unique_visitors,
+            su.status,
+            su.creation,
+            COUNT(*) OVER () as campaign_total_urls,
+            SUM(su.status = 'Active') OVER () as campaign_active_urls,
+            SUM(IFNULL(su.clicks, 0)) OVER () as campaign_total_clicks
+        FROM `tabShort URL` su
+        WHERE su.utm_campaign = %(campaign)s
+        ORDER BY su.creation DESC
+        {limit}
+    """.format(limit=limit_sql), values, as_dict=True)
+
+    if rows:
+        totals = {
+            "total_urls": cint(rows[0].campaign_total_urls),
+            "active_urls": cint(rows[0].campaign_active_urls),
+            "total_clicks": cint(rows[0].campaign_total_clicks),
+        }
+    else:
+        # Past the last page the window totals have no row to ride on
+        totals = get_totals(campaign)
+
+    urls = []
+    for row in rows:
+        for field in ("campaign_total_urls", "campaign_active_urls", "campaign_total_clicks"):
+            row.pop(field)
+        urls.append(row)
+
+    return {
+        "urls": urls,
+        "totals": totals,
+        "pagination": {
+            "page": page,
+            "page_length": page_length,
+            "has_more": bool(page_length) and page * page_length < totals["total_urls"],
+        },
+    }
+
+
+def get_totals(campaign):
+    """Campaign totals without any URL rows"""
+    totals = frappe.db.sql("""
+        SELECT
+            COUNT(*) as total_urls,
+            IFNULL(SUM(status = 'Active'), 0) as active_urls,
+            IFNULL(SUM(IFNULL(clicks, 0)), 0) as total_clicks
+        FROM `tabShort URL`
+        WHERE utm_campaign = %s
+    """, (campaign,), as_dict=True)[0]
+
+    return {key: cint(value) for key, value in totals.items()}
+
+
+def get_source_breakdown(campaign):
+    """Clicks per referrer source for a campaign, from the daily rollups"""
+    return frappe.db.sql("""
+        SELECT
+            referrer_source as source,
+            SUM(clicks) as clicks
+        FROM `tabURL Click Rollup`
+        WHERE utm_campaign = %s
+        GROUP BY referrer_source
+        ORDER BY clicks DESC
+    """, (campaign,), as_dict=True)
+
+
+def get_unique_visitors(campaign):
+    """Campaign-wide unique visitors, counted once across all its URLs"""
+    return visitor_sketches.estimate(visitor_sketches.SCOPE_CAMPAIGN, campaign)
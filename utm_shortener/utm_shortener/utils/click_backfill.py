@@ -0,0 +1,137 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Reprocess derived fields on historical URL Click Log rows.
+
+Run from the bench, e.g.::
+
+    bench --site mysite execute utm_shortener.utm_shortener.utils.click_backfill.reclassify_user_agents
+    bench --site mysite execute utm_shortener.utm_shortener.utils.click_backfill.reclassify_referrers
+    bench --site mysite execute utm_shortener.utm_shortener.utils.click_backfill.backfill_geolocation
+
+Rows are walked in primary key order in batches. Each batch is
+classified in bulk and written back with one UPDATE per distinct result
+rather than one per row.
+"""
+
+import frappe
+
+from utm_shortener.utm_shortener.utils import geoip, referrer
+from utm_shortener.utm_shortener.utils.user_agent import classify_many
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def iter_click_log_batches(fields, batch_size=DEFAULT_BATCH_SIZE, conditions=None, values=None):
+    """Yield lists of click log rows using keyset pagination on name"""
+    last_name = ""
+    conditions = f"AND ({conditions})" if conditions else ""
+
+    while True:
+        rows = frappe.db.sql("""
+            SELECT name, {fields}
+            FROM `tabURL Click Log`
+            WHERE name > %(last_name)s {conditions}
+            ORDER BY name
+            LIMIT %(batch_size)s
+        """.format(fields=", ".join(fields), conditions=conditions),
+            dict(values or {}, last_name=last_name, batch_size=batch_size), as_dict=True)
+
+        if not rows:
+            break
+
+        yield rows
+        last_name = rows[-1].name
+
+
+def update_grouped(updates):
+    """Apply {(field, value) tuple: [names]} with one UPDATE per group"""
+    for assignments, names in updates.items():
+        set_sql = ", ".join(f"`{field}` = %s" for field, _ in assignments)
+        frappe.db.sql("""
+            UPDATE `tabURL Click Log`
+            SET {set_sql}
+            WHERE name IN ({names})
+        """.format(set_sql=set_sql, names=", ".join(["%s"] * len(names))),
+            [value for _, value in assignments] + names)
+
+
+def reclassify_user_agents(batch_size=DEFAULT_BATCH_SIZE):
+    """Recompute device, browser, OS and bot flag for every logged click
+
+    Run click_rollups.rebuild_rollups afterwards to refresh the rollups.
+    """
+    processed = 0
+
+    for rows in iter_click_log_batches(["user_agent"], batch_size):
+        updates = {}
+        for row, info in zip(rows, classify_many([row.user_agent for row in rows])):
+            assignments = (
+                ("device_type", info.device_type),
+                ("browser", info.browser),
+                ("browser_version", info.browser_version),
+                ("operating_system", info.os),
+                ("is_bot", 1 if info.is_bot else 0),
+            )
+            updates.setdefault(assignments, []).append(row.name)
+
+        update_grouped(updates)
+        frappe.db.commit()
+        processed += len(rows)
+
+    return processed
+
+
+def reclassify_referrers(batch_size=DEFAULT_BATCH_SIZE):
+    """Recompute the referrer source of every logged click
+
+    Run click_rollups.rebuild_rollups afterwards to refresh the rollups.
+    """
+    classifier = referrer.get_classifier()
+    processed = 0
+
+    for rows in iter_click_log_batches(["referrer_url", "referrer_source"], batch_size):
+        updates = {}
+        sources = classifier.classify_many([row.referrer_url for row in rows])
+        for row, source in zip(rows, sources):
+            if source != row.referrer_source:
+                updates.setdefault((("referrer_source", source),), []).append(row.name)
+
+        update_grouped(updates)
+        frappe.db.commit()
+        processed += len(rows)
+
+    return processed
+
+
+def backfill_geolocation(batch_size=DEFAULT_BATCH_SIZE, only_missing=True, since=None):
+    """Fill country and city from the local GeoIP database
+
+    By default only clicks without a known country are looked up; pass
+    `only_missing=False` after switching databases to redo every row.
+    Run click_rollups.rebuild_rollups afterwards to refresh the rollups.
+    """
+    reader = geoip.get_reader()
+    if not reader:
+        return 0
+
+    conditions = ["IFNULL(ip_address, '') != ''"]
+    if only_missing:
+        conditions.append("IFNULL(country, '') IN ('', 'Unknown')")
+    if since:
+        conditions.append("timestamp >= %(since)s")
+
+    processed = 0
+    for rows in iter_click_log_batches(["ip_address", "country", "city"], batch_size,
+            " AND ".join(conditions), {"since": since}):
+        updates = {}
+        for row, (country, city) in zip(rows, reader.lookup_many([row.ip_address for row in rows])):
+            if (country, city) != (row.country, row.city or ""):
+                updates.setdefault((("country", country), ("city", city)), []).append(row.name)
+
+        update_grouped(updates)
+        frappe.db.commit()
+        processed += len(rows)
+
+    return processed
@@ -0,0 +1,137 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Click and unique visitor counters for Short URL.
+
+Deltas accumulate in Redis hashes (``HINCRBY``) and are flushed
+periodically with one ``UPDATE ... SET clicks = clicks + ...`` statement
+per batch, so concurrent clicks on a hot link never serialize on a full
+document save of the same row.
+"""
+
+import frappe
+from frappe.utils import get_datetime
+
+CLICKS_KEY = "utm_shortener:counter:clicks"
+VISITORS_KEY = "utm_shortener:counter:unique_visitors"
+LAST_CLICKED_KEY = "utm_shortener:counter:last_clicked"
+
+FLUSH_BATCH_SIZE = 500
+
+
+def increment(short_url_name, clicks=0, unique_visitors=0, last_clicked=None):
+    """Add click and visitor deltas for a single Short URL"""
+    increment_many({short_url_name: {
+        "clicks": clicks,
+        "unique_visitors": unique_visitors,
+        "last_clicked": last_clicked,
+    }})
+
+
+def increment_many(deltas):
+    """Add deltas for several Short URLs in one Redis round trip
+
+    `deltas` maps Short URL name to a dict with optional `clicks`,
+    `unique_visitors` and `last_clicked` keys.
+    """
+    if not deltas:
+        return
+
+    try:
+        cache = frappe.cache()
+        pipe = cache.pipeline(transaction=False)
+
+        for short_url_name, delta in deltas.items():
+            if delta.get("clicks"):
+                pipe.hincrby(cache.make_key(CLICKS_KEY), short_url_name, int(delta["clicks"]))
+            if delta.get("unique_visitors"):
+                pipe.hincrby(cache.make_key(VISITORS_KEY), short_url_name, int(delta["unique_visitors"]))
+            if delta.get("last_clicked"):
+                pipe.hset(cache.make_key(LAST_CLICKED_KEY), short_url_name, str(delta["last_clicked"]))
+
+        pipe.execute()
+
+    except Exception:
+        # Redis is unavailable, apply the deltas directly
+        apply_deltas(deltas)
+
+
+def flush_counters():
+    """Move accumulated deltas from Redis into `tabShort URL`"""
+    deltas = pop_deltas()
+    if not deltas:
+        return 0
+
+    try:
+        apply_deltas(deltas)
+        frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        # Put the deltas back so the next flush retries them
+        increment_many(deltas)
+        raise
+
+    return len(deltas)
+
+
+def pop_deltas():
+    """Atomically read and clear all pending deltas"""
+    cache = frappe.cache()
+    keys = [cache.make_key(key) for key in (CLICKS_KEY, VISITORS_KEY, LAST_CLICKED_KEY)]
+
+    pipe = cache.pipeline()
+    for key in keys:
+        pipe.hgetall(key)
+    pipe.delete(*keys)
+    clicks, visitors, last_clicked, _ = pipe.execute()
+
+    deltas = {}
+    for field, mapping in (("clicks", clicks), ("unique_visitors", visitors), ("last_clicked", last_clicked)):
+        for name, value in mapping.items():
+            name = frappe.safe_decode(name)
+            value = frappe.safe_decode(value)
+            deltas.setdefault(name, {})[field] = value if field == "last_clicked" else int(value)
+
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Apply deltas with one UPDATE statement per batch of Short URLs"""
+    names = list(deltas)
+
+    for start in range(0, len(names), FLUSH_BATCH_SIZE):
+        batch = names[start:start + FLUSH_BATCH_SIZE]
+
+        clicks_case, visitors_case, last_clicked_case = [], [], []
+        clicks_values, visitors_values, last_clicked_values = [], [], []
+
+        for name in batch:
+            delta = deltas[name]
+            clicks_case.append("WHEN %s THEN %s")
+            clicks_values.extend([name, int(delta.get("clicks") or 0)])
+            visitors_case.append("WHEN %s THEN %s")
+            visitors_values.extend([name, int(delta.get("unique_visitors") or 0)])
+            if delta.get("last_clicked"):
+                last_clicked_case.append("WHEN %s THEN %s")
+                last_clicked_values.extend([name, get_datetime(delta["last_clicked"])])
+
+        last_clicked_sql = ""
+        if last_clicked_case:
+            last_clicked_sql = """,
+                last_clicked = COALESCE(
+                    GREATEST(last_clicked, CASE name {0} ELSE last_clicked END),
+                    CASE name {0} ELSE last_clicked END
+                )""".format(" ".join(last_clicked_case))
+
+        frappe.db.sql("""
+            UPDATE `tabShort URL`
+            SET clicks = IFNULL(clicks, 0) + CASE name {clicks} ELSE 0 END,
+                unique_visitors = IFNULL(unique_visitors, 0) + CASE name {visitors} ELSE 0 END{last_clicked}
+            WHERE name IN ({names})
+        """.format(
+            clicks=" ".join(clicks_case),
+            visitors=" ".join(visitors_case),
+            last_clicked=last_clicked_sql,
+            names=", ".join(["%s"] * len(batch)),
+        ), clicks_values + visitors_values + last_clicked_values * 2 + batch)
@@ -0,0 +1,293 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Streaming export of click logs and daily analytics to CSV or Parquet.
+
+Two datasets can be exported: raw URL Click Log rows ("clicks") and the
+per-day URL Click Rollup rows behind the analytics views ("rollups").
+
+Rows are read through an unbuffered server-side cursor
+(``frappe.db.unbuffered_cursor`` with ``as_iterator=True``), so neither
+the database driver nor Python holds the full result set. They are
+serialized one chunk at a time, and memory stays bounded by the chunk
+size however many clicks match.
+
+Exports can be written to a private File by a background job
+(``enqueue_export``) or streamed as an HTTP response (``stream_response``).
+Parquet output needs the optional ``pyarrow`` package.
+"""
+
+import csv
+import importlib.util
+import io
+import os
+
+import frappe
+from frappe import _
+from frappe.utils import get_datetime, getdate, add_days, now_datetime
+
+CLICK_FIELDS = ("timestamp", "short_url", "short_code", "utm_campaign", "ip_address", "user_agent",
+    "referrer_url", "referrer_source", "device_type", "browser", "browser_version", "operating_system",
+    "is_bot", "country", "city")
+
+ROLLUP_FIELDS = ("rollup_date", "short_url", "utm_campaign", "device_type", "browser", "operating_system",
+    "country", "referrer_source", "clicks", "unique_visitors")
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+CHUNK_ROWS = 10000
+JOB_TIMEOUT = 6 * 60 * 60
+READY_EVENT = "utm_shortener_export_ready"
+
+
+def build_click_query(short_url=None, campaign=None, from_date=None, to_date=None):
+    """SQL and values selecting the click logs matching the filters"""
+    conditions, values = [], {}
+
+    if short_url:
+        conditions.append("ucl.short_url = %(short_url)s")
+        values["short_url"] = short_url
+    if campaign:
+        conditions.append("su.utm_campaign = %(campaign)s")
+        values["campaign"] = campaign
+    if from_date:
+        conditions.append("ucl.timestamp >= %(from_date)s")
+        values["from_date"] = get_datetime(from_date)
+    if to_date:
+        # Dates are inclusive
+        conditions.append("ucl.timestamp < %(to_date)s")
+        values["to_date"] = add_days(getdate(to_date), 1)
+
+    query = """
+        SELECT
+            ucl.timestamp, ucl.short_url, su.short_code, su.utm_campaign, ucl.ip_address,
+            ucl.user_agent, ucl.referrer_url, ucl.referrer_source, ucl.device_type, ucl.browser,
+            ucl.browser_version, ucl.operating_system, ucl.is_bot, ucl.country, ucl.city
+        FROM `tabURL Click Log` ucl
+        LEFT JOIN `tabShort URL` su ON su.name = ucl.short_url
+        {where}
+        ORDER BY ucl.timestamp
+    """.format(where=("WHERE " + " AND ".join(conditions)) if conditions else "")
+
+    return query, values
+
+
+def build_rollup_query(short_url=None, campaign=None, from_date=None, to_date=None):
+    """SQL and values selecting the daily rollups matching the filters"""
+    conditions, values = [], {}
+
+    if short_url:
+        conditions.append("short_url = %(short_url)s")
+        values["short_url"] = short_url
+    if campaign:
+        conditions.append("utm_campaign = %(campaign)s")
+        values["campaign"] = campaign
+    if from_date:
+        conditions.append("rollup_date >= %(from_date)s")
+        values["from_date"] = getdate(from_date)
+    if to_date:
+        conditions.append("rollup_date <= %(to_date)s")
+        values["to_date"] = getdate(to_date)
+
+    query = """
+        SELECT {fields}
+        FROM `tabURL Click Rollup`
+        {where}
+        ORDER BY rollup_date
+    """.format(fields=", ".join(ROLLUP_FIELDS),
+        where=("WHERE " + " AND ".join(conditions)) if conditions else "")
+
+    return query, values
+
+
+# dataset: (doctype, columns, query builder)
+DATASETS = {
+    "clicks": ("URL Click Log", CLICK_FIELDS, build_click_query),
+    "rollups": ("URL Click Rollup", ROLLUP_FIELDS, build_rollup_query),
+}
+
+
+def iter_row_chunks(dataset, filters, chunk_rows=CHUNK_ROWS):
+    """Yield lists of row tuples ordered as the dataset's columns"""
+    query, values = DATASETS[dataset][2](**filters)
+
+    # No other query may run on the connection until the cursor is drained
+    with frappe.db.unbuffered_cursor():
+        chunk = []
+        for row in frappe.db.sql(query, values, as_iterator=True):
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only stream whose contents are drained after every chunk"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data, self.buffer = bytes(self.buffer), bytearray()
+        return data
+
+
+def iter_csv(columns, row_chunks):
+    """Yield encoded CSV, one piece per chunk of rows"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+
+    for chunk in row_chunks:
+        writer.writerows(chunk)
+        yield output.getvalue().encode()
+        output.seek(0)
+        output.truncate()
+
+    if output.tell():
+        yield output.getvalue().encode()
+
+
+def iter_parquet(columns, row_chunks):
+    """Yield a Parquet file, one row group per chunk of rows"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {
+        "timestamp": pa.timestamp("us"),
+        "rollup_date": pa.date32(),
+        "is_bot": pa.int8(),
+        "clicks": pa.int64(),
+        "unique_visitors": pa.int64(),
+    }
+    schema = pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    try:
+        for chunk in row_chunks:
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=schema.field(i).type) for i, values in enumerate(zip(*chunk))],
+                schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+
+    yield sink.drain()
+
+
+def iter_export(dataset, export_format, filters, chunk_rows=CHUNK_ROWS):
+    serializers = {"csv": iter_csv, "parquet": iter_parquet}
+    return serializers[export_format](DATASETS[dataset][1], iter_row_chunks(dataset, filters, chunk_rows))
+
+
+def validate_export(dataset, export_format, filters):
+    """Check the request and the user's access to the requested rows"""
+    if dataset not in DATASETS:
+        frappe.throw(_("Unknown export dataset: {0}").format(dataset))
+    if export_format not in FORMATS:
+        frappe.throw(_("Unsupported export format: {0}").format(export_format))
+    if export_format == "parquet" and not importlib.util.find_spec("pyarrow"):
+        # Checked up front, a streamed response cannot report errors
+        frappe.throw(_("Parquet export requires the pyarrow package"))
+
+    if not frappe.has_permission(DATASETS[dataset][0], "read"):
+        frappe.throw(_("Not permitted to export {0}").format(_(DATASETS[dataset][0])), frappe.PermissionError)
+    if filters.get("short_url") and not frappe.has_permission("Short URL", "read", filters["short_url"]):
+        frappe.throw(_("Not permitted to export clicks of {0}").format(filters["short_url"]), frappe.PermissionError)
+    if filters.get("campaign") and not frappe.has_permission("UTM Campaign", "read", filters["campaign"]):
+        frappe.throw(_("Not permitted to export clicks of {0}").format(filters["campaign"]), frappe.PermissionError)
+
+
+def get_file_name(dataset, export_format):
+    return "{0}-{1}.{2}".format(dataset, now_datetime().strftime("%Y%m%d-%H%M%S"), FORMATS[export_format][1])
+
+
+def stream_response(dataset, export_format, filters):
+    """A werkzeug Response that streams the export to the client
+
+    The body is produced after the request handler has returned and the
+    request's database connection is closed, so the generator connects
+    to the site on its own.
+    """
+    from werkzeug.wrappers import Response
+
+    validate_export(dataset, export_format, filters)
+    site, user = frappe.local.site, frappe.session.user
+
+    def generate():
+        frappe.init(site=site)
+        try:
+            frappe.connect()
+            frappe.set_user(user)
+            yield from iter_export(dataset, export_format, filters)
+        finally:
+            frappe.destroy()
+
+    response = Response(generate(), mimetype=FORMATS[export_format][0], direct_passthrough=True)
+    response.headers["Content-Disposition"] = f'attachment; filename="{get_file_name(dataset, export_format)}"'
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def enqueue_export(dataset, export_format, filters):
+    """Export to a private File in a background job"""
+    validate_export(dataset, export_format, filters)
+    frappe.enqueue(
+        "utm_shortener.utm_shortener.utils.click_export.export_to_file",
+        queue="long",
+        timeout=JOB_TIMEOUT,
+        dataset=dataset,
+        export_format=export_format,
+        filters=filters,
+    )
+
+
+def export_to_file(dataset, export_format, filters):
+    """Background job: write the export to a private File chunk by chunk"""
+    file_name = get_file_name(dataset, export_format)
+    path = frappe.get_site_path("private", "files", file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    try:
+        with open(path, "wb") as f:
+            for data in iter_export(dataset, export_format, filters):
+                f.write(data)
+
+        file_doc = frappe.get_doc({
+            "doctype": "File",
+            "file_name": file_name,
+            "file_url": f"/private/files/{file_name}",
+            "is_private": 1,
+        })
+        file_doc.insert(ignore_permissions=True)
+        frappe.db.commit()
+
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        frappe.log_error(frappe.get_traceback(), "Click Export Error")
+        frappe.publish_realtime(READY_EVENT, {"success": False, "dataset": dataset}, user=frappe.session.user)
+        raise
+
+    frappe.publish_realtime(READY_EVENT, {"success": True, "dataset": dataset, "file_url": file_doc.file_url},
+        user=frappe.session.user)
+    return file_doc.file_url
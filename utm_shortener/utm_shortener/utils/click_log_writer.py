@@ -0,0 +1,120 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Buffered multi-row writer for URL Click Log.
+
+Rows are written with ``frappe.db.bulk_insert`` instead of one
+``Document.insert`` per click, so the document lifecycle (validation,
+hooks, ``after_insert``) is skipped; per-link click totals are reported
+back through ``ClickLogWriter.summary``.
+"""
+
+import time
+
+import frappe
+from frappe.utils import now_datetime
+from utm_shortener.utm_shortener.doctype.short_url.short_url import ShortURL
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
+
+DEFAULT_BATCH_SIZE = 500
+
+CLICK_LOG_FIELDS = ("name", "creation", "modified", "modified_by", "owner", "docstatus", "idx",
+    "short_url", "timestamp", "ip_address", "user_agent", "referrer_url", "referrer_source",
+    "device_type", "browser", "browser_version", "operating_system", "is_bot", "country", "city")
+
+
+class ClickLogWriter:
+    """Accumulate click log rows and write them in multi-row inserts"""
+
+    def __init__(self, batch_size=None, flush_interval=None, on_flush=None):
+        self.batch_size = batch_size or get_batch_size()
+        self.flush_interval = flush_interval or get_flush_interval()
+        # Called with the rows of every flushed batch
+        self.on_flush = on_flush
+        self.buffer = []
+        self.written = 0
+        # short_url -> {"clicks", "last_clicked"}
+        self.summary = {}
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, short_url_name, request_data):
+        """Buffer one click, flushing when the batch is full or stale"""
+        self.add_row(build_click_log_row(short_url_name, request_data))
+
+    def add_row(self, row):
+        """Buffer a row built by build_click_log_row"""
+        self.buffer.append(row)
+
+        if (len(self.buffer) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows"""
+        self._last_flush = time.monotonic()
+        if not self.buffer:
+            return 0
+
+        rows, self.buffer = self.buffer, []
+
+        write_click_logs(rows, chunk_size=self.batch_size)
+        self.written += len(rows)
+        self._update_summary(rows)
+
+        if self.on_flush:
+            self.on_flush(rows)
+
+        return len(rows)
+
+    def _update_summary(self, rows):
+        short_url_idx = CLICK_LOG_FIELDS.index("short_url")
+        timestamp_idx = CLICK_LOG_FIELDS.index("timestamp")
+
+        for row in rows:
+            stats = self.summary.setdefault(row[short_url_idx],
+                {"clicks": 0, "last_clicked": None})
+            stats["clicks"] += 1
+            if not stats["last_clicked"] or row[timestamp_idx] > stats["last_clicked"]:
+                stats["last_clicked"] = row[timestamp_idx]
+
+
+def build_click_log_row(short_url_name, request_data):
+    """Build a URL Click Log row tuple ordered as CLICK_LOG_FIELDS"""
+    now = now_datetime()
+    values = {
+        "name": frappe.generate_hash(length=10),
+        "creation": now,
+        "modified": now,
+        "modified_by": "Administrator",
+        "owner": "Guest",
+        "docstatus": 0,
+        "idx": 0,
+        "short_url": short_url_name,
+        "timestamp": request_data.get("timestamp") or now,
+        "city": None,
+        **ShortURL.get_click_details(request_data),
+    }
+
+    return tuple(values.get(field) for field in CLICK_LOG_FIELDS)
+
+
+def write_click_logs(rows, chunk_size=DEFAULT_BATCH_SIZE):
+    """Insert prepared rows with one multi-row INSERT per chunk"""
+    if rows:
+        frappe.db.bulk_insert("URL Click Log", CLICK_LOG_FIELDS, rows, chunk_size=chunk_size)
+
+
+def get_batch_size():
+    return get_settings().click_log_batch_size
+
+
+def get_flush_interval():
+    return get_settings().click_log_flush_interval
@@ -0,0 +1,161 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Click event queue that keeps database writes off the redirect response.
+
+Redirect handlers push a compact event onto a Redis list and return
+immediately; ``process_click_queue`` drains the list in batches from the
+scheduler and persists the clicks.
+"""
+
+import json
+import time
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+from utm_shortener.utm_shortener.utils import click_counters, click_rollups, visitor_sketches
+from utm_shortener.utm_shortener.utils.click_log_writer import (
+    CLICK_LOG_FIELDS,
+    ClickLogWriter,
+    build_click_log_row,
+    get_batch_size,
+)
+
+QUEUE_KEY = "utm_shortener:click_events"
+# Leave headroom below the one minute cron interval
+MAX_DRAIN_SECONDS = 50
+
+
+def make_click_event(entry, request_data):
+    """Build the compact queue payload for a single click"""
+    request_data = request_data or {}
+    return {
+        "name": entry.name,
+        "code": entry.short_code,
+        "campaign": entry.utm_campaign,
+        "ts": str(now_datetime()),
+        "ip": request_data.get("ip_address", ""),
+        "ua": request_data.get("user_agent", ""),
+        "ref": request_data.get("referrer", ""),
+    }
+
+
+def enqueue_click(entry, request_data):
+    """Queue a click for background persistence"""
+    event = make_click_event(entry, request_data)
+
+    try:
+        frappe.cache().rpush(QUEUE_KEY, json.dumps(event, separators=(",", ":")))
+    except Exception:
+        # Redis is unavailable, fall back to writing in the request
+        persist_click_events([event])
+
+
+def pop_click_events(limit):
+    """Atomically take up to `limit` events from the head of the queue"""
+    cache = frappe.cache()
+    key = cache.make_key(QUEUE_KEY)
+
+    pipe = cache.pipeline()
+    pipe.lrange(key, 0, limit - 1)
+    pipe.ltrim(key, limit, -1)
+    raw_events, _ = pipe.execute()
+
+    events = []
+    for raw in raw_events:
+        try:
+            events.append(json.loads(raw))
+        except ValueError:
+            continue
+
+    return events
+
+
+def get_queue_length():
+    """Number of clicks waiting to be persisted"""
+    return frappe.cache().llen(QUEUE_KEY)
+
+
+def process_click_queue(batch_size=None, max_seconds=MAX_DRAIN_SECONDS):
+    """Drain the click queue in batches until it is empty or time runs out"""
+    batch_size = batch_size or get_batch_size()
+    started = time.monotonic()
+    processed = 0
+
+    while time.monotonic() - started < max_seconds:
+        events = pop_click_events(batch_size)
+        if not events:
+            break
+
+        persist_click_events(events)
+        frappe.db.commit()
+        processed += len(events)
+
+        if len(events) < batch_size:
+            break
+
+    return processed
+
+
+def persist_click_events(events):
+    """Write a batch of queued clicks to the database
+
+    Events that cannot be turned into a click log row are skipped and
+    counted, so one malformed event does not lose the rest of the batch.
+    """
+    names = {event["name"] for event in events if isinstance(event, dict) and isinstance(event.get("name"), str)}
+    existing = set(frappe.get_all("Short URL",
+        filters={"name": ["in", list(names)]},
+        pluck="name")) if names else set()
+
+    campaigns = {event["name"]: event.get("campaign") for event in events
+        if isinstance(event, dict) and event.get("name") in existing}
+
+    def update_rollups(rows):
+        click_rollups.update_from_click_logs(rows, CLICK_LOG_FIELDS, campaigns)
+
+    visits, skipped, error = [], 0, None
+    writer = ClickLogWriter(on_flush=update_rollups)
+    with writer:
+        for event in events:
+            try:
+                # Skip links deleted while their clicks were queued
+                if event["name"] not in existing:
+                    continue
+                request_data = event_to_request_data(event)
+                row = build_click_log_row(event["name"], request_data)
+            except Exception:
+                skipped += 1
+                error = error or frappe.get_traceback()
+                continue
+
+            writer.add_row(row)
+            visits.append((event["name"], event.get("campaign"), request_data["timestamp"], event.get("ip")))
+
+    if skipped:
+        frappe.log_error("Skipped {0} of {1} click events\n\n{2}".format(skipped, len(events), error),
+            "Click Queue Error")
+
+    new_visitors = visitor_sketches.add_visits(visits)
+
+    click_counters.increment_many({
+        short_url_name: {
+            "clicks": stats["clicks"],
+            "unique_visitors": new_visitors.get(short_url_name, 0),
+            "last_clicked": stats["last_clicked"],
+        }
+        for short_url_name, stats in writer.summary.items()
+    })
+
+    return skipped
+
+
+def event_to_request_data(event):
+    """Expand a queued event back into the request_data shape used by Short URL"""
+    return {
+        "ip_address": event.get("ip", ""),
+        "user_agent": event.get("ua", ""),
+        "referrer": event.get("ref", ""),
+        "timestamp": get_datetime(event["ts"]) if event.get("ts") else now_datetime(),
+    }
@@ -0,0 +1,267 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Short code allocation.
+
+The default ``sequence`` strategy turns a counter into codes. Each worker
+leases a block of counter values from a ``tabSeries`` row, then maps every
+value through a keyed Feistel permutation of the code space and encodes it
+in the namespace alphabet. Being a bijection, the permutation can never
+produce the same code twice, so uniqueness needs no existence query per
+attempt. The only query left is one ``IN`` check per leased block, which
+skips codes taken by custom aliases or by codes issued before this
+allocator.
+
+Codes use lowercase letters and digits rather than base62: ``short_code``
+is compared under the database's case-insensitive collation, so ``aB3x``
+and ``Ab3X`` would be the same code.
+
+The ``random`` strategy keeps the old random codes but checks each batch of
+candidates with a single query. Other apps can add strategies through the
+``short_code_strategies`` hook, which maps a name to a CodeStrategy subclass.
+"""
+
+import random
+import secrets
+import string
+import threading
+from collections import namedtuple
+
+import frappe
+
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
+
+CodeNamespace = namedtuple("CodeNamespace",
+    ["doctype", "fieldname", "length", "alphabet", "prefix", "block_size"])
+
+SHORT_URL = CodeNamespace("Short URL", "short_code", 6, string.ascii_lowercase + string.digits, "", 1000)
+UTM_LINK = CodeNamespace("UTM Link", "short_code", 8, string.ascii_lowercase + string.digits, "", 1000)
+UTM_TEMPLATE = CodeNamespace("UTM Template", "template_code", 6, string.ascii_uppercase + string.digits,
+    "TMPL-", 20)
+
+MASK64 = (1 << 64) - 1
+FEISTEL_ROUNDS = 4
+
+
+def encode(number, alphabet, length):
+    """Fixed-width encoding of `number` in `alphabet`"""
+    base = len(alphabet)
+    chars = []
+    for _ in range(length):
+        number, digit = divmod(number, base)
+        chars.append(alphabet[digit])
+    return "".join(reversed(chars))
+
+
+class FeistelPermutation:
+    """Keyed bijection of range(domain_size) onto itself
+
+    A balanced Feistel network permutes the smallest even-width power of
+    two that covers the domain; values that land outside the domain are
+    fed through again (cycle walking) until they fall inside it.
+    """
+
+    def __init__(self, domain_size, key, rounds=FEISTEL_ROUNDS):
+        self.domain_size = domain_size
+        bits = max((domain_size - 1).bit_length(), 2)
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        self.round_keys = [(key * (i + 1) * 0x9E3779B97F4A7C15 + i) & MASK64 for i in range(rounds)]
+
+    def _round(self, value, round_key):
+        # splitmix64 finalizer
+        x = (value + round_key) & MASK64
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+        return (x ^ (x >> 31)) & self.half_mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half_bits, value & self.half_mask
+        for round_key in self.round_keys:
+            left, right = right, left ^ self._round(right, round_key)
+        return (left << self.half_bits) | right
+
+    def permute(self, value):
+        if not 0 <= value < self.domain_size:
+            raise ValueError(f"{value} is outside the permutation domain")
+
+        value = self._encrypt(value)
+        while value >= self.domain_size:
+            value = self._encrypt(value)
+        return value
+
+
+class CodeStrategy:
+    """Allocates unique codes for one CodeNamespace"""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def allocate(self, count=1):
+        """Return `count` codes that are not in use"""
+        raise NotImplementedError
+
+    def filter_taken(self, codes):
+        """Drop codes already stored in the namespace, with one query"""
+        if not codes:
+            return codes
+
+        taken = frappe.get_all(self.namespace.doctype,
+            filters={self.namespace.fieldname: ("in", codes)},
+            pluck=self.namespace.fieldname)
+        taken = {code.lower() for code in taken}
+        return [code for code in codes if code.lower() not in taken]
+
+
+class RandomStrategy(CodeStrategy):
+    """Random codes, checked against the table one batch at a time"""
+
+    def allocate(self, count=1):
+        ns = self.namespace
+        codes = []
+        seen = set()
+
+        while len(codes) < count:
+            # Oversample a little so one round usually suffices
+            wanted = count - len(codes)
+            candidates = []
+            for _ in range(wanted + wanted // 10 + 2):
+                code = ns.prefix + "".join(random.choices(ns.alphabet, k=ns.length))
+                if code not in seen:
+                    seen.add(code)
+                    candidates.append(code)
+
+            codes.extend(self.filter_taken(candidates)[:wanted])
+
+        return codes
+
+
+class SequenceStrategy(CodeStrategy):
+    """Counter values leased in blocks and scrambled into codes"""
+
+    def __init__(self, namespace):
+        super().__init__(namespace)
+        self.series = f"utm_shortener:{frappe.scrub(namespace.doctype)}:{namespace.fieldname}"
+        self._permutations = {}
+        self._key = None
+        self._available = []
+        self._lock = threading.Lock()
+
+    def allocate(self, count=1):
+        with self._lock:
+            while len(self._available) < count:
+                blocks = -(-(count - len(self._available)) // self.namespace.block_size)
+                self._lease(blocks)
+
+            codes, self._available = self._available[:count], self._available[count:]
+            return codes
+
+    def _lease(self, blocks):
+        """Reserve counter blocks and queue their unused codes"""
+        block_size = self.namespace.block_size
+        first_block = lease_series(self.series + ":blocks", blocks)
+
+        start = first_block * block_size
+        codes = [self.code_for(value) for value in range(start, start + blocks * block_size)]
+        # Chunk the check to keep the IN list bounded
+        available = []
+        for i in range(0, len(codes), 1000):
+            available.extend(self.filter_taken(codes[i:i + 1000]))
+
+        self._available.extend(available)
+
+        # The series update rolls back with the transaction; another worker
+        # may then lease the same blocks, so these codes must be dropped too
+        leased = set(codes)
+        frappe.db.after_rollback.add(lambda: self._discard(leased))
+
+    def _discard(self, codes):
+        with self._lock:
+            self._available = [code for code in self._available if code not in codes]
+
+    def code_for(self, value):
+        """Code for the counter value `value`"""
+        ns = self.namespace
+        base = len(ns.alphabet)
+        length = ns.length
+
+        # Once a length is exhausted continue with longer codes
+        while value >= base ** length:
+            value -= base ** length
+            length += 1
+
+        return ns.prefix + encode(self.get_permutation(length).permute(value), ns.alphabet, length)
+
+    def get_permutation(self, length):
+        permutation = self._permutations.get(length)
+        if permutation is None:
+            key = self.get_key() ^ (length * 0xD6E8FEB86659FD93)
+            permutation = FeistelPermutation(len(self.namespace.alphabet) ** length, key)
+            self._permutations[length] = permutation
+        return permutation
+
+    def get_key(self):
+        """Site-specific permutation key, created once and kept in tabSeries"""
+        if self._key is None:
+            name = self.series + ":key"
+            frappe.db.sql("INSERT IGNORE INTO `tabSeries` (`name`, `current`) VALUES (%s, %s)",
+                (name, secrets.randbelow(2 ** 31 - 1) + 1))
+            self._key = frappe.db.sql("SELECT `current` FROM `tabSeries` WHERE `name` = %s", name)[0][0]
+            self._permutations = {}
+            # A key created in a transaction that rolls back is not the site's key
+            frappe.db.after_rollback.add(self._forget_key)
+        return self._key
+
+    def _forget_key(self):
+        self._key = None
+        self._permutations = {}
+
+
+def lease_series(name, count):
+    """Atomically add `count` to a tabSeries row and return its previous value"""
+    frappe.db.sql("INSERT IGNORE INTO `tabSeries` (`name`, `current`) VALUES (%s, 0)", name)
+    current = frappe.db.sql("SELECT `current` FROM `tabSeries` WHERE `name` = %s FOR UPDATE", name)[0][0]
+    frappe.db.sql("UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name` = %s", (count, name))
+    return current
+
+
+STRATEGIES = {
+    "sequence": SequenceStrategy,
+    "random": RandomStrategy,
+}
+
+_strategies = {}
+
+
+def get_strategy_class(name):
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+
+    for hook_name, path in (frappe.get_hooks("short_code_strategies") or {}).items():
+        if hook_name == name:
+            path = path[-1] if isinstance(path, list) else path
+            return frappe.get_attr(path)
+
+    frappe.throw(frappe._("Unknown short code strategy: {0}").format(name))
+
+
+def get_strategy(namespace, name=None):
+    """Per-process strategy instance for a namespace on the current site"""
+    if not name:
+        name = get_settings().short_code_strategy
+
+    key = (getattr(frappe.local, "site", None), namespace, name)
+    strategy = _strategies.get(key)
+    if strategy is None:
+        strategy = _strategies[key] = get_strategy_class(name)(namespace)
+    return strategy
+
+
+def allocate(namespace, count=1, strategy=None):
+    """Return `count` unused codes for `namespace`"""
+    return get_strategy(namespace, strategy).allocate(count)
+
+
+def allocate_one(namespace, strategy=None):
+    return allocate(namespace, 1, strategy)[0]
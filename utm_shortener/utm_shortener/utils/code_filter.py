@@ -0,0 +1,322 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Bloom filter of existing short codes for the redirect path.
+
+``might_exist`` answers False only for codes that were never created. The
+resolution cache then returns "not found" without a database query, so
+scanners probing random paths cost one Redis round trip each. A True
+answer can be a false positive (about 1%, or a deleted code). That only
+means the usual lookup runs.
+
+The filter is a Redis bitmap shared by all workers. A lookup is a single
+``BITFIELD`` command reading the code's k bits and a marker bit, which is
+always set. A missing or evicted bitmap therefore reads as "unknown",
+never as "absent". Codes are lowercased first, because short_code
+compares case-insensitively.
+
+``rebuild`` builds a new bitmap, sized for twice the current row count,
+in a background job. It starts from the dump file when there is one,
+and adds the codes of rows modified since the dump was written, which
+includes renamed codes. Otherwise it streams a scan of the table. While it runs, inserts go
+to the old bitmap and the new one. After the switch, workers may keep
+reading the old bitmap for up to META_TTL seconds, and inserts keep
+updating it for RETIRE_AFTER seconds. A missing filter is restored
+lazily, e.g. after a Redis restart. The daily rebuild also drops
+deleted codes and grows the filter. An hourly task saves the current
+bitmap to ``private/short_code_filter.bin``.
+"""
+
+import hashlib
+import math
+import os
+import struct
+import time
+
+import frappe
+from frappe.utils import add_to_date, get_datetime, now_datetime
+
+META_KEY = "utm_shortener:code_filter:meta"
+BITMAP_KEY_PREFIX = "utm_shortener:code_filter:"
+LOCK_KEY = "utm_shortener:code_filter:lock"
+DUMP_FILE = "short_code_filter.bin"
+
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 1000000
+# Bit 0 is always set; an unset marker means the bitmap is gone
+MARKER_BITS = 8
+
+META_TTL = 30
+RETIRE_AFTER = 3 * META_TTL
+LOCK_TTL = 60 * 60
+# Inserts committed this long after a rebuild scan started are rescanned
+RESCAN_MARGIN = 10 * 60
+
+MAGIC = b"UTMBLM01"
+# magic, bits, hashes, capacity, created (site time)
+DUMP_HEADER = struct.Struct("<8sQIQ26s")
+ADD_BATCH_SIZE = 1000
+
+
+def get_size(capacity, false_positive_rate=FALSE_POSITIVE_RATE):
+    """(bits, hashes) for `capacity` codes at the target false positive rate"""
+    bits = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+def get_positions(short_code, bits, hashes):
+    """Bit offsets of a code, by double hashing one 128-bit digest"""
+    digest = hashlib.blake2b(short_code.lower().encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [MARKER_BITS + (h1 + i * h2) % bits for i in range(hashes)]
+
+
+def new_bitmap(bits):
+    bitmap = bytearray((MARKER_BITS + bits + 7) // 8)
+    bitmap[0] = 0x80
+    return bitmap
+
+
+def set_bits(bitmap, short_code, bits, hashes):
+    # Redis numbers bits from the most significant bit of each byte
+    for position in get_positions(short_code, bits, hashes):
+        bitmap[position >> 3] |= 0x80 >> (position & 7)
+
+
+_meta = {}
+
+
+def get_meta(cached=True):
+    """Filter metadata; cached per process for META_TTL seconds on the redirect path"""
+    site = getattr(frappe.local, "site", None)
+    if cached:
+        entry = _meta.get(site)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+
+    meta = frappe.cache().get_value(META_KEY)
+    _meta[site] = (meta, time.monotonic() + META_TTL)
+    return meta
+
+
+def might_exist(short_code):
+    """False if the code certainly does not exist, None if the filter is unavailable"""
+    try:
+        meta = get_meta()
+        if not meta:
+            ensure_filter()
+            return None
+
+        cache = frappe.cache()
+        current = meta["current"]
+        operation = cache.bitfield(cache.make_key(current["key"]))
+        operation.get("u1", 0)
+        for position in get_positions(short_code, current["bits"], current["hashes"]):
+            operation.get("u1", position)
+        marker, *values = operation.execute()
+
+    except Exception:
+        return None
+
+    if not marker:
+        ensure_filter()
+        return None
+
+    return all(values)
+
+
+def add(*short_codes):
+    """Record new codes in every bitmap that is being read or built"""
+    short_codes = [code for code in short_codes if code]
+    if not short_codes:
+        return
+
+    try:
+        meta = get_meta(cached=False)
+        if not meta:
+            # The next rebuild reads them from the database
+            return
+
+        cache = frappe.cache()
+        specs = list(get_writable(meta, time.time()))
+        for start in range(0, len(short_codes), ADD_BATCH_SIZE):
+            pipe = cache.pipeline(transaction=False)
+            for spec in specs:
+                operation = pipe.bitfield(cache.make_key(spec["key"]))
+                for short_code in short_codes[start:start + ADD_BATCH_SIZE]:
+                    for position in get_positions(short_code, spec["bits"], spec["hashes"]):
+                        operation.set("u1", position, 1)
+                operation.execute()
+            pipe.execute()
+
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "Short Code Filter Error")
+
+
+def get_writable(meta, now):
+    yield meta["current"]
+    for spec in meta.get("others", []):
+        if not spec.get("until") or spec["until"] > now:
+            yield spec
+
+
+def iter_short_codes(since=None):
+    """Stream every short code, or those created or changed since a datetime"""
+    query = "SELECT short_code FROM `tabShort URL` WHERE short_code IS NOT NULL"
+    values = {}
+    if since:
+        # modified, not creation: a renamed code is missing from older bitmaps
+        query += " AND modified >= %(since)s"
+        values["since"] = since
+
+    with frappe.db.unbuffered_cursor():
+        for (short_code,) in frappe.db.sql(query, values, as_iterator=True):
+            yield short_code
+
+
+def ensure_filter():
+    """Queue a restore unless one is already running"""
+    if acquire_lock():
+        frappe.enqueue(
+            "utm_shortener.utm_shortener.utils.code_filter.rebuild",
+            queue="long",
+            timeout=LOCK_TTL,
+            locked=True,
+        )
+
+
+def acquire_lock():
+    cache = frappe.cache()
+    return bool(cache.set(cache.make_key(LOCK_KEY), 1, nx=True, ex=LOCK_TTL))
+
+
+def release_lock():
+    cache = frappe.cache()
+    cache.delete(cache.make_key(LOCK_KEY))
+
+
+def rebuild(use_dump=True, locked=False):
+    """Build a new bitmap and switch lookups to it"""
+    if not locked and not acquire_lock():
+        return False
+
+    try:
+        count = frappe.db.count("Short URL")
+        dump = read_dump() if use_dump else None
+        started = now_datetime()
+
+        if dump and count <= dump["capacity"]:
+            bits, hashes, capacity, bitmap = dump["bits"], dump["hashes"], dump["capacity"], dump["bitmap"]
+            since = add_to_date(dump["created"], seconds=-RESCAN_MARGIN)
+        else:
+            capacity = max(count * 2, MIN_CAPACITY)
+            bits, hashes = get_size(capacity)
+            bitmap, since = new_bitmap(bits), None
+
+        spec = {"key": BITMAP_KEY_PREFIX + frappe.generate_hash(length=10), "bits": bits,
+            "hashes": hashes, "capacity": capacity}
+        old_meta = get_meta(cached=False)
+
+        # Inserts from now on also land in the new bitmap
+        update_meta(old_meta, building=spec)
+
+        for short_code in iter_short_codes(since):
+            set_bits(bitmap, short_code, bits, hashes)
+        merge_bitmap(spec["key"], bitmap)
+
+        update_meta(get_meta(cached=False), current=spec)
+
+        # Inserts and renames committed after the scan started that only reached the old bitmap
+        add(*iter_short_codes(add_to_date(started, seconds=-RESCAN_MARGIN)))
+        return True
+
+    finally:
+        release_lock()
+
+
+def merge_bitmap(key, bitmap):
+    """OR a local bitmap into `key`, keeping bits set by concurrent inserts"""
+    cache = frappe.cache()
+    tmp_key = cache.make_key(key + ":tmp")
+    pipe = cache.pipeline(transaction=False)
+    pipe.delete(tmp_key)
+    for offset in range(0, len(bitmap), 1 << 20):
+        pipe.setrange(tmp_key, offset, bytes(bitmap[offset:offset + (1 << 20)]))
+    pipe.bitop("OR", cache.make_key(key), cache.make_key(key), tmp_key)
+    pipe.delete(tmp_key)
+    pipe.execute()
+
+
+def update_meta(meta, current=None, building=None):
+    """Add a bitmap being built, or make one current and retire the old one"""
+    now = time.time()
+    meta = dict(meta or {})
+    others = [spec for spec in meta.get("others", []) if not spec.get("until") or spec["until"] > now]
+
+    if building:
+        others.append(dict(building, until=None))
+        if not meta.get("current"):
+            # Nothing to read yet; writes go to the bitmap being built
+            meta["current"], others = dict(building), others[:-1]
+
+    if current:
+        others = [spec for spec in others if spec["key"] != current["key"]]
+        previous = meta.get("current")
+        if previous and previous["key"] != current["key"]:
+            previous = dict(previous, until=now + RETIRE_AFTER)
+            others.append(previous)
+            cache = frappe.cache()
+            cache.expire(cache.make_key(previous["key"]), RETIRE_AFTER + META_TTL)
+        meta["current"] = dict(current)
+
+    meta["others"] = others
+    frappe.cache().set_value(META_KEY, meta)
+    _meta.pop(getattr(frappe.local, "site", None), None)
+    return meta
+
+
+def get_dump_path():
+    return frappe.get_site_path("private", DUMP_FILE)
+
+
+def save_dump():
+    """Write the current bitmap to the site's private directory"""
+    meta = get_meta(cached=False)
+    if not meta:
+        return False
+
+    cache = frappe.cache()
+    current = meta["current"]
+    bitmap = cache.get(cache.make_key(current["key"]))
+    if not bitmap or not bitmap[0] & 0x80:
+        return False
+
+    path = get_dump_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(DUMP_HEADER.pack(MAGIC, current["bits"], current["hashes"], current["capacity"],
+            str(now_datetime()).encode()))
+        f.write(bitmap)
+    os.replace(tmp_path, path)
+    return True
+
+
+def read_dump():
+    """Contents of the dump file, or None"""
+    try:
+        with open(get_dump_path(), "rb") as f:
+            magic, bits, hashes, capacity, created = DUMP_HEADER.unpack(f.read(DUMP_HEADER.size))
+            if magic != MAGIC:
+                return None
+            bitmap = bytearray(f.read())
+    except (OSError, struct.error):
+        return None
+
+    if len(bitmap) < (MARKER_BITS + bits + 7) // 8:
+        return None
+
+    return {"bits": bits, "hashes": hashes, "capacity": capacity, "bitmap": bitmap,
+        "created": get_datetime(created.rstrip(b"\0").decode())}
@@ -0,0 +1,163 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Pre-allocated pool of unused short codes.
+
+``refill`` runs from the scheduler and tops a Redis set up to the Code
+Pool Watermark with codes from code_allocator. With the sequence strategy
+those codes are reserved: their counter blocks are leased and committed
+before they enter the pool, so no other allocation can hand them out.
+``pop`` takes a code with one ``SPOP``, so inserts never wait on an
+allocator lease. Only when the set is empty do they fall back to the
+allocator directly.
+
+Counters in a Redis hash record codes popped, codes refilled, and the
+times the pool ran dry. ``get_metrics`` returns them together with the
+current pool size.
+"""
+
+import frappe
+from frappe.utils import cint, now_datetime
+
+from utm_shortener.utm_shortener.utils import code_allocator
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
+
+POOL_KEY_PREFIX = "utm_shortener:code_pool:"
+METRICS_KEY = "utm_shortener:code_pool:metrics"
+
+# Namespaces kept topped up by the scheduler
+POOLED_NAMESPACES = (code_allocator.SHORT_URL,)
+
+
+def get_pool_key(namespace):
+    return POOL_KEY_PREFIX + frappe.scrub(namespace.doctype)
+
+
+def get_watermark():
+    # 0 disables the pool
+    return get_settings().code_pool_watermark
+
+
+def get_refill_batch():
+    return get_settings().code_pool_refill_batch
+
+
+def pop(namespace):
+    """Take one reserved code, falling back to the allocator when empty"""
+    return pop_many(namespace, 1)[0]
+
+
+def pop_many(namespace, count):
+    """Take `count` reserved codes, topping up from the allocator if short"""
+    codes = []
+    try:
+        cache = frappe.cache()
+        prefix = frappe.scrub(namespace.doctype)
+        metrics_key = cache.make_key(METRICS_KEY)
+
+        pipe = cache.pipeline(transaction=False)
+        pipe.spop(cache.make_key(get_pool_key(namespace)), count)
+        pipe.hincrby(metrics_key, f"{prefix}:popped", count)
+        codes = [frappe.safe_decode(code) for code in pipe.execute()[0] or []]
+
+        if len(codes) < count:
+            pipe = cache.pipeline(transaction=False)
+            pipe.hincrby(metrics_key, f"{prefix}:popped", len(codes) - count)
+            if get_watermark():
+                pipe.hincrby(metrics_key, f"{prefix}:exhausted", 1)
+                pipe.hset(metrics_key, f"{prefix}:last_exhausted", str(now_datetime()))
+            pipe.execute()
+
+    except Exception:
+        # Redis is unavailable, allocate directly
+        pass
+
+    if len(codes) < count:
+        codes.extend(code_allocator.allocate(namespace, count - len(codes)))
+
+    return codes
+
+
+def discard(namespace, *codes):
+    """Remove codes taken by other means (e.g. custom aliases) from the pool"""
+    if not codes:
+        return
+
+    try:
+        cache = frappe.cache()
+        pipe = cache.pipeline(transaction=False)
+        pipe.srem(cache.make_key(get_pool_key(namespace)), *codes)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def get_size(namespace):
+    cache = frappe.cache()
+    pipe = cache.pipeline(transaction=False)
+    pipe.scard(cache.make_key(get_pool_key(namespace)))
+    return cint(pipe.execute()[0])
+
+
+def refill(namespace, watermark=None, max_codes=None):
+    """Top the pool up to `watermark`, adding at most `max_codes` codes"""
+    watermark = get_watermark() if watermark is None else watermark
+    missing = watermark - get_size(namespace)
+    if missing <= 0:
+        return 0
+
+    count = min(missing, max_codes or get_refill_batch())
+    codes = code_allocator.allocate(namespace, count)
+    # The leases must be durable before their codes are handed out
+    frappe.db.commit()
+
+    cache = frappe.cache()
+    prefix = frappe.scrub(namespace.doctype)
+    pipe = cache.pipeline(transaction=False)
+    for start in range(0, len(codes), 1000):
+        pipe.sadd(cache.make_key(get_pool_key(namespace)), *codes[start:start + 1000])
+    pipe.hincrby(cache.make_key(METRICS_KEY), f"{prefix}:refilled", len(codes))
+    pipe.hset(cache.make_key(METRICS_KEY), f"{prefix}:last_refill", str(now_datetime()))
+    pipe.hset(cache.make_key(METRICS_KEY), f"{prefix}:last_refill_count", len(codes))
+    pipe.execute()
+
+    return len(codes)
+
+
+def refill_pools():
+    """Top up every pooled namespace"""
+    watermark = get_watermark()
+    if not watermark:
+        return 0
+
+    return sum(refill(namespace, watermark) for namespace in POOLED_NAMESPACES)
+
+
+def get_metrics():
+    """Pool size and counters per pooled namespace"""
+    cache = frappe.cache()
+    pipe = cache.pipeline(transaction=False)
+    pipe.hgetall(cache.make_key(METRICS_KEY))
+    for namespace in POOLED_NAMESPACES:
+        pipe.scard(cache.make_key(get_pool_key(namespace)))
+    raw, *sizes = pipe.execute()
+
+    counters = {frappe.safe_decode(key): frappe.safe_decode(value) for key, value in (raw or {}).items()}
+    watermark = get_watermark()
+
+    metrics = {}
+    for namespace, size in zip(POOLED_NAMESPACES, sizes):
+        prefix = frappe.scrub(namespace.doctype)
+        metrics[namespace.doctype] = {
+            "size": cint(size),
+            "watermark": watermark,
+            "popped": cint(counters.get(f"{prefix}:popped")),
+            "refilled": cint(counters.get(f"{prefix}:refilled")),
+            "exhausted": cint(counters.get(f"{prefix}:exhausted")),
+            "last_refill": counters.get(f"{prefix}:last_refill"),
+            "last_refill_count": cint(counters.get(f"{prefix}:last_refill_count")),
+            "last_exhausted": counters.get(f"{prefix}:last_exhausted"),
+        }
+
+    return metrics
@@ -0,0 +1,209 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Blocked and allowed destination domains for Short URLs.
+
+Domains are kept as sets of 64-bit hashes. A host is checked by hashing
+each of its suffixes, most specific first (``a.b.example.com``,
+``b.example.com``, ``example.com``, ``com``), so a check costs one set
+lookup per label whatever the size of the lists. The first list that
+matches decides. An allowed subdomain can therefore be carved out of a
+blocked domain, and the reverse. With Allowed Domains Only set, hosts
+that match no allowed domain are rejected.
+
+Besides the Blocked Domains setting, large feeds of malware or phishing
+domains can be read from the Blocklist Path setting. The file holds one
+domain per line, or uses hosts file format. It is compiled once into a
+sorted table of suffix hashes under the site's ``private/domain_policy``
+directory. The table is memory-mapped and searched with ``bisect``, so
+all workers share one copy through the page cache. It is recompiled only
+when the source file changes.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+import frappe
+from frappe import _
+
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
+
+MAGIC = b"UTMDOM01"
+# magic, hash count
+HEADER = struct.Struct("<8sI")
+
+
+def normalize_domain(domain):
+    """Lowercase ASCII form of a domain or wildcard entry, or None"""
+    domain = (domain or "").strip().lower().strip("|^").lstrip("*").strip(".")
+    if not domain or "/" in domain:
+        return None
+    if not domain.isascii():
+        try:
+            domain = domain.encode("idna").decode()
+        except UnicodeError:
+            return None
+    return domain
+
+
+def hash_domain(domain):
+    return int.from_bytes(hashlib.blake2b(domain.encode(), digest_size=8).digest(), "little")
+
+
+def hash_domains(domains):
+    return frozenset(hash_domain(domain) for domain in map(normalize_domain, domains) if domain)
+
+
+def iter_suffixes(host):
+    """The host and each of its parent domains, most specific first"""
+    yield host
+    index = host.find(".")
+    while index != -1:
+        yield host[index + 1:]
+        index = host.find(".", index + 1)
+
+
+def parse_host(url):
+    """Normalized host of a URL, or None"""
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return None
+    return normalize_domain(host)
+
+
+class Blocklist:
+    """Memory-mapped, sorted table of domain hashes"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled domain blocklist")
+        self.hashes = memoryview(self.buffer)[HEADER.size:HEADER.size + count * 8].cast("Q")
+
+    def __contains__(self, domain_hash):
+        index = bisect_left(self.hashes, domain_hash)
+        return index < len(self.hashes) and self.hashes[index] == domain_hash
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def close(self):
+        # The view must go before the map can be closed
+        self.hashes.release()
+        self.buffer.close()
+
+
+def iter_blocklist_domains(path):
+    """Domains of a plain or hosts file format blocklist"""
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            tokens = line.split("#", 1)[0].split()
+            # Hosts files map an address to one or more names
+            for token in tokens[1:] if len(tokens) > 1 else tokens:
+                domain = normalize_domain(token)
+                if domain and domain not in ("localhost", "localhost.localdomain"):
+                    yield domain
+
+
+def compile_blocklist(source_path, output_path):
+    """Compile a blocklist file into the memory-mappable hash table"""
+    hashes = array("Q", sorted({hash_domain(domain) for domain in iter_blocklist_domains(source_path)}))
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(hashes)))
+        f.write(hashes.tobytes())
+    os.replace(tmp_path, output_path)
+
+
+def open_blocklist(path):
+    """Open a compiled blocklist, compiling the source file next to the site"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    compiled = frappe.get_site_path("private", "domain_policy", f"{name}.bin")
+    if not os.path.exists(compiled) or os.path.getmtime(compiled) < os.path.getmtime(path):
+        os.makedirs(os.path.dirname(compiled), exist_ok=True)
+        compile_blocklist(path, compiled)
+    return Blocklist(compiled)
+
+
+def resolve_blocklist_path(path):
+    if not path or os.path.isabs(path):
+        return path
+    return frappe.get_site_path(path)
+
+
+class DomainPolicy:
+    """Decide whether links to a host may be created"""
+
+    def __init__(self, blocked=(), allowed=(), allowed_only=False, blocklist=None):
+        self.blocked = hash_domains(blocked)
+        self.allowed = hash_domains(allowed)
+        self.allowed_only = allowed_only and bool(self.allowed)
+        self.blocklist = blocklist
+
+    def is_allowed(self, host):
+        for suffix in iter_suffixes(host):
+            domain_hash = hash_domain(suffix)
+            if domain_hash in self.allowed:
+                return True
+            if domain_hash in self.blocked or (self.blocklist is not None and domain_hash in self.blocklist):
+                return False
+        return not self.allowed_only
+
+    def close(self):
+        if self.blocklist is not None:
+            self.blocklist.close()
+
+
+_policies = {}
+
+
+def get_policy():
+    """Policy for the current site, rebuilt when its settings or blocklist change"""
+    settings = get_settings()
+    path = resolve_blocklist_path(settings.blocklist_path)
+    try:
+        mtime = os.path.getmtime(path) if path else None
+    except OSError:
+        mtime = None
+
+    key = (getattr(frappe.local, "site", None), settings.blocked_domains, settings.allowed_domains,
+        settings.allowed_domains_only, path, mtime)
+    policy = _policies.get(key)
+    if policy is not None:
+        return policy
+
+    for stale in [k for k in _policies if k[0] == key[0]]:
+        _policies.pop(stale).close()
+
+    blocklist = None
+    if path:
+        try:
+            blocklist = open_blocklist(path)
+        except Exception:
+            # The settings lists still apply; logged once per file version
+            frappe.log_error(frappe.get_traceback(), "Domain Blocklist Error")
+
+    policy = _policies[key] = DomainPolicy(settings.blocked_domains, settings.allowed_domains,
+        settings.allowed_domains_only, blocklist)
+    return policy
+
+
+def validate_url(url):
+    """Throw unless links to the URL's host may be created"""
+    host = parse_host(url)
+    if not host:
+        frappe.throw(_("URL must include a valid domain"))
+    if not get_policy().is_allowed(host):
+        frappe.throw(_("Links to {0} are not allowed").format(host))
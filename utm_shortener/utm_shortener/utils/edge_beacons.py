@@ -0,0 +1,99 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Click beacons from edge redirects.
+
+Links redirected by the edge worker (see ``edge_snapshot``) never reach
+the site, so the worker posts their clicks in batches. Each event has
+the short code, the time of the click in epoch milliseconds and the
+client's IP, user agent and referrer. ``ingest_clicks`` resolves the
+codes through the resolution cache and pushes the clicks onto the click
+queue in one Redis command. The scheduler then persists them like
+redirects served here.
+
+A batch may carry an id. Workers retry failed posts, and a batch id
+seen in the last BATCH_ID_TTL seconds is acknowledged without queueing
+its clicks again.
+"""
+
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import add_to_date, now_datetime
+
+from utm_shortener.utm_shortener.utils import click_queue, resolution_cache
+from utm_shortener.utm_shortener.utils.edge_snapshot import to_site_datetime
+
+BATCH_KEY_PREFIX = "utm_shortener:edge:batch:"
+BATCH_ID_TTL = 24 * 60 * 60
+MAX_BATCH_SIZE = 1000
+# Older click times are replaced by the time of arrival
+MAX_CLICK_AGE_DAYS = 7
+
+
+def claim_batch(batch_id):
+    """False if the batch was already ingested"""
+    cache = frappe.cache()
+    return bool(cache.set(cache.make_key(BATCH_KEY_PREFIX + batch_id), 1, nx=True, ex=BATCH_ID_TTL))
+
+
+def release_batch(batch_id):
+    cache = frappe.cache()
+    cache.delete(cache.make_key(BATCH_KEY_PREFIX + batch_id))
+
+
+def get_click_time(ms, now):
+    try:
+        timestamp = to_site_datetime(int(ms))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return now
+    if timestamp > now or timestamp < add_to_date(now, days=-MAX_CLICK_AGE_DAYS):
+        return now
+    return timestamp
+
+
+def ingest_clicks(events, batch_id=None):
+    """Queue a batch of edge clicks; returns (accepted, rejected, duplicate)"""
+    if not isinstance(events, list):
+        frappe.throw(_("Events must be a list"))
+    if len(events) > MAX_BATCH_SIZE:
+        frappe.throw(_("At most {0} events can be sent at once").format(MAX_BATCH_SIZE))
+
+    if batch_id and not claim_batch(batch_id):
+        return 0, 0, True
+
+    now = now_datetime()
+    queued = []
+    for event in events:
+        short_code = event.get("code") if isinstance(event, dict) else None
+        entry = resolution_cache.resolve_short_code(short_code) if short_code else None
+        if not entry:
+            continue
+
+        queued_event = click_queue.make_click_event(entry, {
+            "ip_address": event.get("ip") or "",
+            "user_agent": event.get("ua") or "",
+            "referrer": event.get("ref") or "",
+        })
+        queued_event["ts"] = str(get_click_time(event.get("ts"), now))
+        queued.append(queued_event)
+
+    try:
+        if queued:
+            cache = frappe.cache()
+            pipe = cache.pipeline(transaction=False)
+            pipe.rpush(cache.make_key(click_queue.QUEUE_KEY),
+                *(json.dumps(event, separators=(",", ":")) for event in queued))
+            pipe.execute()
+    except Exception:
+        try:
+            # Redis is unavailable, write in the request as enqueue_click does
+            click_queue.persist_click_events(queued)
+        except Exception:
+            if batch_id:
+                release_batch(batch_id)
+            raise
+
+    return len(queued), len(events) - len(queued), False
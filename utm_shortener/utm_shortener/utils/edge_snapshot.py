@@ -0,0 +1,188 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Versioned short code -> target URL snapshots for edge redirects.
+
+An edge worker (``cloudflare-worker/utm-shortener-worker.js``) keeps a
+copy of the redirectable links in its key-value store and calls
+``export_snapshot`` with the version of its copy:
+
+* without a version, or with one older than the deletion log, the
+  export is a full snapshot of active links (``full`` is set);
+* otherwise it is a delta: links changed since that version, with
+  inactive or expired ones under ``delete``, plus codes deleted or
+  renamed since then.
+
+Results are paged with an opaque ``next`` cursor. The client applies
+``delete`` before ``upsert``, and stores ``version`` once the last page
+(``next`` is None) is applied. Deltas start RESCAN_MARGIN before the
+given version, so rows committed late are not missed. Applying a change
+twice is harmless.
+
+Versions are epoch milliseconds. Each upsert is ``[code, target_url,
+expires]``, with ``expires`` in epoch milliseconds or None. Codes are
+lowercased, as short codes compare case-insensitively.
+
+Deleted rows leave no trace in the table, so deleted and renamed codes
+are kept in a Redis sorted set for DELETION_RETENTION seconds.
+
+The worker authenticates as a user with the EDGE_ROLE role, which grants
+the snapshot export and click ingestion endpoints and nothing else.
+"""
+
+import base64
+import json
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import frappe
+from frappe import _
+from frappe.utils import cint, get_datetime, get_system_timezone
+
+from utm_shortener.utm_shortener.utils import resolution_cache
+
+EDGE_ROLE = "UTM Edge"
+
+DELETED_KEY = "utm_shortener:edge:deleted"
+# Epoch ms from which DELETED_KEY is complete
+DELETED_SINCE_KEY = "utm_shortener:edge:deleted_since"
+DELETION_RETENTION = 30 * 24 * 60 * 60
+
+RESCAN_MARGIN = 10 * 60
+DEFAULT_PAGE_SIZE = 5000
+MAX_PAGE_SIZE = 50000
+
+SNAPSHOT_FIELDS = resolution_cache.RESOLUTION_FIELDS + ("modified",)
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def to_epoch_ms(value):
+    """Epoch ms of a site time datetime or date"""
+    value = get_datetime(value).replace(tzinfo=ZoneInfo(get_system_timezone()))
+    return int(value.timestamp() * 1000)
+
+
+def to_site_datetime(ms):
+    """Naive site time datetime of epoch ms"""
+    value = datetime.fromtimestamp(ms / 1000, timezone.utc).astimezone(ZoneInfo(get_system_timezone()))
+    return value.replace(tzinfo=None)
+
+
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(cursor["v"]), int(cursor["s"]) if cursor["s"] is not None else None, cursor["m"], cursor["n"]
+    except (ValueError, KeyError, TypeError):
+        frappe.throw(_("Invalid snapshot cursor"))
+
+
+def record_deleted(*short_codes):
+    """Log codes that no longer exist, for deltas"""
+    short_codes = [short_code.lower() for short_code in short_codes if short_code]
+    if not short_codes:
+        return
+
+    try:
+        cache = frappe.cache()
+        now = now_ms()
+        pipe = cache.pipeline(transaction=False)
+        pipe.set(cache.make_key(DELETED_SINCE_KEY), now, nx=True)
+        pipe.zadd(cache.make_key(DELETED_KEY), {short_code: now for short_code in short_codes})
+        pipe.zremrangebyscore(cache.make_key(DELETED_KEY), "-inf", now - DELETION_RETENTION * 1000)
+        pipe.execute()
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "Edge Snapshot Error")
+
+
+def record_deleted_on_commit(*short_codes):
+    """Log codes once their delete or rename has committed
+
+    A delete can still fail after on_trash (e.g. on linked click logs), and
+    logging it early would remove a live link from the edge.
+    """
+    frappe.db.after_commit.add(lambda: record_deleted(*short_codes))
+
+
+def get_deleted_since():
+    """Epoch ms from which the deletion log is complete"""
+    cache = frappe.cache()
+    now = now_ms()
+    # Redis was flushed, or nothing was deleted yet: complete from now on
+    cache.set(cache.make_key(DELETED_SINCE_KEY), now, nx=True)
+    deleted_since = cint(cache.get(cache.make_key(DELETED_SINCE_KEY)))
+    return max(deleted_since, now - DELETION_RETENTION * 1000)
+
+
+def get_deleted(since_ms, until_ms):
+    cache = frappe.cache()
+    return [frappe.safe_decode(short_code) for short_code in
+        cache.zrangebyscore(cache.make_key(DELETED_KEY), since_ms, until_ms)]
+
+
+def export_snapshot(since=None, cursor=None, limit=None):
+    """One page of a full snapshot or of the changes since version `since`"""
+    limit = min(cint(limit) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+    if cursor:
+        version, since_ms, after_modified, after_name = decode_cursor(cursor)
+    else:
+        version, after_modified, after_name = now_ms(), None, None
+        since = cint(since)
+        # Deletions before the start of the log are unknown
+        since_ms = since - RESCAN_MARGIN * 1000 if since and since >= get_deleted_since() else None
+
+    conditions = ["modified <= %(until)s"]
+    values = {"until": to_site_datetime(version), "limit": limit}
+    if since_ms is None:
+        # Full snapshot: only what the edge should redirect
+        conditions.append("status = 'Active' AND (expiry_date IS NULL OR expiry_date >= CURDATE())")
+    else:
+        conditions.append("modified >= %(since)s")
+        values["since"] = to_site_datetime(since_ms)
+    if after_modified:
+        conditions.append("(modified > %(after_modified)s OR (modified = %(after_modified)s AND name > %(after_name)s))")
+        values.update(after_modified=after_modified, after_name=after_name)
+
+    rows = frappe.db.sql("""
+        SELECT {fields}
+        FROM `tabShort URL`
+        WHERE {conditions}
+        ORDER BY modified, name
+        LIMIT %(limit)s
+    """.format(fields=", ".join(f"`{field}`" for field in SNAPSHOT_FIELDS), conditions=" AND ".join(conditions)),
+        values, as_dict=True)
+
+    now = now_ms()
+    upsert, delete = [], []
+    for row in rows:
+        entry = resolution_cache.make_entry(row)
+        expires = to_epoch_ms(entry.expiry_date) if entry.expiry_date else None
+        if entry.status != "Active" or (expires and expires < now):
+            delete.append(entry.short_code.lower())
+        else:
+            upsert.append([entry.short_code.lower(), entry.target_url, expires])
+
+    if since_ms is not None and not cursor:
+        delete.extend(get_deleted(since_ms, version))
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor({"v": version, "s": since_ms, "m": str(last.modified), "n": last.name})
+
+    return {
+        "version": str(version),
+        "full": since_ms is None,
+        "upsert": upsert,
+        "delete": delete,
+        "next": next_cursor,
+    }
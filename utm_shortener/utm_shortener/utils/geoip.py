@@ -0,0 +1,315 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Offline IP geolocation.
+
+Lookups run against a local database, never a remote API:
+
+* a compiled range table (``.bin``): sorted, fixed-width IPv4 and IPv6
+  ``(start, end, location)`` records followed by a string table. The file
+  is memory-mapped and searched with ``bisect``, so it is shared between
+  worker processes through the page cache and never parsed in full;
+* a range CSV (``.csv``), compiled to the table above on first use. Rows
+  are either ``network,country,city`` (CIDR) or ``start,end,country,city``;
+* a MaxMind ``.mmdb`` file, read in mmap mode when the optional
+  ``maxminddb`` package is installed.
+
+Recent lookups are memoized per process. Without a configured database
+the bundled ``data/geoip_sample.csv`` is used; it only covers reserved
+documentation ranges and is meant for tests.
+"""
+
+import csv
+import ipaddress
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from functools import lru_cache
+
+import frappe
+
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
+
+SAMPLE_DATABASE = os.path.join(os.path.dirname(__file__), "data", "geoip_sample.csv")
+LOOKUP_CACHE_SIZE = 65536
+
+UNKNOWN = ("Unknown", "")
+
+MAGIC = b"UTMGEO01"
+# magic, IPv4 record count, IPv6 record count, location count
+HEADER = struct.Struct("<8sIII")
+IPV4_RECORD = struct.Struct("<IIi")
+IPV6_RECORD = struct.Struct("<16s16si")
+OFFSET = struct.Struct("<I")
+
+
+class _RecordStarts:
+    """Sequence view over the start address of each record, for bisect"""
+
+    def __init__(self, buffer, offset, record, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.record = record
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.record.unpack_from(self.buffer, self.offset + index * self.record.size)[0]
+
+    def get(self, index):
+        return self.record.unpack_from(self.buffer, self.offset + index * self.record.size)
+
+
+class RangeDatabase:
+    """Memory-mapped compiled range table"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, ipv4_count, ipv6_count, location_count = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled GeoIP range table")
+
+        offset = HEADER.size
+        self.ipv4 = _RecordStarts(self.buffer, offset, IPV4_RECORD, ipv4_count)
+        offset += ipv4_count * IPV4_RECORD.size
+        self.ipv6 = _RecordStarts(self.buffer, offset, IPV6_RECORD, ipv6_count)
+        offset += ipv6_count * IPV6_RECORD.size
+        self.location_offsets = offset
+        self.location_count = location_count
+        self.strings_offset = offset + (location_count + 1) * OFFSET.size
+
+    def lookup(self, address):
+        """Return (country, city) for an ipaddress object, or None"""
+        if address.version == 4:
+            records, key = self.ipv4, int(address)
+        else:
+            records, key = self.ipv6, address.packed
+
+        index = bisect_right(records, key) - 1
+        if index < 0:
+            return None
+
+        start, end, location = records.get(index)
+        if key > end or location < 0:
+            return None
+
+        return self._location(location)
+
+    def _location(self, index):
+        start = OFFSET.unpack_from(self.buffer, self.location_offsets + index * OFFSET.size)[0]
+        end = OFFSET.unpack_from(self.buffer, self.location_offsets + (index + 1) * OFFSET.size)[0]
+        country, city = bytes(self.buffer[self.strings_offset + start:self.strings_offset + end]) \
+            .decode().split("\x1f", 1)
+        return country, city
+
+    def close(self):
+        self.buffer.close()
+
+
+class MMDBDatabase:
+    """MaxMind database read through the maxminddb package"""
+
+    def __init__(self, path):
+        try:
+            import maxminddb
+        except ImportError:
+            raise ImportError("Reading .mmdb files requires the maxminddb package")
+
+        self.path = path
+        self.reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+
+    def lookup(self, address):
+        record = self.reader.get(address)
+        if not record:
+            return None
+
+        country = record.get("country") or record.get("registered_country") or {}
+        city = record.get("city") or {}
+        return (
+            country.get("names", {}).get("en") or country.get("iso_code") or UNKNOWN[0],
+            city.get("names", {}).get("en") or "",
+        )
+
+    def close(self):
+        self.reader.close()
+
+
+class GeoIPReader:
+    """Resolve IP address strings to (country, city) with a per-process cache"""
+
+    def __init__(self, database):
+        self.database = database
+        self.lookup = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._lookup)
+
+    def _lookup(self, ip):
+        address = parse_ip(ip)
+        if address is None:
+            return UNKNOWN
+
+        return self.database.lookup(address) or UNKNOWN
+
+    def lookup_many(self, ips):
+        return [self.lookup(ip or "") for ip in ips]
+
+    def close(self):
+        self.database.close()
+
+
+def parse_ip(ip):
+    """Parse the client address, unwrapping IPv4-mapped IPv6 addresses"""
+    if not ip:
+        return None
+
+    # Forwarded headers may carry a list; the client comes first
+    ip = ip.split(",", 1)[0].strip()
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+
+def iter_csv_ranges(path):
+    """Yield (start, end, country, city) address ranges from a range CSV"""
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+
+            try:
+                if "/" in row[0]:
+                    network = ipaddress.ip_network(row[0].strip(), strict=False)
+                    start, end = network.network_address, network.broadcast_address
+                    location = row[1:3]
+                else:
+                    start, end = ipaddress.ip_address(row[0].strip()), ipaddress.ip_address(row[1].strip())
+                    location = row[2:4]
+            except (ValueError, IndexError):
+                # Header or malformed row
+                continue
+
+            if start.version != end.version or start > end:
+                raise ValueError(f"Invalid range {row[0]} in {path}")
+
+            country = (location[0] if location else "").strip() or UNKNOWN[0]
+            city = (location[1] if len(location) > 1 else "").strip()
+            yield start, end, country, city
+
+
+def compile_csv(csv_path, output_path):
+    """Compile a range CSV into the memory-mappable table format"""
+    ranges = {4: [], 6: []}
+    locations = {}
+
+    for start, end, country, city in iter_csv_ranges(csv_path):
+        location = locations.setdefault((country, city), len(locations))
+        ranges[start.version].append((start, end, location))
+
+    for version in ranges:
+        ranges[version].sort()
+        for previous, current in zip(ranges[version], ranges[version][1:]):
+            if current[0] <= previous[1]:
+                raise ValueError(f"Overlapping ranges {previous[0]} and {current[0]} in {csv_path}")
+
+    strings = []
+    offsets = [0]
+    for country, city in locations:
+        strings.append(f"{country}\x1f{city}".encode())
+        offsets.append(offsets[-1] + len(strings[-1]))
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(ranges[4]), len(ranges[6]), len(locations)))
+        for start, end, location in ranges[4]:
+            f.write(IPV4_RECORD.pack(int(start), int(end), location))
+        for start, end, location in ranges[6]:
+            f.write(IPV6_RECORD.pack(start.packed, end.packed, location))
+        for offset in offsets:
+            f.write(OFFSET.pack(offset))
+        f.write(b"".join(strings))
+
+    # Other workers may be compiling the same file; the rename is atomic
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def open_database(path):
+    """Open a .mmdb, .bin or .csv database, compiling CSVs next to the site"""
+    if path.endswith(".mmdb"):
+        return MMDBDatabase(path)
+
+    if path.endswith(".csv"):
+        name = os.path.splitext(os.path.basename(path))[0]
+        compiled = frappe.get_site_path("private", "geoip", f"{name}.bin")
+        if not os.path.exists(compiled) or os.path.getmtime(compiled) < os.path.getmtime(path):
+            os.makedirs(os.path.dirname(compiled), exist_ok=True)
+            compile_csv(path, compiled)
+        path = compiled
+
+    return RangeDatabase(path)
+
+
+def resolve_database_path(path):
+    if not path:
+        return SAMPLE_DATABASE
+    if os.path.isabs(path):
+        return path
+    return frappe.get_site_path(path)
+
+
+_readers = {}
+
+
+def get_reader():
+    """Reader for the configured database, or None when geolocation is off"""
+    settings = get_settings()
+    if not settings.enable_geolocation:
+        return None
+
+    path = resolve_database_path(settings.geoip_database_path)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+
+    key = (getattr(frappe.local, "site", None), path, mtime)
+    if key in _readers:
+        return _readers[key]
+
+    # Replace the site's reader when its file changes or is reconfigured
+    for stale in [k for k in _readers if k[0] == key[0]]:
+        reader = _readers.pop(stale)
+        if reader:
+            reader.close()
+
+    try:
+        reader = GeoIPReader(open_database(path))
+    except Exception:
+        # Remembered as None so a broken database is logged once, not per click
+        frappe.log_error(frappe.get_traceback(), "GeoIP Database Error")
+        reader = None
+
+    _readers[key] = reader
+    return reader
+
+
+def lookup(ip):
+    """Return (country, city) for an IP address string"""
+    reader = get_reader()
+    return reader.lookup(ip or "") if reader else UNKNOWN
+
+
+def lookup_many(ips):
+    """Return (country, city) for each IP address string"""
+    reader = get_reader()
+    return reader.lookup_many(ips) if reader else [UNKNOWN] * len(ips)
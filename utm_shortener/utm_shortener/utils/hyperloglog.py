@@ -0,0 +1,233 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Pure-Python HyperLogLog that is byte-compatible with Redis.
+
+It hashes with MurmurHash64A using the Redis seed, keeps 2^14 six-bit
+registers and reads/writes the Redis ``HYLL`` representation. A sketch
+serialized here can be loaded into Redis with ``SET`` and merged with
+``PFMERGE``, and a sketch fetched with ``GET`` can be counted here.
+"""
+
+import math
+import struct
+
+HLL_P = 14
+HLL_Q = 64 - HLL_P
+HLL_REGISTERS = 1 << HLL_P
+HLL_P_MASK = HLL_REGISTERS - 1
+HLL_BITS = 6
+HLL_REGISTER_MAX = (1 << HLL_BITS) - 1
+HLL_HDR_SIZE = 16
+HLL_DENSE_SIZE = HLL_HDR_SIZE + (HLL_REGISTERS * HLL_BITS + 7) // 8
+HLL_DENSE = 0
+HLL_SPARSE = 1
+HLL_ALPHA_INF = 0.721347520444481703680
+HLL_MAGIC = b"HYLL"
+
+MURMUR_SEED = 0xADC83B19
+_M = 0xC6A4A7935BD1E995
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def murmurhash64a(data, seed=MURMUR_SEED):
+    """MurmurHash64A as used by Redis for HyperLogLog"""
+    length = len(data)
+    h = (seed ^ (length * _M)) & _MASK64
+
+    end = length - (length & 7)
+    for (k,) in struct.iter_unpack("<Q", data[:end]):
+        k = (k * _M) & _MASK64
+        k ^= k >> 47
+        k = (k * _M) & _MASK64
+        h ^= k
+        h = (h * _M) & _MASK64
+
+    tail = data[end:]
+    if tail:
+        for i in range(len(tail) - 1, -1, -1):
+            h ^= tail[i] << (8 * i)
+        h = (h * _M) & _MASK64
+
+    h ^= h >> 47
+    h = (h * _M) & _MASK64
+    h ^= h >> 47
+    return h
+
+
+def hash_position(value):
+    """Return the (register index, run length) pair for a value"""
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+
+    h = murmurhash64a(value)
+    index = h & HLL_P_MASK
+    h >>= HLL_P
+    # Guarantee the loop terminates within HLL_Q bits
+    h |= 1 << HLL_Q
+    count = 1
+    while not h & 1:
+        count += 1
+        h >>= 1
+
+    return index, count
+
+
+class HyperLogLog:
+    """Mergeable cardinality estimator with Redis-compatible serialization"""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers is not None else bytearray(HLL_REGISTERS)
+
+    def add(self, value):
+        """Add a value, returning True if the estimate may have changed"""
+        index, count = hash_position(value)
+        if count > self.registers[index]:
+            self.registers[index] = count
+            return True
+        return False
+
+    def update(self, values):
+        """Add several values, returning True if any register changed"""
+        changed = False
+        for value in values:
+            changed = self.add(value) or changed
+        return changed
+
+    def merge(self, *others):
+        """Fold other sketches into this one (register-wise maximum)"""
+        registers = self.registers
+        for other in others:
+            for i, value in enumerate(other.registers):
+                if value > registers[i]:
+                    registers[i] = value
+        return self
+
+    def count(self):
+        """Estimate the cardinality with the estimator Redis uses"""
+        histogram = [0] * (HLL_Q + 2)
+        for value in self.registers:
+            histogram[value] += 1
+
+        m = HLL_REGISTERS
+        z = m * _tau((m - histogram[HLL_Q + 1]) / m)
+        for j in range(HLL_Q, 0, -1):
+            z += histogram[j]
+            z *= 0.5
+        z += m * _sigma(histogram[0] / m)
+
+        return int(round(HLL_ALPHA_INF * m * m / z))
+
+    def __len__(self):
+        return self.count()
+
+    def copy(self):
+        return HyperLogLog(self.registers)
+
+    def to_bytes(self):
+        """Serialize in the Redis dense representation"""
+        packed = bytearray(HLL_DENSE_SIZE - HLL_HDR_SIZE + 1)
+        for i, value in enumerate(self.registers):
+            if not value:
+                continue
+            bit = i * HLL_BITS
+            byte, shift = bit >> 3, bit & 7
+            packed[byte] |= (value << shift) & 0xFF
+            packed[byte + 1] |= value >> (8 - shift)
+
+        header = bytearray(HLL_MAGIC + bytes([HLL_DENSE, 0, 0, 0]) + bytes(8))
+        # Mark the cached cardinality as stale so Redis recomputes it
+        header[15] |= 0x80
+        return bytes(header) + bytes(packed[:-1])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a sketch from the Redis dense or sparse representation"""
+        data = bytes(data)
+        if len(data) < HLL_HDR_SIZE or data[:4] != HLL_MAGIC:
+            raise ValueError("Not a HyperLogLog sketch")
+
+        encoding = data[4]
+        payload = data[HLL_HDR_SIZE:]
+        if encoding == HLL_DENSE:
+            return cls(_decode_dense(payload))
+        if encoding == HLL_SPARSE:
+            return cls(_decode_sparse(payload))
+
+        raise ValueError(f"Unknown HyperLogLog encoding {encoding}")
+
+
+def merge(sketches):
+    """Return a new sketch that is the union of `sketches`"""
+    return HyperLogLog().merge(*sketches)
+
+
+def _decode_dense(payload):
+    if len(payload) != HLL_DENSE_SIZE - HLL_HDR_SIZE:
+        raise ValueError("Corrupt dense HyperLogLog")
+
+    payload = payload + b"\x00"
+    registers = bytearray(HLL_REGISTERS)
+    for i in range(HLL_REGISTERS):
+        bit = i * HLL_BITS
+        byte, shift = bit >> 3, bit & 7
+        registers[i] = ((payload[byte] >> shift) | (payload[byte + 1] << (8 - shift))) & HLL_REGISTER_MAX
+    return registers
+
+
+def _decode_sparse(payload):
+    registers = bytearray(HLL_REGISTERS)
+    index = 0
+    pos = 0
+    while pos < len(payload):
+        opcode = payload[pos]
+        if opcode & 0x80:
+            # VAL: 1vvvvvxx
+            value = ((opcode >> 2) & 0x1F) + 1
+            run = (opcode & 0x03) + 1
+            registers[index:index + run] = bytes([value]) * run
+            pos += 1
+        elif opcode & 0x40:
+            # XZERO: 01xxxxxx yyyyyyyy
+            run = (((opcode & 0x3F) << 8) | payload[pos + 1]) + 1
+            pos += 2
+        else:
+            # ZERO: 00xxxxxx
+            run = (opcode & 0x3F) + 1
+            pos += 1
+        index += run
+
+    if index != HLL_REGISTERS:
+        raise ValueError("Corrupt sparse HyperLogLog")
+    return registers
+
+
+def _sigma(x):
+    if x == 1.0:
+        return math.inf
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        z_prime = z
+        z += x * y
+        y += y
+        if z_prime == z:
+            return z
+
+
+def _tau(x):
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1 - x
+    while True:
+        x = math.sqrt(x)
+        z_prime = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z_prime == z:
+            return z / 3
@@ -0,0 +1,221 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Streaming import of Short URLs from CSV or JSONL files.
+
+The file is processed as a generator pipeline, so memory use is bounded by
+the chunk size rather than by the file size:
+
+    read rows -> skip to checkpoint -> chunk -> validate, claim aliases,
+    allocate codes, build UTM URLs (ShortURLBulkWriter.build) -> write rows
+    and append results -> checkpoint
+
+Every chunk's rows go into the same transaction as the URL Import Job
+checkpoint: processed row count and result file offset. The result CSV
+is appended, and flushed, before that commit. A failed import can
+therefore resume from the last committed chunk. The result file is
+first truncated to the saved offset, so no row is created twice or
+reported twice.
+"""
+
+import csv
+import json
+import os
+from itertools import islice
+
+import frappe
+from frappe import _
+from frappe.utils import now_datetime
+
+from utm_shortener.utm_shortener.utils.bulk_create import ShortURLBulkWriter
+
+CHUNK_SIZE = 1000
+JOB_TIMEOUT = 6 * 60 * 60
+PROGRESS_EVENT = "utm_shortener_import_progress"
+
+RESULT_COLUMNS = ("row", "original_url", "short_code", "short_url", "utm_url", "error")
+
+
+def iter_source_rows(path):
+    """Yield URL dicts from a CSV or JSONL file one row at a time
+
+    CSV files need a header with a `url` column and optionally `alias` and
+    `expiry_date`; JSONL lines hold such objects or bare URL strings.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # Reported as an invalid URL for this row
+                    item = line
+                yield item if isinstance(item, dict) else {"url": str(item)}
+        else:
+            for row in csv.DictReader(f):
+                row = {key.strip().lower(): (value or "").strip()
+                    for key, value in row.items() if isinstance(key, str)}
+                yield {
+                    "url": row.get("url") or row.get("original_url"),
+                    "alias": row.get("alias") or row.get("custom_alias"),
+                    "expiry_date": row.get("expiry_date"),
+                }
+
+
+def iter_chunks(items, size, start=0):
+    """Yield (start index, list) chunks of an iterable"""
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def get_file_path(file_url):
+    """Local path of an uploaded File the current user may read"""
+    file_doc = frappe.get_doc("File", {"file_url": file_url})
+    if not frappe.has_permission("File", "read", file_doc):
+        frappe.throw(_("Not permitted to read {0}").format(file_url), frappe.PermissionError)
+    return file_doc.get_full_path()
+
+
+def count_source_rows(file_url):
+    return sum(1 for _ in iter_source_rows(get_file_path(file_url)))
+
+
+def start_import(file_url, campaign=None):
+    """Create a URL Import Job for an uploaded file and queue it"""
+    # Fail early on files the user cannot read
+    get_file_path(file_url)
+
+    job = frappe.get_doc({
+        "doctype": "URL Import Job",
+        "source_file": file_url,
+        "utm_campaign": campaign,
+        "status": "Queued",
+    })
+    job.insert(ignore_permissions=True)
+    enqueue_import(job.name)
+    return job
+
+
+def enqueue_import(import_job):
+    frappe.enqueue(
+        "utm_shortener.utm_shortener.utils.link_importer.run_import",
+        queue="long",
+        timeout=JOB_TIMEOUT,
+        import_job=import_job,
+        enqueue_after_commit=True,
+    )
+
+
+def run_import(import_job):
+    """Background job: import a file, resuming after its last checkpoint"""
+    job = frappe.get_doc("URL Import Job", import_job)
+    if job.status == "Completed":
+        return
+
+    job.db_set({"status": "Running", "started_at": job.started_at or now_datetime(), "error": None},
+        commit=True)
+
+    try:
+        LinkImporter(job).run()
+        job.db_set({"status": "Completed", "finished_at": now_datetime()}, commit=True)
+
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), "URL Import Error")
+        job.reload()
+        job.db_set({"status": "Failed", "error": str(e), "finished_at": now_datetime()}, commit=True)
+
+    publish_progress(job)
+
+
+class LinkImporter:
+    """Run the import pipeline for one URL Import Job"""
+
+    def __init__(self, job, chunk_size=CHUNK_SIZE):
+        self.job = job
+        self.chunk_size = chunk_size
+        self.writer = ShortURLBulkWriter(job.utm_campaign, chunk_size=chunk_size)
+
+    def run(self):
+        rows = iter_source_rows(get_file_path(self.job.source_file))
+
+        # Resume after the last committed chunk
+        start = self.job.processed_rows or 0
+        rows = islice(rows, start, None)
+
+        path = self.get_result_path()
+        with open(path, "a+", newline="", encoding="utf-8") as output:
+            output.truncate(self.job.result_offset or 0)
+            output.seek(0, os.SEEK_END)
+            result_writer = csv.DictWriter(output, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+            if not output.tell():
+                result_writer.writeheader()
+
+            for chunk_start, chunk in iter_chunks(rows, self.chunk_size, start):
+                self.process_chunk(chunk_start, chunk, output, result_writer)
+
+    def process_chunk(self, start, chunk, output, result_writer):
+        results, errors, rows = self.writer.build(chunk, start_index=start)
+        self.writer.write(rows)
+
+        for row in sorted(results + errors, key=lambda row: row["index"]):
+            result_writer.writerow(make_result_row(row))
+        output.flush()
+        os.fsync(output.fileno())
+
+        # Checkpoint in the same transaction as the chunk's rows
+        self.job.db_set({
+            "processed_rows": start + len(chunk),
+            "created_count": (self.job.created_count or 0) + len(results),
+            "error_count": (self.job.error_count or 0) + len(errors),
+            "result_offset": output.tell(),
+        }, commit=True)
+
+        publish_progress(self.job)
+
+    def get_result_path(self):
+        """Result CSV, registered as a private File on first use"""
+        file_name = f"url-import-{self.job.name}.csv"
+        path = frappe.get_site_path("private", "files", file_name)
+
+        if not self.job.result_file:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "a").close()
+            file_doc = frappe.get_doc({
+                "doctype": "File",
+                "file_name": file_name,
+                "file_url": f"/private/files/{file_name}",
+                "is_private": 1,
+                "attached_to_doctype": "URL Import Job",
+                "attached_to_name": self.job.name,
+            })
+            file_doc.insert(ignore_permissions=True)
+            self.job.db_set("result_file", file_doc.file_url, commit=True)
+
+        return path
+
+
+def make_result_row(row):
+    """Result CSV row for a created link or a per-row error (1-based rows)"""
+    if "error" in row:
+        return {"row": row["index"] + 1, "original_url": row.get("url"), "error": row["error"]}
+    return dict(row, row=row["index"] + 1)
+
+
+def publish_progress(job):
+    frappe.publish_realtime(PROGRESS_EVENT, {
+        "import_job": job.name,
+        "status": job.status,
+        "processed_rows": job.processed_rows,
+        "created_count": job.created_count,
+        "error_count": job.error_count,
+        "result_file": job.result_file,
+    }, user=job.owner)
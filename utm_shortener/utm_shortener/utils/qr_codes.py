@@ -0,0 +1,249 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+On-demand QR codes for Short URLs.
+
+QR codes are not stored on the Short URL row. ``QRCodeRenderer`` (a
+website page renderer) serves ``/qr/<short_code>.png`` and ``.svg``.
+Optional ``size`` (module size in pixels), ``border``, ``fill`` and
+``background`` query parameters control the image.
+
+Rendered bytes are cached in Redis for a week, keyed by a hash of the
+encoded URL and the options. That hash is also the ETag, so browsers and
+CDNs revalidate with a 304 and never download the image twice.
+
+``enqueue_campaign_zip`` builds a zip of the QR codes of every link in a
+campaign in a background job. The rendering is spread over a process
+pool.
+"""
+
+import hashlib
+import io
+import os
+import re
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import frappe
+from frappe import _
+from frappe.utils import cint, now_datetime
+from frappe.website.page_renderers.base_renderer import BaseRenderer
+from werkzeug.wrappers import Response
+
+from utm_shortener.utm_shortener.doctype.short_url.short_url import ShortURL
+from utm_shortener.utm_shortener.utils import rate_limiter, resolution_cache
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+PATH_PATTERN = re.compile(r"^qr/([A-Za-z0-9_-]+)\.(png|svg)$")
+COLOR_PATTERN = re.compile(r"^#?([0-9a-fA-F]{6}|[0-9a-fA-F]{3})$")
+
+DEFAULT_BOX_SIZE = 10
+MAX_BOX_SIZE = 40
+DEFAULT_BORDER = 4
+MAX_BORDER = 16
+
+CACHE_KEY_PREFIX = "utm_shortener:qr:"
+CACHE_TTL = 7 * 24 * 60 * 60
+# Larger images are rendered every time rather than crowding out the cache
+MAX_CACHED_BYTES = 256 * 1024
+MAX_AGE = 24 * 60 * 60
+
+ZIP_BATCH_SIZE = 1000
+ZIP_JOB_TIMEOUT = 2 * 60 * 60
+ZIP_READY_EVENT = "utm_shortener_qr_zip_ready"
+
+QROptions = namedtuple("QROptions", ["format", "box_size", "border", "fill", "background"])
+
+
+def make_options(format="png", size=None, border=None, fill=None, background=None):
+    """Validated rendering options"""
+    format = (format or "png").lower()
+    if format not in FORMATS:
+        frappe.throw(_("QR codes are available as PNG or SVG"))
+
+    box_size = cint(size) or DEFAULT_BOX_SIZE
+    border = DEFAULT_BORDER if border in (None, "") else cint(border)
+    if not 1 <= box_size <= MAX_BOX_SIZE or not 0 <= border <= MAX_BORDER:
+        frappe.throw(_("QR code size must be 1-{0} and border 0-{1}").format(MAX_BOX_SIZE, MAX_BORDER))
+
+    return QROptions(format, box_size, border, parse_color(fill, "#000000"), parse_color(background, "#ffffff"))
+
+
+def parse_color(value, default):
+    if not value:
+        return default
+    match = COLOR_PATTERN.match(value)
+    if not match:
+        frappe.throw(_("Invalid color: {0}").format(value))
+    return "#" + match.group(1).lower()
+
+
+def render(data, options):
+    """Render a QR code image; runs in pool processes, so no frappe calls"""
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=options.box_size,
+        border=options.border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    if options.format == "svg":
+        return render_svg(qr.get_matrix(), options)
+
+    img = qr.make_image(fill_color=options.fill, back_color=options.background)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_svg(matrix, options):
+    """SVG with one path of horizontal runs of dark modules"""
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            path.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+
+    modules = len(matrix)
+    pixels = modules * options.box_size
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+        f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+        f'<rect width="{modules}" height="{modules}" fill="{options.background}"/>'
+        f'<path fill="{options.fill}" d="{"".join(path)}"/></svg>'
+    ).encode()
+
+
+def get_short_url(short_code):
+    return f"{ShortURL.get_base_url()}/s/{short_code}"
+
+
+def get_etag(data, options):
+    return hashlib.sha1(repr((data, tuple(options))).encode()).hexdigest()
+
+
+def get_image(short_code, options):
+    """(image bytes, etag) for an existing short code, or None"""
+    entry = resolution_cache.resolve_short_code(short_code)
+    if not entry:
+        return None
+
+    data = get_short_url(entry.short_code)
+    etag = get_etag(data, options)
+
+    try:
+        content = frappe.cache().get_value(CACHE_KEY_PREFIX + etag)
+    except Exception:
+        content = None
+
+    if content is None:
+        content = render(data, options)
+        if len(content) <= MAX_CACHED_BYTES:
+            try:
+                frappe.cache().set_value(CACHE_KEY_PREFIX + etag, content, expires_in_sec=CACHE_TTL)
+            except Exception:
+                pass
+
+    return content, etag
+
+
+class QRCodeRenderer(BaseRenderer):
+    """Serve /qr/<short_code>.png and /qr/<short_code>.svg"""
+
+    def can_render(self):
+        return bool(PATH_PATTERN.match(self.path or ""))
+
+    def render(self):
+        if not rate_limiter.hit("qr").allowed:
+            return Response(status=429)
+
+        short_code, format = PATH_PATTERN.match(self.path).groups()
+        form = frappe.local.form_dict
+        try:
+            options = make_options(format, form.get("size"), form.get("border"), form.get("fill"),
+                form.get("background"))
+        except frappe.ValidationError as e:
+            return Response(str(e), status=400, mimetype="text/plain")
+
+        image = get_image(short_code, options)
+        if not image:
+            return Response(status=404)
+
+        content, etag = image
+        response = Response(content, mimetype=FORMATS[options.format])
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = f"public, max-age={MAX_AGE}"
+        return response.make_conditional(frappe.local.request)
+
+
+def enqueue_campaign_zip(campaign, options):
+    """Zip the QR codes of a campaign's links in a background job"""
+    if not frappe.has_permission("UTM Campaign", "read", campaign):
+        frappe.throw(_("Not permitted to read {0}").format(campaign), frappe.PermissionError)
+
+    frappe.enqueue(
+        "utm_shortener.utm_shortener.utils.qr_codes.build_campaign_zip",
+        queue="long",
+        timeout=ZIP_JOB_TIMEOUT,
+        campaign=campaign,
+        options=tuple(options),
+    )
+
+
+def build_campaign_zip(campaign, options):
+    """Background job: render a campaign's QR codes in a process pool into a private File"""
+    options = QROptions(*options)
+    short_codes = frappe.get_all("Short URL", filters={"utm_campaign": campaign},
+        pluck="short_code", order_by="creation")
+    base_url = ShortURL.get_base_url()
+
+    file_name = "qr-codes-{0}-{1}.zip".format(frappe.scrub(campaign), now_datetime().strftime("%Y%m%d-%H%M%S"))
+    path = frappe.get_site_path("private", "files", file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    try:
+        # PNG and SVG output gains little from deflate
+        with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 4)) as executor, \
+                zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+            for start in range(0, len(short_codes), ZIP_BATCH_SIZE):
+                batch = short_codes[start:start + ZIP_BATCH_SIZE]
+                urls = [f"{base_url}/s/{short_code}" for short_code in batch]
+                images = executor.map(render, urls, repeat(options), chunksize=50)
+                for short_code, content in zip(batch, images):
+                    archive.writestr(f"{short_code}.{options.format}", content)
+
+        file_doc = frappe.get_doc({
+            "doctype": "File",
+            "file_name": file_name,
+            "file_url": f"/private/files/{file_name}",
+            "is_private": 1,
+            "attached_to_doctype": "UTM Campaign",
+            "attached_to_name": campaign,
+        })
+        file_doc.insert(ignore_permissions=True)
+        frappe.db.commit()
+
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        frappe.log_error(frappe.get_traceback(), "QR Code Zip Error")
+        frappe.publish_realtime(ZIP_READY_EVENT, {"success": False, "campaign": campaign},
+            user=frappe.session.user)
+        raise
+
+    frappe.publish_realtime(ZIP_READY_EVENT, {"success": True, "campaign": campaign,
+        "count": len(short_codes), "file_url": file_doc.file_url}, user=frappe.session.user)
+    return file_doc.file_url
@@ -0,0 +1,282 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Redis-backed rate limiting for the API and the redirect endpoints.
+
+Each endpoint has rules giving a scope (``user``, ``api_key`` or ``ip``),
+a settings field holding the limit, and a window. A rule is checked
+and counted in one Lua script, so concurrent workers cannot overshoot it.
+Two algorithms are available:
+
+* sliding window log: a sorted set of recent hits. It is exact, and
+  costs memory in proportion to the hits in the window;
+* token bucket: a hash holding a token count and a timestamp. It uses
+  constant memory and allows bursts up to the limit.
+
+Requests authenticated with an API key are counted against the key
+rather than its user, so keys can be given their own limits. The Rate
+Limit Overrides setting changes the limit of a single identity with
+lines like ``create:user:bulk@example.com = 20000/3600``. Limit 0 means
+unlimited.
+
+The most restrictive result of a request is kept on ``frappe.local``,
+and the ``after_request`` hook adds the ``X-RateLimit-*`` and
+``Retry-After`` headers to the response. If Redis is unavailable,
+requests are allowed.
+"""
+
+import base64
+import math
+import secrets
+from collections import namedtuple
+from dataclasses import dataclass
+from functools import lru_cache
+
+import frappe
+from frappe.utils import cint
+
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
+
+KEY_PREFIX = "utm_shortener:rate_limit:"
+
+SLIDING_WINDOW = "sliding window"
+TOKEN_BUCKET = "token bucket"
+
+MINUTE = 60
+HOUR = 60 * 60
+
+Rule = namedtuple("Rule", ["scope", "limit_field", "window", "algorithm"])
+
+# endpoint -> rules; algorithm None follows the Rate Limit Algorithm setting
+RULES = {
+    "create": (
+        Rule("api_key", "rate_limit_per_hour", HOUR, None),
+        Rule("user", "rate_limit_per_hour", HOUR, None),
+    ),
+    "redirect": (
+        Rule("ip", "redirect_rate_limit_per_minute", MINUTE, TOKEN_BUCKET),
+    ),
+    "qr": (
+        Rule("ip", "redirect_rate_limit_per_minute", MINUTE, TOKEN_BUCKET),
+    ),
+}
+
+# KEYS[1]: sorted set of "<id>:<cost>" members scored by time in ms
+# ARGV: window ms, limit, cost, member id
+SLIDING_WINDOW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local entries = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+
+local used = 0
+for i = 1, #entries, 2 do
+    used = used + tonumber(string.match(entries[i], ':(%d+)$'))
+end
+local reset = 0
+if #entries > 0 then
+    reset = tonumber(entries[2]) + window - now
+end
+
+if used + cost <= limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[4] .. ':' .. cost)
+    redis.call('PEXPIRE', KEYS[1], window)
+    if reset == 0 then reset = window end
+    return {1, limit - used - cost, 0, reset}
+end
+
+-- Wait until enough of the oldest hits leave the window
+local retry = window
+local freed = 0
+for i = 1, #entries, 2 do
+    freed = freed + tonumber(string.match(entries[i], ':(%d+)$'))
+    if used + cost - freed <= limit then
+        retry = tonumber(entries[i + 1]) + window - now
+        break
+    end
+end
+return {0, math.max(limit - used, 0), retry, reset}
+"""
+
+# KEYS[1]: hash with the token count and the time of the last refill
+# ARGV: window ms, limit, cost
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local rate = limit / window
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or limit
+local ts = tonumber(state[2]) or now
+tokens = math.min(limit, tokens + math.max(now - ts, 0) * rate)
+
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = math.ceil((cost - tokens) / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window)
+return {allowed, math.floor(tokens), retry, math.ceil((limit - tokens) / rate)}
+"""
+
+SCRIPTS = {SLIDING_WINDOW: SLIDING_WINDOW_SCRIPT, TOKEN_BUCKET: TOKEN_BUCKET_SCRIPT}
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the window has fully reset
+    reset: int
+    # Seconds until a denied request could succeed
+    retry_after: int = 0
+
+    def headers(self):
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+@lru_cache(maxsize=8)
+def parse_overrides(text):
+    """Parse `endpoint:scope:identity = limit/seconds` lines"""
+    overrides = {}
+    for line in (text or "").splitlines():
+        if "=" not in line or line.lstrip().startswith("#"):
+            continue
+        target, limit = line.split("=", 1)
+        parts = [part.strip() for part in target.split(":", 2)]
+        if len(parts) != 3 or not all(parts):
+            continue
+
+        limit, _, window = limit.partition("/")
+        overrides[tuple(parts)] = (cint(limit), cint(window) or None)
+    return overrides
+
+
+def get_api_key():
+    """API key of a token or basic authenticated request"""
+    request = getattr(frappe.local, "request", None)
+    authorization = request.headers.get("Authorization", "") if request else ""
+    scheme, _, credentials = authorization.partition(" ")
+
+    if scheme.lower() == "basic":
+        try:
+            credentials = base64.b64decode(credentials).decode()
+        except Exception:
+            return None
+    elif scheme.lower() != "token":
+        return None
+
+    key, separator, _ = credentials.partition(":")
+    return key.strip() if separator and key.strip() else None
+
+
+def get_ip():
+    request = getattr(frappe.local, "request", None)
+    return getattr(frappe.local, "request_ip", None) or (request.remote_addr if request else None)
+
+
+def get_identity(scope):
+    if scope == "user":
+        return frappe.session.user
+    if scope == "api_key":
+        return get_api_key()
+    if scope == "ip":
+        return get_ip()
+    frappe.throw(frappe._("Unknown rate limit scope: {0}").format(scope))
+
+
+def get_key(endpoint, scope, identity):
+    return f"{KEY_PREFIX}{endpoint}:{scope}:{identity}"
+
+
+def hit(endpoint, cost=1):
+    """Count `cost` hits on `endpoint` and return the most restrictive result"""
+    settings = get_settings()
+    overrides = parse_overrides(settings.rate_limit_overrides)
+    result = None
+    api_key = None
+
+    for rule in RULES[endpoint]:
+        # A key's own rule replaces its user's
+        if rule.scope == "user" and api_key:
+            continue
+
+        identity = get_identity(rule.scope)
+        if not identity:
+            continue
+        if rule.scope == "api_key":
+            api_key = identity
+
+        limit, window = overrides.get((endpoint, rule.scope, identity), (None, None))
+        limit = getattr(settings, rule.limit_field) if limit is None else limit
+        if not limit:
+            continue
+
+        algorithm = rule.algorithm or settings.rate_limit_algorithm
+        rule_result = check(get_key(endpoint, rule.scope, identity), limit, window or rule.window, cost, algorithm)
+        if rule_result and (not result or is_more_restrictive(rule_result, result)):
+            result = rule_result
+
+    if result:
+        previous = getattr(frappe.local, "utm_shortener_rate_limit", None)
+        if not previous or is_more_restrictive(result, previous):
+            frappe.local.utm_shortener_rate_limit = result
+
+    return result or RateLimitResult(True, 0, 0, 0)
+
+
+def check(key, limit, window, cost=1, algorithm=SLIDING_WINDOW):
+    """Count `cost` hits under `key`, or None if Redis is unavailable"""
+    try:
+        cache = frappe.cache()
+        script = cache.register_script(SCRIPTS[algorithm])
+        args = [window * 1000, limit, cost]
+        if algorithm == SLIDING_WINDOW:
+            args.append(secrets.token_hex(6))
+        allowed, remaining, retry, reset = script(keys=[cache.make_key(key)], args=args)
+    except Exception:
+        return None
+
+    return RateLimitResult(bool(allowed), limit, cint(remaining),
+        math.ceil(cint(reset) / 1000), math.ceil(cint(retry) / 1000))
+
+
+def is_more_restrictive(result, other):
+    if result.allowed != other.allowed:
+        return not result.allowed
+    if not result.allowed:
+        return result.retry_after > other.retry_after
+    return result.remaining < other.remaining
+
+
+def add_response_headers(response=None, request=None):
+    """after_request hook: report the request's rate limit to the client"""
+    result = getattr(frappe.local, "utm_shortener_rate_limit", None)
+    if result and response is not None:
+        response.headers.update(result.headers())
+
+
+def reset(endpoint, scope, identity):
+    """Clear the counters of one identity"""
+    frappe.cache().delete_value(get_key(endpoint, scope, identity))
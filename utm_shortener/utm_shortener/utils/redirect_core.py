@@ -0,0 +1,626 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Short URL resolution outside the Frappe request cycle.
+
+``RedirectCore`` serves the standalone WSGI app (``redirect_wsgi``) and
+``AsyncRedirectCore`` the asyncio server (``redirect_server``). Neither
+initializes a site, opens a session or builds a website context. They
+talk to the site's Redis cache and database directly, but use the keys
+and value formats of the Frappe code paths, so all of them can serve the
+same site side by side:
+
+* resolution entries, negative entries included, are read from and
+  written to the same Redis keys as ``resolution_cache``. They are
+  pickled, as ``frappe.cache().set_value`` stores them;
+* the short code filter, the redirect rate limit and the miss counters
+  use the keys of ``code_filter``, ``rate_limiter`` and
+  ``redirect_errors``;
+* clicks are pushed to the ``click_queue`` list in the same JSON format.
+  The scheduler persists them as usual.
+
+The redirect rules live in ``BaseRedirectCore`` and the ``*_response``
+helpers, shared by both servers. They follow ``www/s.py``: inactive and
+expired links are refused, and the UTM URL is preferred over the
+original URL, as in ``ShortURL.track_click``.
+
+On a cache miss, codes are loaded from a small pool of read-only
+database connections. Settings are loaded the same way and reloaded when
+the settings version stamp in Redis changes.
+
+Frappe helpers that need an initialized site are not available here.
+Timestamps are therefore computed from the System Settings time zone,
+and failures are written to the process log instead of the Error Log.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import pickle
+import queue
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pymysql
+import redis
+import redis.asyncio
+from frappe.utils import get_datetime
+from werkzeug.urls import iri_to_uri
+
+from utm_shortener.utm_shortener.utils import code_filter, rate_limiter, redirect_errors, resolution_cache
+from utm_shortener.utm_shortener.utils.click_queue import QUEUE_KEY
+from utm_shortener.utm_shortener.utils.shortener_settings import (
+    SETTINGS_DOCTYPE,
+    VERSION_CHECK_INTERVAL,
+    VERSION_KEY,
+    ShortenerSettings,
+)
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = 4
+DB_CONNECT_TIMEOUT = 5
+REDIS_POOL_SIZE = 32
+
+# The asyncio server pushes queued clicks in one RPUSH per batch
+CLICK_BATCH_SIZE = 200
+CLICK_FLUSH_INTERVAL = 0.05
+# Clicks kept while Redis is unavailable, oldest dropped first
+MAX_PENDING_CLICKS = 100000
+
+SHORT_URL_QUERY = "SELECT {0} FROM `tabShort URL` WHERE short_code = %s LIMIT 1".format(
+    ", ".join(f"`{field}`" for field in resolution_cache.RESOLUTION_FIELDS))
+SINGLES_QUERY = "SELECT doctype, field, value FROM `tabSingles` WHERE doctype IN (%s, %s)"
+SINGLES_DOCTYPES = (SETTINGS_DOCTYPE, "System Settings")
+
+PATH_PATTERN = re.compile(r"^/s/([^/]+)/?$")
+
+
+@dataclass(frozen=True)
+class SiteConfig:
+    """Connection details of a site, read from its site_config.json"""
+
+    site: str
+    db_name: str
+    db_user: str
+    db_password: str
+    db_host: str = "127.0.0.1"
+    db_port: int = 3306
+    redis_cache: str = "redis://127.0.0.1:13000"
+
+    @classmethod
+    def load(cls, sites_path, site):
+        """Merge common_site_config.json and the site's config, like frappe.get_site_config"""
+        config = {}
+        for path in (os.path.join(sites_path, "common_site_config.json"),
+                os.path.join(sites_path, site, "site_config.json")):
+            if os.path.exists(path):
+                with open(path) as f:
+                    config.update(json.load(f))
+
+        return cls(
+            site=site,
+            db_name=config["db_name"],
+            db_user=config.get("db_user") or config["db_name"],
+            db_password=config["db_password"],
+            db_host=config.get("db_host") or cls.db_host,
+            db_port=int(config.get("db_port") or cls.db_port),
+            redis_cache=config.get("redis_cache") or cls.redis_cache,
+        )
+
+    def connect_kwargs(self):
+        return {
+            "host": self.db_host,
+            "port": self.db_port,
+            "user": self.db_user,
+            "password": self.db_password,
+            "db": self.db_name,
+            "charset": "utf8mb4",
+            "autocommit": True,
+            "connect_timeout": DB_CONNECT_TIMEOUT,
+            "init_command": "SET SESSION TRANSACTION READ ONLY",
+        }
+
+
+class ConnectionPool:
+    """Thread-safe pool of read-only, autocommit database connections"""
+
+    def __init__(self, config, size=DB_POOL_SIZE):
+        self.config = config
+        self.connections = queue.LifoQueue(maxsize=size)
+
+    def connect(self):
+        return pymysql.connect(cursorclass=pymysql.cursors.DictCursor, **self.config.connect_kwargs())
+
+    def query(self, sql, values=None):
+        """Rows of a query, as dicts"""
+        try:
+            connection = self.connections.get_nowait()
+        except queue.Empty:
+            connection = self.connect()
+
+        try:
+            connection.ping(reconnect=True)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, values)
+                rows = cursor.fetchall()
+        except Exception:
+            connection.close()
+            raise
+
+        try:
+            self.connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+        return rows
+
+    def close(self):
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class AsyncConnectionPool:
+    """aiomysql pool of read-only connections; pymysql in threads when aiomysql is not installed"""
+
+    def __init__(self, config, size=DB_POOL_SIZE):
+        self.config = config
+        self.size = size
+        self.pool = None
+        self.sync_pool = None
+        self._lock = asyncio.Lock()
+
+    async def get_pool(self):
+        async with self._lock:
+            if self.pool is None and self.sync_pool is None:
+                try:
+                    import aiomysql
+                except ImportError:
+                    self.sync_pool = ConnectionPool(self.config, self.size)
+                else:
+                    self.pool = await aiomysql.create_pool(minsize=1, maxsize=self.size,
+                        cursorclass=aiomysql.DictCursor, pool_recycle=3600, **self.config.connect_kwargs())
+        return self.pool
+
+    async def query(self, sql, values=None):
+        """Rows of a query, as dicts"""
+        pool = self.pool or await self.get_pool()
+        if pool is None:
+            return await asyncio.to_thread(self.sync_pool.query, sql, values)
+
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(sql, values)
+                return await cursor.fetchall()
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+        if self.sync_pool is not None:
+            self.sync_pool.close()
+
+
+def get_client_ip(forwarded_for, remote_addr):
+    # Same precedence as frappe's request_ip
+    if forwarded_for:
+        return forwarded_for.split(",", 1)[0].strip()
+    return remote_addr or ""
+
+
+def miss_response(reason):
+    """(status, headers, body) of a miss, as redirect_errors.respond builds it"""
+    body = redirect_errors.MESSAGES.get(reason, redirect_errors.MESSAGES[redirect_errors.NOT_FOUND]).encode()
+    status = "410 Gone" if reason in redirect_errors.GONE else "404 Not Found"
+    return status, [
+        ("Content-Type", "text/plain; charset=utf-8"),
+        ("Content-Length", str(len(body))),
+        ("Cache-Control", f"public, max-age={redirect_errors.MAX_AGE}"),
+    ], body
+
+
+def redirect_response(entry, limit=None):
+    # Headers are latin-1
+    headers = [("Location", iri_to_uri(entry.target_url)), ("Content-Length", "0")]
+    if limit:
+        headers.extend(limit.headers().items())
+    return "302 Found", headers, b""
+
+
+def rate_limited_response(limit):
+    return "429 Too Many Requests", list(limit.headers().items()) + [("Content-Length", "0")], b""
+
+
+def error_response():
+    # Same fallback as the Frappe handlers
+    return "302 Found", [("Location", "/404"), ("Content-Length", "0")], b""
+
+
+class BaseRedirectCore:
+    """Redirect rules and key formats shared by the sync and asyncio servers"""
+
+    def __init__(self, config):
+        self.config = config
+        self.local_cache = resolution_cache.LRUCache()
+        self.settings = None
+        self.time_zone = timezone.utc
+        self._settings_version = None
+        self._settings_checked = 0
+        self._filter_meta = (None, 0)
+
+    def make_key(self, key):
+        # Same as RedisWrapper.make_key for site keys
+        return f"{self.config.db_name}|{key}".encode()
+
+    def settings_due(self):
+        return not self.settings or time.monotonic() - self._settings_checked >= VERSION_CHECK_INTERVAL
+
+    def needs_reload(self, version):
+        self._settings_checked = time.monotonic()
+        return not self.settings or version is None or version != self._settings_version
+
+    def apply_settings(self, version, rows):
+        """Load settings and the system time zone from SINGLES_QUERY rows"""
+        values = {doctype: {} for doctype in SINGLES_DOCTYPES}
+        for row in rows:
+            values[row["doctype"]][row["field"]] = row["value"]
+
+        time_zone = values["System Settings"].get("time_zone")
+        try:
+            self.time_zone = ZoneInfo(time_zone) if time_zone else timezone.utc
+        except (KeyError, ValueError):
+            self.time_zone = timezone.utc
+
+        self.settings = ShortenerSettings.from_values(values[SETTINGS_DOCTYPE])
+        self._settings_version = version
+
+    def now(self):
+        """Naive datetime in the system time zone, like frappe.utils.now_datetime"""
+        return datetime.now(self.time_zone).replace(tzinfo=None)
+
+    def get_local(self, short_code):
+        """Cached entry, False for a cached miss, None if not cached"""
+        return self.local_cache.get(short_code)
+
+    def set_local(self, short_code, entry):
+        self.local_cache.set(short_code, entry or False,
+            ttl=None if entry else resolution_cache.NEGATIVE_LOCAL_TTL)
+        return entry or None
+
+    def get_cache_key(self, short_code):
+        return self.make_key(resolution_cache.CACHE_KEY_PREFIX + short_code)
+
+    @staticmethod
+    def dump_entry(entry):
+        """(pickled value, ttl) as resolution_cache stores an entry or a miss"""
+        return pickle.dumps(entry or False), (resolution_cache.REDIS_TTL if entry
+            else resolution_cache.NEGATIVE_REDIS_TTL)
+
+    @staticmethod
+    def make_entry(rows):
+        return resolution_cache.make_entry(rows[0]) if rows else None
+
+    def filter_meta_due(self):
+        return self._filter_meta[1] <= time.monotonic()
+
+    def set_filter_meta(self, meta):
+        self._filter_meta = (meta, time.monotonic() + code_filter.META_TTL)
+
+    def get_filter_lookup(self, short_code):
+        """(bitmap key, offsets to read) for the short code filter, or None"""
+        meta = self._filter_meta[0]
+        if not meta:
+            return None
+
+        current = meta["current"]
+        return self.make_key(current["key"]), [0] + code_filter.get_positions(
+            short_code, current["bits"], current["hashes"])
+
+    @staticmethod
+    def read_filter_bits(bits):
+        # A missing bitmap is left to Frappe to rebuild
+        marker, *values = bits
+        return all(values) if marker else None
+
+    def get_reason(self, entry):
+        """Same checks as redirect_errors.get_reason"""
+        if not entry:
+            return redirect_errors.NOT_FOUND
+        if entry.status != "Active":
+            return redirect_errors.INACTIVE
+        if entry.expiry_date and get_datetime(entry.expiry_date) < self.now():
+            return redirect_errors.EXPIRED
+        return None
+
+    def get_rate_limit(self, ip):
+        """(key, limit, window) of the client's redirect limit, or None if unlimited"""
+        if not ip:
+            return None
+
+        overrides = rate_limiter.parse_overrides(self.settings.rate_limit_overrides)
+        limit, window = overrides.get(("redirect", "ip", ip), (None, None))
+        limit = self.settings.redirect_rate_limit_per_minute if limit is None else limit
+        if not limit:
+            return None
+
+        return self.make_key(rate_limiter.get_key("redirect", "ip", ip)), limit, window or rate_limiter.MINUTE
+
+    @staticmethod
+    def make_rate_limit_result(limit, result):
+        allowed, remaining, retry, reset = result
+        return rate_limiter.RateLimitResult(bool(allowed), limit, int(remaining),
+            -(-int(reset) // 1000), -(-int(retry) // 1000))
+
+    def get_counters_key(self):
+        return self.make_key(redirect_errors.get_counters_key(self.now()))
+
+    def make_click_event(self, entry, ip_address, user_agent, referrer):
+        """Serialized click in the click_queue.make_click_event format"""
+        return json.dumps({
+            "name": entry.name,
+            "code": entry.short_code,
+            "campaign": entry.utm_campaign,
+            "ts": str(self.now()),
+            "ip": ip_address or "",
+            "ua": user_agent or "",
+            "ref": referrer or "",
+        }, separators=(",", ":"))
+
+
+class RedirectCore(BaseRedirectCore):
+    """Blocking Redis and database access, for WSGI workers"""
+
+    def __init__(self, config, db_pool_size=DB_POOL_SIZE):
+        super().__init__(config)
+        self.redis = redis.Redis.from_url(config.redis_cache)
+        self.db = ConnectionPool(config, db_pool_size)
+        self.token_bucket = self.redis.register_script(rate_limiter.TOKEN_BUCKET_SCRIPT)
+
+    def refresh_settings(self):
+        if not self.settings_due():
+            return
+
+        try:
+            version = self.redis.get(self.make_key(VERSION_KEY)) or b"0"
+        except Exception:
+            version = None
+
+        # Stamp read before the values, so a concurrent save forces a reload
+        if self.needs_reload(version):
+            self.apply_settings(version, self.db.query(SINGLES_QUERY, SINGLES_DOCTYPES))
+
+    def resolve(self, short_code):
+        """Resolution entry of a short code, or None if it does not exist"""
+        entry = self.get_local(short_code)
+        if entry is not None:
+            return entry or None
+
+        key = self.get_cache_key(short_code)
+        try:
+            value = self.redis.get(key)
+            entry = pickle.loads(value) if value is not None else None
+        except Exception:
+            entry = None
+
+        if entry is None:
+            if self.might_exist(short_code) is False:
+                return None
+
+            entry = self.make_entry(self.db.query(SHORT_URL_QUERY, (short_code,)))
+            try:
+                value, ttl = self.dump_entry(entry)
+                self.redis.set(key, value, ex=ttl)
+            except Exception:
+                pass
+
+        return self.set_local(short_code, entry)
+
+    def might_exist(self, short_code):
+        """Same answer as code_filter.might_exist"""
+        try:
+            if self.filter_meta_due():
+                value = self.redis.get(self.make_key(code_filter.META_KEY))
+                self.set_filter_meta(pickle.loads(value) if value else None)
+
+            lookup = self.get_filter_lookup(short_code)
+            if not lookup:
+                return None
+
+            key, offsets = lookup
+            operation = self.redis.bitfield(key)
+            for offset in offsets:
+                operation.get("u1", offset)
+            return self.read_filter_bits(operation.execute())
+        except Exception:
+            return None
+
+    def hit_rate_limit(self, ip):
+        """Count a redirect against the client's limit; None if unlimited or Redis is down"""
+        rate_limit = self.get_rate_limit(ip)
+        if not rate_limit:
+            return None
+
+        key, limit, window = rate_limit
+        try:
+            result = self.token_bucket(keys=[key], args=[window * 1000, limit, 1])
+        except Exception:
+            return None
+        return self.make_rate_limit_result(limit, result)
+
+    def record_miss(self, reason):
+        try:
+            key = self.get_counters_key()
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(key, reason, 1)
+            pipe.expire(key, redirect_errors.COUNTERS_TTL)
+            pipe.execute()
+        except Exception:
+            pass
+
+    def enqueue_click(self, entry, ip_address, user_agent, referrer):
+        try:
+            self.redis.rpush(self.make_key(QUEUE_KEY),
+                self.make_click_event(entry, ip_address, user_agent, referrer))
+        except Exception:
+            # Without Frappe there is no synchronous fallback
+            logger.exception("Could not queue click for %s", entry.short_code)
+
+
+class AsyncRedirectCore(BaseRedirectCore):
+    """Pooled asyncio Redis and database access, with batched click writes"""
+
+    def __init__(self, config, db_pool_size=DB_POOL_SIZE, redis_pool_size=REDIS_POOL_SIZE):
+        super().__init__(config)
+        pool = redis.asyncio.BlockingConnectionPool.from_url(config.redis_cache,
+            max_connections=redis_pool_size)
+        self.redis = redis.asyncio.Redis(connection_pool=pool)
+        self.db = AsyncConnectionPool(config, db_pool_size)
+        self.token_bucket = self.redis.register_script(rate_limiter.TOKEN_BUCKET_SCRIPT)
+
+        # short code -> task loading it, so concurrent misses share one query
+        self._loading = {}
+        self._clicks = []
+        self._clicks_ready = asyncio.Event()
+        self._flusher = None
+        self._settings_lock = asyncio.Lock()
+
+    async def start(self):
+        await self.refresh_settings()
+        self._flusher = asyncio.create_task(self.flush_clicks_forever())
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush_clicks()
+        await self.db.close()
+        await self.redis.connection_pool.disconnect()
+
+    async def refresh_settings(self):
+        if not self.settings_due():
+            return
+
+        async with self._settings_lock:
+            if not self.settings_due():
+                return
+
+            try:
+                version = await self.redis.get(self.make_key(VERSION_KEY)) or b"0"
+            except Exception:
+                version = None
+
+            if self.needs_reload(version):
+                self.apply_settings(version, await self.db.query(SINGLES_QUERY, SINGLES_DOCTYPES))
+
+    async def resolve(self, short_code):
+        """Resolution entry of a short code, or None if it does not exist"""
+        entry = self.get_local(short_code)
+        if entry is not None:
+            return entry or None
+
+        task = self._loading.get(short_code)
+        if task is None:
+            task = self._loading[short_code] = asyncio.ensure_future(self.load(short_code))
+            task.add_done_callback(lambda _: self._loading.pop(short_code, None))
+        return await asyncio.shield(task)
+
+    async def load(self, short_code):
+        key = self.get_cache_key(short_code)
+        try:
+            value = await self.redis.get(key)
+            entry = pickle.loads(value) if value is not None else None
+        except Exception:
+            entry = None
+
+        if entry is None:
+            if await self.might_exist(short_code) is False:
+                return None
+
+            entry = self.make_entry(await self.db.query(SHORT_URL_QUERY, (short_code,)))
+            try:
+                value, ttl = self.dump_entry(entry)
+                await self.redis.set(key, value, ex=ttl)
+            except Exception:
+                pass
+
+        return self.set_local(short_code, entry)
+
+    async def might_exist(self, short_code):
+        """Same answer as code_filter.might_exist"""
+        try:
+            if self.filter_meta_due():
+                value = await self.redis.get(self.make_key(code_filter.META_KEY))
+                self.set_filter_meta(pickle.loads(value) if value else None)
+
+            lookup = self.get_filter_lookup(short_code)
+            if not lookup:
+                return None
+
+            key, offsets = lookup
+            operation = self.redis.bitfield(key)
+            for offset in offsets:
+                operation.get("u1", offset)
+            return self.read_filter_bits(await operation.execute())
+        except Exception:
+            return None
+
+    async def hit_rate_limit(self, ip):
+        """Count a redirect against the client's limit; None if unlimited or Redis is down"""
+        rate_limit = self.get_rate_limit(ip)
+        if not rate_limit:
+            return None
+
+        key, limit, window = rate_limit
+        try:
+            result = await self.token_bucket(keys=[key], args=[window * 1000, limit, 1])
+        except Exception:
+            return None
+        return self.make_rate_limit_result(limit, result)
+
+    async def record_miss(self, reason):
+        try:
+            key = self.get_counters_key()
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(key, reason, 1)
+            pipe.expire(key, redirect_errors.COUNTERS_TTL)
+            await pipe.execute()
+        except Exception:
+            pass
+
+    def enqueue_click(self, entry, ip_address, user_agent, referrer):
+        """Buffer a click; flush_clicks_forever pushes it with the rest of its batch"""
+        self._clicks.append(self.make_click_event(entry, ip_address, user_agent, referrer))
+        if len(self._clicks) >= CLICK_BATCH_SIZE:
+            self._clicks_ready.set()
+
+    async def flush_clicks_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._clicks_ready.wait(), CLICK_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._clicks_ready.clear()
+            await self.flush_clicks()
+
+    async def flush_clicks(self):
+        if not self._clicks:
+            return
+
+        batch, self._clicks = self._clicks, []
+        try:
+            await self.redis.rpush(self.make_key(QUEUE_KEY), *batch)
+        except Exception:
+            logger.exception("Could not queue %s clicks", len(batch))
+            # Retried with the next batch
+            self._clicks[:0] = batch
+            del self._clicks[:max(len(self._clicks) - MAX_PENDING_CLICKS, 0)]
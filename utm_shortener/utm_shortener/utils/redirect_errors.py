@@ -0,0 +1,132 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Cheap failure handling for the redirect endpoints.
+
+A miss (unknown, inactive or expired code) is an expected outcome, not an
+error. ``respond`` builds a plain 404 or 410 response directly, and
+``record`` adds the miss to an hourly Redis hash of counters. Neither
+writes to the database, so a crawler walking dead links costs a few
+Redis commands per request.
+
+Unexpected exceptions still reach the Error Log through ``log_sampled``,
+at most once per title every LOG_INTERVAL seconds. The logged entry
+states how many similar errors were suppressed since the previous one.
+"""
+
+import hashlib
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+from werkzeug.wrappers import Response
+
+from utm_shortener.utm_shortener.utils.resolution_cache import is_entry_expired
+
+COUNTERS_KEY_PREFIX = "utm_shortener:redirect_errors:"
+SAMPLE_KEY_PREFIX = "utm_shortener:redirect_errors:sample:"
+
+COUNTERS_TTL = 8 * 24 * 60 * 60
+LOG_INTERVAL = 5 * 60
+
+NOT_FOUND = "not_found"
+INACTIVE = "inactive"
+EXPIRED = "expired"
+INVALID = "invalid"
+ERROR = "error"
+
+# Gone for good as far as clients are concerned
+GONE = (INACTIVE, EXPIRED)
+
+MESSAGES = {
+    NOT_FOUND: "Short URL not found",
+    INACTIVE: "This short URL is not active",
+    EXPIRED: "This short URL has expired",
+    INVALID: "Invalid short URL",
+}
+
+# Matches the resolution cache's negative entries
+MAX_AGE = 60
+
+
+def get_reason(entry):
+    """Why a resolution entry cannot be redirected to, or None"""
+    if not entry:
+        return NOT_FOUND
+    if entry.status != "Active":
+        return INACTIVE
+    if is_entry_expired(entry):
+        return EXPIRED
+    return None
+
+
+def get_counters_key(hour):
+    return COUNTERS_KEY_PREFIX + hour.strftime("%Y%m%d%H")
+
+
+def record(reason):
+    """Count a failed redirect in the current hour"""
+    try:
+        cache = frappe.cache()
+        key = cache.make_key(get_counters_key(now_datetime()))
+        pipe = cache.pipeline(transaction=False)
+        pipe.hincrby(key, reason, 1)
+        pipe.expire(key, COUNTERS_TTL)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def respond(reason):
+    """Count a miss and build its 404 or 410 response"""
+    record(reason)
+    response = Response(frappe._(MESSAGES.get(reason, MESSAGES[NOT_FOUND])),
+        status=410 if reason in GONE else 404, mimetype="text/plain")
+    response.headers["Cache-Control"] = f"public, max-age={MAX_AGE}"
+    return response
+
+
+def log_sampled(message, title):
+    """Write an Error Log entry unless one with this title was written recently"""
+    record(ERROR)
+    try:
+        cache = frappe.cache()
+        digest = hashlib.sha1(title.encode()).hexdigest()
+        key = cache.make_key(SAMPLE_KEY_PREFIX + digest)
+        suppressed_key = cache.make_key(f"{SAMPLE_KEY_PREFIX}{digest}:suppressed")
+
+        pipe = cache.pipeline(transaction=False)
+        pipe.incr(suppressed_key)
+        pipe.expire(suppressed_key, COUNTERS_TTL)
+        pipe.set(key, 1, nx=True, ex=LOG_INTERVAL)
+        suppressed, _, acquired = pipe.execute()
+        if not acquired:
+            return
+
+        cache.delete(suppressed_key)
+        if suppressed > 1:
+            message = "{0}\n\n{1} similar errors since the previous entry were not logged".format(
+                message, suppressed - 1)
+    except Exception:
+        pass
+
+    frappe.log_error(message, title)
+
+
+def get_counts(hours=24):
+    """Failed redirects per hour and reason, most recent hour first"""
+    cache = frappe.cache()
+    now = now_datetime()
+    hours = [add_to_date(now, hours=-i) for i in range(hours)]
+
+    pipe = cache.pipeline(transaction=False)
+    for hour in hours:
+        pipe.hgetall(cache.make_key(get_counters_key(hour)))
+
+    counts = []
+    for hour, values in zip(hours, pipe.execute()):
+        counts.append({
+            "hour": hour.strftime("%Y-%m-%d %H:00"),
+            **{frappe.safe_decode(reason): int(count) for reason, count in values.items()},
+        })
+    return counts
@@ -0,0 +1,148 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Referrer source classification.
+
+The referrer host is parsed once and matched label by label against a
+suffix-indexed table, longest suffix first, so ``m.facebook.com`` maps to
+``facebook.com`` while ``dropbox.com`` no longer matches ``x.com``.
+Entries ending in ``.*`` match any public-suffix-like ending
+(``google.*`` covers ``google.com`` and ``google.co.uk``).
+
+The bundled table lives in ``data/referrer_sources.json``; the Referrer
+Sources field of UTM Shortener Settings adds or overrides entries.
+"""
+
+import json
+import os
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import frappe
+
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data", "referrer_sources.json")
+HOST_CACHE_SIZE = 8192
+
+DIRECT = "Direct"
+OTHER = "Other"
+
+
+class ReferrerClassifier:
+    """Map referrer URLs to sources through a suffix-indexed domain table"""
+
+    def __init__(self, sources):
+        self.exact = {}
+        self.wildcard = {}
+        for domain, source in sources.items():
+            domain = domain.strip().lower().lstrip(".")
+            if domain.endswith(".*"):
+                self.wildcard[domain[:-2]] = source
+            elif domain:
+                self.exact[domain] = source
+
+        self.classify_host = lru_cache(maxsize=HOST_CACHE_SIZE)(self._classify_host)
+
+    def classify(self, referrer):
+        """Return the source for a referrer URL"""
+        if not referrer:
+            return DIRECT
+
+        host = parse_host(referrer)
+        if not host:
+            return OTHER
+
+        return self.classify_host(host)
+
+    def classify_many(self, referrers):
+        """Classify a sequence of referrers, resolving each distinct host once"""
+        return [self.classify(referrer) for referrer in referrers]
+
+    def _classify_host(self, host):
+        labels = host.split(".")
+        count = len(labels)
+
+        for start in range(count):
+            source = self.exact.get(".".join(labels[start:]))
+            if source:
+                return source
+
+            # Try `name.*` where the rest of the host looks like a public suffix
+            for end in (count - 1, count - 2):
+                if start < end and _is_public_suffix_like(labels[end:]):
+                    source = self.wildcard.get(".".join(labels[start:end]))
+                    if source:
+                        return source
+
+        return host
+
+
+def _is_public_suffix_like(labels):
+    # Covers com, io, co.uk, com.au, ... without shipping the full suffix list
+    return 0 < len(labels) <= 2 and all(0 < len(label) <= 3 for label in labels)
+
+
+def parse_host(referrer):
+    """Lowercased host of a referrer URL, without the port"""
+    referrer = referrer.strip()
+    if "//" not in referrer:
+        referrer = "//" + referrer
+
+    try:
+        host = urlsplit(referrer).hostname
+    except ValueError:
+        return None
+
+    # No host at all: "http://", "https:///path", "///x"
+    if not host:
+        return None
+
+    return host.rstrip(".") or None
+
+
+def load_bundled_sources():
+    with open(DATA_FILE) as f:
+        return json.load(f)
+
+
+def parse_sources(text):
+    """Parse `domain = Source` lines from the settings field"""
+    sources = {}
+    for line in (text or "").splitlines():
+        if "=" not in line or line.lstrip().startswith("#"):
+            continue
+        domain, source = line.split("=", 1)
+        if domain.strip() and source.strip():
+            sources[domain.strip().lower()] = source.strip()
+    return sources
+
+
+_classifiers = {}
+
+
+def get_classifier():
+    """Classifier for the current site, rebuilt when the settings change"""
+    custom = get_settings().referrer_sources
+
+    key = (getattr(frappe.local, "site", None), custom)
+    classifier = _classifiers.get(key)
+    if classifier is None:
+        # Keep one classifier per site; drop the stale one when settings change
+        for stale in [k for k in _classifiers if k[0] == key[0]]:
+            del _classifiers[stale]
+
+        sources = load_bundled_sources()
+        sources.update(parse_sources(custom))
+        classifier = _classifiers[key] = ReferrerClassifier(sources)
+
+    return classifier
+
+
+def classify(referrer):
+    return get_classifier().classify(referrer)
+
+
+def classify_many(referrers):
+    return get_classifier().classify_many(referrers)
@@ -0,0 +1,175 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Two-tier short code resolution cache for the redirect hot path.
+
+Tier 1 is a small per-worker LRU with a TTL, tier 2 is the shared Redis
+cache behind ``frappe.cache()``. A warm lookup therefore never touches the
+database. Entries are invalidated from ``ShortURL.on_update``/``on_trash``.
+Codes that miss both tiers are checked against the short code filter
+before the database is queried.
+
+Unknown codes are cached too, as ``False`` entries with a short TTL, so
+repeated requests for a dead link do not query the database again.
+Creating a code invalidates its negative entry in Redis. Other workers
+may keep a local negative entry for up to NEGATIVE_LOCAL_TTL seconds.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+from utm_shortener.utm_shortener.utils import code_filter
+
+CACHE_KEY_PREFIX = "utm_shortener:resolve:"
+
+# Workers are not notified of invalidations, so keep the local tier short lived
+LOCAL_TTL = 30
+LOCAL_MAXSIZE = 10000
+REDIS_TTL = 24 * 60 * 60
+NEGATIVE_LOCAL_TTL = 5
+NEGATIVE_REDIS_TTL = 60
+
+RESOLUTION_FIELDS = ("name", "short_code", "original_url", "generated_utm_url",
+    "status", "expiry_date", "utm_campaign")
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a per-entry time to live"""
+
+    def __init__(self, maxsize=LOCAL_MAXSIZE, ttl=LOCAL_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = LRUCache()
+
+
+def _local_key(short_code):
+    return (getattr(frappe.local, "site", None), short_code)
+
+
+def resolve_short_code(short_code):
+    """Return the cached resolution entry for a short code, or None if unknown"""
+    if not short_code:
+        return None
+
+    local_key = _local_key(short_code)
+    entry = _local_cache.get(local_key)
+    if entry is not None:
+        return entry or None
+
+    try:
+        entry = frappe.cache().get_value(CACHE_KEY_PREFIX + short_code)
+    except Exception:
+        entry = None
+
+    if entry is None:
+        if code_filter.might_exist(short_code) is False:
+            return None
+
+        entry = load_entry(short_code)
+        try:
+            frappe.cache().set_value(CACHE_KEY_PREFIX + short_code, entry or False,
+                expires_in_sec=REDIS_TTL if entry else NEGATIVE_REDIS_TTL)
+        except Exception:
+            pass
+
+    _local_cache.set(local_key, entry or False, ttl=None if entry else NEGATIVE_LOCAL_TTL)
+    return entry or None
+
+
+def load_entry(short_code):
+    """Build a resolution entry straight from the database"""
+    row = frappe.db.get_value("Short URL", {"short_code": short_code},
+        RESOLUTION_FIELDS, as_dict=True)
+    if not row:
+        return None
+
+    return make_entry(row)
+
+
+def make_entry(row):
+    """Reduce a Short URL row or document to the fields a redirect needs"""
+    return frappe._dict({
+        "name": row.get("name"),
+        "short_code": row.get("short_code"),
+        # Same preference as ShortURL.track_click
+        "target_url": row.get("generated_utm_url") or row.get("original_url"),
+        "status": row.get("status"),
+        "expiry_date": str(row.get("expiry_date")) if row.get("expiry_date") else None,
+        "utm_campaign": row.get("utm_campaign"),
+    })
+
+
+def is_entry_expired(entry):
+    """Check the cached expiry date without loading the document"""
+    if not entry.expiry_date:
+        return False
+
+    return get_datetime(entry.expiry_date) < now_datetime()
+
+
+def invalidate(*short_codes):
+    """Drop short codes from both cache tiers"""
+    short_codes = [short_code for short_code in short_codes if short_code]
+    if not short_codes:
+        return
+
+    for short_code in short_codes:
+        _local_cache.delete(_local_key(short_code))
+    try:
+        frappe.cache().delete_value([CACHE_KEY_PREFIX + short_code for short_code in short_codes])
+    except Exception:
+        pass
+
+
+def invalidate_on_commit(*short_codes):
+    """Drop short codes now, and again once the transaction commits
+
+    A redirect served before the commit still reads the old row and would
+    cache it again for REDIS_TTL.
+    """
+    invalidate(*short_codes)
+    frappe.db.after_commit.add(lambda: invalidate(*short_codes))
+
+
+def clear_local_cache():
+    """Empty this worker's local tier"""
+    _local_cache.clear()
@@ -0,0 +1,153 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+Cached, typed access to UTM Shortener Settings.
+
+``get_settings`` returns a frozen ``ShortenerSettings`` read with one
+``get_singles_dict`` query. The result is kept per site in the process,
+together with values derived from it: the base URL with protocol and the
+blocked and allowed domain sets.
+
+Saving the settings calls ``clear_cache``. That drops the local copy and,
+once the transaction commits, bumps a version stamp in Redis. Other
+workers compare their copy's stamp with Redis at most once every
+VERSION_CHECK_INTERVAL seconds and reload when it changed.
+"""
+
+import time
+from dataclasses import dataclass, fields
+
+import frappe
+from frappe.utils import cint
+
+SETTINGS_DOCTYPE = "UTM Shortener Settings"
+VERSION_KEY = "utm_shortener:settings_version"
+VERSION_CHECK_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class ShortenerSettings:
+    """Values of UTM Shortener Settings, with defaults for unset fields
+
+    Defaults match the doctype's field defaults, which apply until the
+    settings are first saved.
+    """
+
+    base_domain: str = ""
+    use_https: bool = True
+    default_expiry_days: int = 365
+    rate_limit_per_hour: int = 100
+    short_code_strategy: str = "sequence"
+    bulk_async_threshold: int = 1000
+    blocked_domains: frozenset = frozenset()
+    allowed_domains: frozenset = frozenset()
+    allowed_domains_only: bool = False
+    blocklist_path: str = ""
+    rate_limit_algorithm: str = "sliding window"
+    redirect_rate_limit_per_minute: int = 600
+    rate_limit_overrides: str = ""
+    enable_geolocation: bool = False
+    geoip_database_path: str = ""
+    referrer_sources: str = ""
+    click_log_batch_size: int = 500
+    click_log_flush_interval: int = 5
+    code_pool_watermark: int = 10000
+    code_pool_refill_batch: int = 5000
+    # Derived: base_domain with protocol and without trailing slash
+    base_url: str = ""
+
+    # Fields where 0 is a setting rather than "unset"
+    ZERO_ALLOWED = ("default_expiry_days", "code_pool_watermark", "redirect_rate_limit_per_minute")
+
+    @classmethod
+    def from_values(cls, values):
+        """Build from a singles dict of raw database values"""
+        kwargs = {}
+        for field in fields(cls):
+            value = values.get(field.name)
+            if value is None or field.name == "base_url":
+                continue
+
+            if field.type is bool:
+                value = bool(cint(value))
+            elif field.type is int:
+                value = cint(value)
+                if not value and field.name not in cls.ZERO_ALLOWED:
+                    continue
+            elif field.type is frozenset:
+                value = parse_domains(value)
+            else:
+                value = (value or "").strip()
+            kwargs[field.name] = value
+
+        for name in ("short_code_strategy", "rate_limit_algorithm"):
+            if kwargs.get(name):
+                kwargs[name] = kwargs[name].lower()
+
+        base_domain = kwargs.get("base_domain", "").rstrip("/")
+        if base_domain and not base_domain.startswith(("http://", "https://")):
+            protocol = "https" if kwargs.get("use_https", cls.use_https) else "http"
+            base_domain = f"{protocol}://{base_domain}"
+        kwargs["base_url"] = base_domain
+
+        return cls(**kwargs)
+
+
+def parse_domains(text):
+    """Domains from a comma or newline separated list, lowercased"""
+    return frozenset(domain.strip().lower() for domain in (text or "").replace("\n", ",").split(",")
+        if domain.strip())
+
+
+# site -> (version stamp, settings, last version check)
+_cache = {}
+
+
+def get_settings():
+    """Current UTM Shortener Settings of this site"""
+    site = getattr(frappe.local, "site", None)
+    cached = _cache.get(site)
+    now = time.monotonic()
+
+    if cached and now - cached[2] < VERSION_CHECK_INTERVAL:
+        return cached[1]
+
+    version = get_version()
+    if cached and version is not None and cached[0] == version:
+        _cache[site] = (version, cached[1], now)
+        return cached[1]
+
+    # Stamp read before the values, so a concurrent save forces a reload
+    settings = ShortenerSettings.from_values(frappe.db.get_singles_dict(SETTINGS_DOCTYPE))
+    if version is not None:
+        _cache[site] = (version, settings, now)
+    return settings
+
+
+def get_version():
+    """Version stamp of the settings in Redis, None if Redis is unavailable"""
+    try:
+        cache = frappe.cache()
+        return cache.get(cache.make_key(VERSION_KEY)) or b"0"
+    except Exception:
+        return None
+
+
+def bump_version():
+    try:
+        cache = frappe.cache()
+        cache.incr(cache.make_key(VERSION_KEY))
+    except Exception:
+        pass
+
+
+def clear_cache():
+    """Reload the settings here now, and in other workers after commit"""
+    _cache.pop(getattr(frappe.local, "site", None), None)
+
+    def invalidate():
+        _cache.pop(getattr(frappe.local, "site", None), None)
+        bump_version()
+
+    frappe.db.after_commit.add(invalidate)
@@ -0,0 +1,255 @@
+# Copyright (c) 2025, Chinmay Bhat and contributors
+# For license information, please see license.txt
+
+"""
+HyperLogLog unique visitor sketches per Short URL and per UTM Campaign.
+
+Each scope keeps a lifetime sketch and one sketch per day. Clicks update
+them with ``PFADD`` and estimates are unions computed with ``PFCOUNT``, so
+sketches merge across URLs, days and campaigns without touching the raw
+click log. Sketches are persisted hourly to Unique Visitor Sketch and
+restored into Redis when a key is missing. Without Redis the same sketches
+are maintained with the pure-Python ``HyperLogLog``.
+"""
+
+import base64
+
+import frappe
+from frappe.utils import add_days, get_datetime, getdate, now_datetime
+
+from utm_shortener.utm_shortener.utils.hyperloglog import HyperLogLog
+
+KEY_PREFIX = "utm_shortener:hll:"
+DIRTY_KEY = "utm_shortener:hll:dirty"
+# Daily sketches only receive late clicks after their day, persisted copies cover the rest
+DAILY_KEY_TTL = 3 * 24 * 60 * 60
+
+SCOPE_URL = "Short URL"
+SCOPE_CAMPAIGN = "UTM Campaign"
+_SCOPE_PREFIX = {SCOPE_URL: "url", SCOPE_CAMPAIGN: "campaign"}
+
+
+def make_sketch_key(scope, reference, date=None):
+    """Key shared by Redis and Unique Visitor Sketch"""
+    key = f"{_SCOPE_PREFIX[scope]}:{reference}"
+    if date:
+        key += f":{getdate(date).isoformat()}"
+    return key
+
+
+def parse_sketch_key(sketch_key):
+    """Split a sketch key back into (scope, reference, date)"""
+    prefix, rest = sketch_key.split(":", 1)
+    scope = {v: k for k, v in _SCOPE_PREFIX.items()}[prefix]
+
+    reference, date = rest, None
+    if len(rest) > 11 and rest[-11] == ":":
+        reference, date = rest[:-11], rest[-10:]
+
+    return scope, reference, date
+
+
+def get_visit_keys(short_url_name, campaign, timestamp):
+    """Sketch keys a single visit contributes to"""
+    date = get_datetime(timestamp).date()
+    keys = [make_sketch_key(SCOPE_URL, short_url_name), make_sketch_key(SCOPE_URL, short_url_name, date)]
+    if campaign:
+        keys += [make_sketch_key(SCOPE_CAMPAIGN, campaign), make_sketch_key(SCOPE_CAMPAIGN, campaign, date)]
+    return keys
+
+
+def add_visits(visits):
+    """Add visits to their sketches
+
+    `visits` is an iterable of (short_url, campaign, timestamp, visitor_id).
+    Returns a dict of Short URL name -> number of visits that raised the
+    lifetime estimate, i.e. the approximate count of new unique visitors.
+    """
+    visits = [visit for visit in visits if visit[3]]
+    if not visits:
+        return {}
+
+    try:
+        return _add_visits_redis(visits)
+    except Exception:
+        # Redis is unavailable, update the persisted sketches directly
+        return _add_visits_offline(visits)
+
+
+def _add_visits_redis(visits):
+    cache = frappe.cache()
+    all_keys = {key for visit in visits for key in get_visit_keys(*visit[:3])}
+    ensure_loaded(all_keys)
+
+    pipe = cache.pipeline(transaction=False)
+    for short_url_name, campaign, timestamp, visitor_id in visits:
+        keys = get_visit_keys(short_url_name, campaign, timestamp)
+        for key in keys:
+            pipe.pfadd(cache.make_key(KEY_PREFIX + key), visitor_id)
+        for key in keys[1::2]:
+            pipe.expire(cache.make_key(KEY_PREFIX + key), DAILY_KEY_TTL)
+    pipe.sadd(cache.make_key(DIRTY_KEY), *all_keys)
+    results = pipe.execute()
+
+    new_visitors = {}
+    position = 0
+    for short_url_name, campaign, timestamp, visitor_id in visits:
+        key_count = 4 if campaign else 2
+        # The first PFADD of each visit targets the lifetime URL sketch
+        if results[position]:
+            new_visitors[short_url_name] = new_visitors.get(short_url_name, 0) + 1
+        position += key_count + key_count // 2
+
+    return new_visitors
+
+
+def _add_visits_offline(visits):
+    sketches = load_persisted_sketches({key for visit in visits for key in get_visit_keys(*visit[:3])})
+
+    new_visitors = {}
+    for short_url_name, campaign, timestamp, visitor_id in visits:
+        for i, key in enumerate(get_visit_keys(short_url_name, campaign, timestamp)):
+            sketch = sketches.setdefault(key, HyperLogLog())
+            if sketch.add(visitor_id) and i == 0:
+                new_visitors[short_url_name] = new_visitors.get(short_url_name, 0) + 1
+
+    save_sketches(sketches)
+    return new_visitors
+
+
+def ensure_loaded(keys):
+    """Restore persisted sketches into Redis for keys that have been evicted"""
+    cache = frappe.cache()
+    keys = list(keys)
+
+    pipe = cache.pipeline(transaction=False)
+    for key in keys:
+        pipe.exists(cache.make_key(KEY_PREFIX + key))
+    missing = [key for key, exists in zip(keys, pipe.execute()) if not exists]
+    if not missing:
+        return
+
+    persisted = load_persisted_sketches(missing)
+    if not persisted:
+        return
+
+    pipe = cache.pipeline(transaction=False)
+    for key, sketch in persisted.items():
+        redis_key = cache.make_key(KEY_PREFIX + key)
+        # NX: never overwrite visits added concurrently by another worker
+        pipe.set(redis_key, sketch.to_bytes(), nx=True)
+        if parse_sketch_key(key)[2]:
+            pipe.expire(redis_key, DAILY_KEY_TTL)
+    pipe.execute()
+
+
+def load_persisted_sketches(keys):
+    """Load sketches from Unique Visitor Sketch as HyperLogLog objects"""
+    if not keys:
+        return {}
+
+    rows = frappe.get_all("Unique Visitor Sketch",
+        filters={"name": ["in", list(keys)]},
+        fields=["name", "registers"])
+
+    return {row.name: HyperLogLog.from_bytes(base64.b64decode(row.registers))
+        for row in rows if row.registers}
+
+
+def save_sketches(sketches):
+    """Upsert sketches into Unique Visitor Sketch"""
+    if not sketches:
+        return
+
+    now = now_datetime()
+    values = []
+    for key, sketch in sketches.items():
+        scope, reference, date = parse_sketch_key(key)
+        values.append((key, now, now, "Administrator", "Administrator", key, scope, reference, date,
+            base64.b64encode(sketch.to_bytes()).decode(), sketch.count()))
+
+    frappe.db.sql("""
+        INSERT INTO `tabUnique Visitor Sketch`
+            (name, creation, modified, owner, modified_by, sketch_key, scope, reference,
+            sketch_date, registers, estimate)
+        VALUES {0}
+        ON DUPLICATE KEY UPDATE
+            registers = VALUES(registers),
+            estimate = VALUES(estimate),
+            modified = VALUES(modified)
+    """.format(", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(values))),
+        [value for row in values for value in row])
+
+
+def persist_dirty_sketches(batch_size=500):
+    """Copy sketches changed since the last run from Redis to the database"""
+    cache = frappe.cache()
+    dirty_key = cache.make_key(DIRTY_KEY)
+    persisted = 0
+
+    while True:
+        # RedisWrapper.spop prefixes the key itself and pops a single member,
+        # so go through a raw pipeline like the other commands here
+        pipe = cache.pipeline(transaction=False)
+        pipe.spop(dirty_key, batch_size)
+        keys = [frappe.safe_decode(key) for key in pipe.execute()[0] or []]
+        if not keys:
+            break
+
+        pipe = cache.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(cache.make_key(KEY_PREFIX + key))
+
+        sketches = {key: HyperLogLog.from_bytes(raw)
+            for key, raw in zip(keys, pipe.execute()) if raw}
+
+        try:
+            save_sketches(sketches)
+            frappe.db.commit()
+        except Exception:
+            # Try these keys again on the next run
+            pipe = cache.pipeline(transaction=False)
+            pipe.sadd(dirty_key, *keys)
+            pipe.execute()
+            raise
+
+        persisted += len(sketches)
+
+    return persisted
+
+
+def estimate(scope, references, from_date=None, to_date=None):
+    """Estimate unique visitors across one or more references and a date range
+
+    Without dates the lifetime sketches are used. With dates the daily
+    sketches in the inclusive range are merged.
+    """
+    if isinstance(references, str):
+        references = [references]
+
+    keys = []
+    for reference in references:
+        if from_date or to_date:
+            keys += [make_sketch_key(scope, reference, date)
+                for date in _date_range(from_date, to_date)]
+        else:
+            keys.append(make_sketch_key(scope, reference))
+
+    if not keys:
+        return 0
+
+    try:
+        cache = frappe.cache()
+        ensure_loaded(keys)
+        return cache.pfcount(*[cache.make_key(KEY_PREFIX + key) for key in keys])
+    except Exception:
+        sketches = load_persisted_sketches(keys)
+        return HyperLogLog().merge(*sketches.values()).count()
+
+
+def _date_range(from_date, to_date):
+    to_date = getdate(to_date or now_datetime())
+    date = getdate(from_date or to_date)
+    while date <= to_date:
+        yield date
+        date = add_days(date, 1)
@@ -3,6 +3,7 @@
 
 import frappe
 from frappe import _
+from utm_shortener.utm_shortener.utils.shortener_settings import get_settings
 
 def get_context(context):
     """Context for the URL shortener landing page"""
@@ -11,7 +12,7 @@ def get_context(context):
     
     # Get settings
     try:
-        settings = frappe.get_single("UTM Shortener Settings")
+        settings = get_settings()
         context.base_domain = settings.base_domain
         context.rate_limit = settings.rate_limit_per_hour
     except:
@@ -1,27 +1,23 @@
 import frappe
-from frappe import _
+from utm_shortener.utm_shortener.utils import click_queue, rate_limiter, redirect_errors, resolution_cache
 
 def redirect_short_url(short_code):
     """Handle short URL redirects via website route"""
     try:
+        # Shed abusive clients before resolving anything
+        if not rate_limiter.hit("redirect").allowed:
+            raise frappe.TooManyRequestsError
+        
         # Clean the short code
         short_code = short_code.strip()
         
-        # Find the short URL document by short_code
-        short_url_name = frappe.db.get_value("Short URL", {"short_code": short_code}, "name")
-        
-        if not short_url_name:
-            frappe.throw(_("Short URL not found"), frappe.DoesNotExistError)
-        
-        # Get the document
-        short_url_doc = frappe.get_doc("Short URL", short_url_name)
+        # Resolve the short code through the redirect cache
+        entry = resolution_cache.resolve_short_code(short_code)
         
-        # Check if URL is active and not expired
-        if short_url_doc.status != "Active":
-            frappe.throw(_("This short URL is not active"))
-        
-        if short_url_doc.is_expired():
-            frappe.throw(_("This short URL has expired"))
+        # Unknown, inactive and expired codes get a plain 404 or 410
+        reason = redirect_errors.get_reason(entry)
+        if reason:
+            return redirect_errors.respond(reason)
         
         # Prepare request data for tracking
         request_data = {
@@ -30,19 +26,18 @@ def redirect_short_url(short_code):
             "referrer": frappe.local.request.headers.get('Referer', '')
         }
         
-        # Track the click and get redirect URL
-        redirect_url = short_url_doc.track_click(request_data)
+        # Queue the click and redirect without waiting on the database
+        click_queue.enqueue_click(entry, request_data)
+        redirect_url = entry.target_url
         
         # Perform the redirect
         frappe.local.response["type"] = "redirect"
         frappe.local.response["location"] = redirect_url
         
-    except frappe.DoesNotExistError:
-        # Redirect to 404 page
-        frappe.local.response["type"] = "redirect"
-        frappe.local.response["location"] = "/404"
+    except frappe.TooManyRequestsError:
+        raise
         
     except Exception as e:
-        frappe.log_error(f"Error in redirect_short_url: {str(e)}", "Short URL Redirect Error")
+        redirect_errors.log_sampled(f"Error in redirect_short_url: {str(e)}", "Short URL Redirect Error")
         frappe.local.response["type"] = "redirect"
         frappe.local.response["location"] = "/404"
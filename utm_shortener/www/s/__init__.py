@@ -1,39 +1,30 @@
 import frappe
-from frappe import _
+from utm_shortener.utm_shortener.utils import click_queue, rate_limiter, redirect_errors, resolution_cache
 
 no_cache = 1
 
 def get_context(context):
     """Handle short URL redirects with dynamic paths"""
     try:
+        # Shed abusive clients before resolving anything
+        if not rate_limiter.hit("redirect").allowed:
+            raise frappe.TooManyRequestsError
+        
         # Get the current path
         path = frappe.local.request.path
         
         # Extract short code - path should be like /s/abc123
-        if path.startswith('/s/'):
-            short_code = path[3:].strip('/')
-        else:
-            frappe.throw(_("Invalid short URL format"))
-        
-        if not short_code:
-            frappe.throw(_("Short code not provided"))
-        
-        # Find the short URL document
-        short_url_name = frappe.db.get_value("Short URL", {"short_code": short_code}, "name")
+        short_code = path[3:].strip('/') if path.startswith('/s/') else None
         
-        if not short_url_name:
-            frappe.throw(_("Short URL not found"), frappe.DoesNotExistError)
+        # Resolve the short code through the redirect cache
+        entry = resolution_cache.resolve_short_code(short_code)
         
-        # Get the document
-        short_url_doc = frappe.get_doc("Short URL", short_url_name)
-        
-        # Check if URL is active
-        if short_url_doc.status != "Active":
-            frappe.throw(_("This short URL is not active"))
-        
-        # Check if URL has expired
-        if short_url_doc.is_expired():
-            frappe.throw(_("This short URL has expired"))
+        # Pages cannot return a response, so misses get the site's 404 page
+        # without an Error Log entry
+        reason = redirect_errors.get_reason(entry) if short_code else redirect_errors.INVALID
+        if reason:
+            redirect_errors.record(reason)
+            raise frappe.PageDoesNotExistError
         
         # Prepare request data for tracking
         request_data = {
@@ -42,14 +33,18 @@ def get_context(context):
             "referrer": frappe.local.request.headers.get('Referer', '')
         }
         
-        # Track the click and get redirect URL
-        redirect_url = short_url_doc.track_click(request_data)
+        # Queue the click and redirect without waiting on the database
+        click_queue.enqueue_click(entry, request_data)
+        redirect_url = entry.target_url
         
         # Perform redirect
         frappe.local.response["type"] = "redirect"
         frappe.local.response["location"] = redirect_url
         
+    except (frappe.TooManyRequestsError, frappe.PageDoesNotExistError):
+        raise
+        
     except Exception as e:
-        frappe.log_error(f"Short URL redirect error: {str(e)}", "Short URL Error")
+        redirect_errors.log_sampled(f"Short URL redirect error: {str(e)}", "Short URL Error")
         frappe.local.response["type"] = "redirect"
         frappe.local.response["location"] = "/404"